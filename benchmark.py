@@ -0,0 +1,282 @@
+"""
+CLUSTER ADDRESS FINDER BENCHMARK
+================================
+Measures end-to-end throughput of the geocoding pipeline against a local
+mock Nominatim server, so runs are reproducible and need no network.
+
+For each size a synthetic cluster spreadsheet is generated (and kept for
+later runs), then run through the app's own job path: queued as a full
+upload (start_upload_job), processed by the job scheduler with
+checkpointing and the result store, and downloaded through /download.
+Each size runs twice in a fresh process: once with an empty geocode cache
+("cold") and once with the cache it left behind ("warm"). Rows/s, wall
+time per stage and peak RSS go to a JSON report that can be compared
+against an earlier one. Nearby-address reuse is off unless
+--nearby-meters is given, so runs are comparable.
+
+Usage:
+   python benchmark.py
+   python benchmark.py --sizes 1000 10000 100000 1000000 --latency 0.02 --error-rate 0.01
+   python benchmark.py --baseline old_report.json --max-regression 10
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+STAGES = ('queue_wait', 'parse', 'geocode', 'assemble', 'store', 'export')
+
+
+def generate_sheet(path, rows, unique_ratio=0.2, seed=0, chunk_rows=100000):
+    """Write a synthetic cluster sheet; rows share max(1, rows * unique_ratio) cluster centres
+
+    Written in chunks with the app's export writers, so even a 1M-row
+    workbook is never held in memory at once.
+    """
+    import cluster_app
+
+    rng = np.random.default_rng(seed)
+    centres = max(1, int(rows * unique_ratio))
+    centre_lats = rng.uniform(40.0, 41.0, centres).round(6)
+    centre_lons = rng.uniform(-74.5, -73.5, centres).round(6)
+
+    base, ext = os.path.splitext(path)
+    tmp_path = base + '.part' + ext
+    with open(tmp_path, 'wb') as out:
+        writer = cluster_app.EXPORT_FORMATS[ext.lstrip('.')](out)
+        for start in range(0, rows, chunk_rows):
+            count = min(chunk_rows, rows - start)
+            picks = rng.integers(0, centres, count)
+            writer.write(pd.DataFrame({
+                'Cluster_ID': np.arange(start + 1, start + count + 1),
+                'Center_Latitude': centre_lats[picks],
+                'Center_Longitude': centre_lons[picks],
+                'City': rng.choice(['Springfield', 'Riverside', 'Fairview', 'Madison'], count),
+                'Point_Count': rng.integers(1, 50, count)
+            }))
+        writer.close()
+    os.replace(tmp_path, path)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_pipeline(path, export_format, output_path, poll_interval=0.05):
+    """Process one sheet as a full upload and download it; return the measurements
+
+    Stage times come from the job's own timings (parsing overlaps
+    geocoding, so stages can add up to more than the wall time); export is
+    the download of the finished result. Configuration comes from the
+    environment, as for the app.
+    """
+    import cluster_app
+
+    started = time.perf_counter()
+    stream = open(path, 'rb')
+    body, code = cluster_app.start_upload_job(stream, os.path.basename(path), {'mode': 'full'})
+    if code != 200:
+        raise RuntimeError(body.get('error'))
+    session_id = body['session_id']
+    
+    status = cluster_app.processing_status[session_id]
+    while status['status'] not in ('completed', 'error', 'cancelled'):
+        time.sleep(poll_interval)
+    if status['status'] != 'completed':
+        raise RuntimeError(f"Job {status['status']}: {status.get('message')}")
+    results = status['results']
+    job_timings = status['timings']
+    
+    export_started = time.perf_counter()
+    response = cluster_app.app.test_client().get(f"/download/{session_id}?format={export_format}")
+    if response.status_code != 200:
+        raise RuntimeError(f"Download failed with HTTP {response.status_code}")
+    with open(output_path, 'wb') as out:
+        for data in response.iter_encoded():
+            out.write(data)
+    response.close()
+    wall = time.perf_counter() - started
+    
+    timings = {
+        'queue_wait': job_timings['queue_wait'],
+        'parse': job_timings['parse'],
+        'geocode': sum(job_timings[stage] for stage in ('cache', 'areas', 'rate_limit', 'network')),
+        'assemble': job_timings['assembly'],
+        'store': job_timings['store_results'],
+        'export': time.perf_counter() - export_started
+    }
+    stats = results['stats']
+    rows = stats['total']
+    with_address = sum(stats[key] for key in ('complete_address', 'nearby_address', 'street_only', 'area_only'))
+    return {
+        'rows': rows,
+        'wall_seconds': round(wall, 3),
+        'rows_per_second': round(rows / max(wall, 1e-9), 1),
+        'stages': {stage: round(seconds, 3) for stage, seconds in timings.items()},
+        'unique_points': results['unique_lookups'],
+        'cache_hits': results['cache']['hits'],
+        'cache_misses': results['cache']['misses'],
+        'nearby_reused': results['nearby_reused'],
+        'rows_without_address': rows - with_address,
+        'output_bytes': os.path.getsize(output_path),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def run_in_subprocess(path, args, cache_path, mock_url, output_path, work_dir):
+    """Run one pipeline pass in a fresh interpreter so caches and peak RSS start clean"""
+    env = dict(
+        os.environ,
+        GEOCODER_BACKEND='mock',
+        GEOCODER_URL=mock_url,
+        GEOCODE_CACHE_PATH=cache_path,
+        UPLOAD_CHUNK_ROWS=str(args.chunk_rows),
+        CHECKPOINT_EVERY=str(args.chunk_rows),
+        GEOCODER_MAX_RETRIES=str(args.retries),
+        NEARBY_REUSE_METERS=str(args.nearby_meters),
+        CHECKPOINT_DIR=os.path.join(work_dir, 'checkpoints'),
+        RESULT_SPILL_DIR=os.path.join(work_dir, 'results'),
+        # Every pass geocodes the whole sheet instead of reusing the last run's rows
+        DATASET_DIR=''
+    )
+    if args.concurrency:
+        env['GEOCODER_CONCURRENCY'] = str(args.concurrency)
+    env.pop('JOB_STORE_PATH', None)
+
+    command = [
+        sys.executable, os.path.abspath(__file__), '--run-one', path,
+        '--export', args.export, '--output-file', output_path
+    ]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed for {path}:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(report, baseline, max_regression=None):
+    """Print rows/s against a baseline report; return False if a run regressed too far"""
+    previous = {(run['rows'], run['pass']): run for run in baseline['runs']}
+    ok = True
+    print(f"\n{'rows':>10} {'pass':>5} {'rows/s':>12} {'baseline':>12} {'change':>8}")
+    for run in report['runs']:
+        old = previous.get((run['rows'], run['pass']))
+        if old is None:
+            print(f"{run['rows']:>10,} {run['pass']:>5} {run['rows_per_second']:>12,.0f} {'-':>12} {'-':>8}")
+            continue
+        change = (run['rows_per_second'] / max(old['rows_per_second'], 1e-9) - 1) * 100
+        flag = ''
+        if max_regression is not None and change < -max_regression:
+            flag = '  REGRESSION'
+            ok = False
+        print(
+            f"{run['rows']:>10,} {run['pass']:>5} {run['rows_per_second']:>12,.0f} "
+            f"{old['rows_per_second']:>12,.0f} {change:>+7.1f}%{flag}"
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the geocoding pipeline against a local mock geocoder')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='sheet sizes in rows (default: 1000 10000 100000; add 1000000 for the full suite)')
+    parser.add_argument('--format', default='xlsx', choices=['xlsx', 'csv', 'parquet'], help='input sheet format')
+    parser.add_argument('--export', default='xlsx', choices=['xlsx', 'csv', 'parquet', 'geojson'], help='export format')
+    parser.add_argument('--unique-ratio', type=float, default=0.2, help='unique cluster centres per row')
+    parser.add_argument('--latency', type=float, default=0.005, help='mock geocoder latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of mock requests that fail with 503')
+    parser.add_argument('--retries', type=int, default=0, help='GEOCODER_MAX_RETRIES for the runs')
+    parser.add_argument('--concurrency', type=int, help='GEOCODER_CONCURRENCY for the runs (default: backend default)')
+    parser.add_argument('--chunk-rows', type=int, default=5000, help='UPLOAD_CHUNK_ROWS for the runs')
+    parser.add_argument('--nearby-meters', type=float, default=0,
+                        help='NEARBY_REUSE_METERS for the runs (default: 0, every point looked up)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic sheets')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per pass; the median by rows/s is reported')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'cluster_benchmark'),
+                        help='where generated sheets are kept between runs')
+    parser.add_argument('--output', default='benchmark_report.json', help='JSON report path')
+    parser.add_argument('--baseline', help='earlier report to compare rows/s against')
+    parser.add_argument('--max-regression', type=float,
+                        help='exit with status 1 if rows/s drops more than this many percent below the baseline')
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    parser.add_argument('--output-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_pipeline(args.run_one, args.export, args.output_file)))
+        return 0
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import cluster_app
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    server = cluster_app.start_mock_nominatim(0, latency=args.latency, error_rate=args.error_rate)
+    mock_url = f"http://127.0.0.1:{server.server_port}"
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {
+            key: getattr(args, key) for key in (
+                'format', 'export', 'unique_ratio', 'latency', 'error_rate',
+                'retries', 'concurrency', 'chunk_rows', 'nearby_meters', 'seed', 'repeat'
+            )
+        },
+        'runs': []
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.sizes:
+            path = os.path.join(args.data_dir, f"clusters_{rows}_{args.unique_ratio}_{args.seed}.{args.format}")
+            if not os.path.exists(path):
+                print(f"Generating {rows:,}-row sheet...", flush=True)
+                generate_sheet(path, rows, unique_ratio=args.unique_ratio, seed=args.seed)
+
+            cache_path = os.path.join(work_dir, f"cache_{rows}.sqlite3")
+            output_path = os.path.join(work_dir, f"result_{rows}.{args.export}")
+            for cache_pass in ('cold', 'warm'):
+                runs = []
+                for _ in range(args.repeat):
+                    if cache_pass == 'cold':
+                        for suffix in ('', '-wal', '-shm'):
+                            if os.path.exists(cache_path + suffix):
+                                os.remove(cache_path + suffix)
+                    runs.append(run_in_subprocess(path, args, cache_path, mock_url, output_path, work_dir))
+                run = sorted(runs, key=lambda r: r['rows_per_second'])[len(runs) // 2]
+                run = {'rows': rows, 'pass': cache_pass, **{k: v for k, v in run.items() if k != 'rows'}}
+                report['runs'].append(run)
+                stages = '  '.join(f"{stage} {seconds:.2f}s" for stage, seconds in run['stages'].items())
+                print(
+                    f"{rows:>10,} rows {cache_pass:>4}: {run['rows_per_second']:>10,.0f} rows/s  "
+                    f"{stages}  peak {run['peak_rss_mb']:.0f} MB",
+                    flush=True
+                )
+
+    server.shutdown()
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
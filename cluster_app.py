@@ -10,38 +10,3107 @@ INSTALLATION INSTRUCTIONS:
 3. Install required packages:
    pip install flask pandas openpyxl geopy werkzeug
 
+   Optional, for the fully offline address index (OFFLINE_ADDRESS_INDEX):
+   pip install scipy pyarrow
+
+   Optional: ADMIN_AREAS_PATH=boundaries.geojson gives points without a street
+   address their city/county/state from local boundary polygons
+
+   Optional: NEARBY_REUSE_METERS=15 lets points within 15 m of one already
+   geocoded to a complete street address reuse that address, house number
+   included, instead of being looked up (such rows are marked 'Nearby Street
+   Address'); off by default
+
 4. Save this file as: cluster_app.py
 5. Run the app:
    python cluster_app.py
 
-6. Open your browser and go to:
-   http://localhost:5000
+6. Open your browser and go to:
+   http://localhost:5000
+
+The app will run locally on your computer and can be used repeatedly!
+
+To serve it from several worker processes, point them at a shared job store:
+   JOB_STORE_PATH=jobs.sqlite3 gunicorn -w 4 cluster_app:app
+
+To geocode a large file without the web app (no upload size limit):
+   python cluster_app.py input.csv output.parquet
+
+To pre-fill the geocode cache overnight, or move it between servers:
+   python cluster_app.py --warm-grid 40.70 -74.02 40.80 -73.93 --step 0.001
+   (points inside a warmed grid then take the address of the nearest grid point)
+   python cluster_app.py --warm-from previous_results.xlsx
+   python cluster_app.py --export-cache cache.tsv.gz    (then --import-cache on the other server)
+
+Full runs of a named dataset only geocode rows that are new or changed since
+its last full run (or whose address is older than GEOCODE_CACHE_TTL); name
+the dataset, and optionally an ID column, with:
+   curl -F file=@clusters.xlsx -F mode=full -F dataset=clusters -F id_column=Cluster_ID http://localhost:5000/upload
+
+Files over 16 MB, or sent over an unreliable connection, can be uploaded in
+resumable, checksummed parts through /uploads (the web page does this for
+large files); see create_upload() for the protocol.
+
+Other services can look up points directly, e.g.:
+   curl -X POST -H 'Content-Type: application/json' -d '[[51.5, -0.12]]' http://localhost:5000/api/reverse
+
+Prometheus can scrape counters and latency histograms from:
+   http://localhost:5000/metrics
+
+To measure throughput against a local mock geocoder, see benchmark.py:
+   python benchmark.py --sizes 1000 10000 100000
+"""
+
+from flask import Flask, Response, render_template, request, send_file, jsonify, session
+import pandas as pd
+import numpy as np
+import openpyxl
+from geopy.geocoders import Nominatim
+from geopy.exc import GeopyError
+from geopy.adapters import AioHTTPAdapter, RequestsAdapter, aiohttp_available, requests_available
+import os
+import time
+from datetime import datetime
+from werkzeug.utils import secure_filename
+import tempfile
+import json
+import shutil
+import io
+import threading
+import queue
+import sqlite3
+import asyncio
+import contextlib
+import functools
+import random
+import collections
+import heapq
+import itertools
+import math
+import bisect
+import gzip
+import hashlib
+import contextvars
+import cProfile
+import pstats
+import argparse
+import sys
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Create Flask app
+app = Flask(__name__)
+app.secret_key = 'your-secret-key-here-change-this'
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
+app.config['UPLOAD_CHUNK_ROWS'] = int(os.environ.get('UPLOAD_CHUNK_ROWS', 5000))  # rows parsed per batch
+
+# Resumable uploads (/uploads): files larger than MAX_CONTENT_LENGTH are sent
+# as numbered parts of UPLOAD_PART_BYTES and assembled in UPLOAD_DIR, which
+# must be shared by workers. An upload that gets no new part for
+# UPLOAD_IDLE_SECONDS is abandoned and deleted.
+app.config['UPLOAD_DIR'] = os.environ.get(
+    'UPLOAD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+)
+app.config['UPLOAD_PART_BYTES'] = int(os.environ.get('UPLOAD_PART_BYTES', 8 * 1024 * 1024))
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+app.config['UPLOAD_IDLE_SECONDS'] = int(os.environ.get('UPLOAD_IDLE_SECONDS', 6 * 3600))
+
+# Reverse-geocode cache settings (override with environment variables)
+app.config['GEOCODE_CACHE_PATH'] = os.environ.get(
+    'GEOCODE_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geocode_cache.sqlite3')
+)
+app.config['GEOCODE_CACHE_PRECISION'] = int(os.environ.get('GEOCODE_CACHE_PRECISION', 6))  # decimal places
+app.config['GEOCODE_CACHE_TTL'] = int(os.environ.get('GEOCODE_CACHE_TTL', 90 * 24 * 3600))  # seconds
+app.config['GEOCODE_CACHE_MAX_ENTRIES'] = int(os.environ.get('GEOCODE_CACHE_MAX_ENTRIES', 1000000))
+
+# Number of jobs processed at the same time; further uploads wait in a queue
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+
+# Minimum seconds between progress stream events for one job
+app.config['PROGRESS_MIN_INTERVAL'] = float(os.environ.get('PROGRESS_MIN_INTERVAL', 0.25))
+
+# Rows whose coordinates match to this many decimals share one lookup
+app.config['DEDUP_PRECISION'] = int(os.environ.get('DEDUP_PRECISION', 6))
+
+# Geocoder backend: nominatim (public), self_hosted, offline or mock.
+# Rate/burst/timeout/retries default per backend (see GEOCODER_BACKENDS).
+app.config['GEOCODER_BACKEND'] = os.environ.get('GEOCODER_BACKEND')
+app.config['GEOCODER_URL'] = os.environ.get('GEOCODER_URL')  # e.g. http://nominatim.internal:8080
+app.config['GEOCODER_RATE'] = float(os.environ['GEOCODER_RATE']) if os.environ.get('GEOCODER_RATE') else None
+app.config['GEOCODER_BURST'] = int(os.environ['GEOCODER_BURST']) if os.environ.get('GEOCODER_BURST') else None
+app.config['GEOCODER_TIMEOUT'] = float(os.environ['GEOCODER_TIMEOUT']) if os.environ.get('GEOCODER_TIMEOUT') else None
+app.config['GEOCODER_MAX_RETRIES'] = int(os.environ['GEOCODER_MAX_RETRIES']) if os.environ.get('GEOCODER_MAX_RETRIES') else None
+app.config['GEOCODER_CONCURRENCY'] = int(os.environ['GEOCODER_CONCURRENCY']) if os.environ.get('GEOCODER_CONCURRENCY') else None
+
+# Offline address-point dataset (CSV or Parquet) used by the offline backend
+app.config['OFFLINE_ADDRESS_INDEX'] = os.environ.get('OFFLINE_ADDRESS_INDEX')
+app.config['OFFLINE_MAX_DISTANCE_M'] = float(os.environ.get('OFFLINE_MAX_DISTANCE_M', 100))
+
+# Administrative boundaries (GeoJSON, see AdminAreaIndex) that give points the
+# geocoder has no address for an area-level address, and answer points in
+# areas marked "streets": false without asking the geocoder at all
+app.config['ADMIN_AREAS_PATH'] = os.environ.get('ADMIN_AREAS_PATH')
+app.config['ADMIN_AREAS_CELL_DEGREES'] = float(os.environ.get('ADMIN_AREAS_CELL_DEGREES', 0.1))
+
+# Opt-in: cache misses within NEARBY_REUSE_METERS of a point already geocoded
+# to a complete street address reuse its address, house number included
+# (Address_Quality 'Nearby Street Address'), instead of being looked up. This
+# trades accuracy for fewer lookups, so it is off (0) unless set. The
+# in-memory index of such points is filled from the geocode cache at startup
+# and keeps at most NEARBY_INDEX_MAX_POINTS of them.
+app.config['NEARBY_REUSE_METERS'] = float(os.environ.get('NEARBY_REUSE_METERS', 0))
+app.config['NEARBY_INDEX_MAX_POINTS'] = int(os.environ.get('NEARBY_INDEX_MAX_POINTS', 500000))
+
+# Completed results: memory ceiling, expiry and where to spill results beyond the ceiling
+app.config['RESULT_MEMORY_LIMIT_MB'] = int(os.environ.get('RESULT_MEMORY_LIMIT_MB', 512))
+app.config['RESULT_TTL'] = int(os.environ.get('RESULT_TTL', 6 * 3600))  # seconds
+app.config['RESULT_SPILL_DIR'] = os.environ.get(
+    'RESULT_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'cluster_results')
+)
+
+# Full-mode jobs save their input and every finished chunk here so they can
+# resume after a restart; chunks are split to at most CHECKPOINT_EVERY rows
+app.config['CHECKPOINT_DIR'] = os.environ.get(
+    'CHECKPOINT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints')
+)
+app.config['CHECKPOINT_EVERY'] = int(os.environ.get('CHECKPOINT_EVERY', 5000))
+
+# Results of the last full run of each named dataset, so a re-upload only
+# geocodes new or changed rows; empty disables it. Must be shared by workers.
+app.config['DATASET_DIR'] = os.environ.get(
+    'DATASET_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets')
+)
+
+# /api/reverse: most points per request, how long a batch waits for other
+# requests to join it, and the most points looked up in one batch. A request
+# waits at most API_LOOKUP_TIMEOUT seconds, plus the time the geocoder rate
+# needs for its points; points still unresolved then come back as 'Error'.
+# Requests with more uncached points than API_MAX_LOOKUPS are refused with
+# 413 before any lookup; 0 allows what the geocoder rate can look up in
+# API_LOOKUP_TIMEOUT seconds (30 on the public Nominatim server).
+app.config['API_MAX_POINTS'] = int(os.environ.get('API_MAX_POINTS', 1000))
+app.config['API_BATCH_WINDOW_MS'] = float(os.environ.get('API_BATCH_WINDOW_MS', 5))
+app.config['API_BATCH_MAX'] = int(os.environ.get('API_BATCH_MAX', 500))
+app.config['API_LOOKUP_TIMEOUT'] = float(os.environ.get('API_LOOKUP_TIMEOUT', 30))
+app.config['API_MAX_LOOKUPS'] = int(os.environ.get('API_MAX_LOOKUPS', 0))
+
+# Shared job store for running several worker processes (e.g. gunicorn -w 4).
+# When set, job state, progress and result locations live in this SQLite file
+# and any worker claims queued jobs under a lease it keeps renewing while the
+# job runs. CHECKPOINT_DIR and RESULT_SPILL_DIR must be shared by the workers.
+app.config['JOB_STORE_PATH'] = os.environ.get('JOB_STORE_PATH')
+app.config['JOB_LEASE_SECONDS'] = int(os.environ.get('JOB_LEASE_SECONDS', 30))
+
+# Global variables for processing status
+processing_status = {}
+
+# Signalled whenever a job's status changes, to wake up progress streams
+status_changed = threading.Condition()
+
+# Fields sent in progress stream events
+PROGRESS_FIELDS = (
+    'status', 'processed', 'total', 'rows', 'rate', 'eta_seconds',
+    'cache_hits', 'cache_misses', 'queue_position', 'message'
+)
+
+# Stages in the per-job time breakdown reported by /progress, in seconds
+JOB_STAGES = ('queue_wait', 'parse', 'cache', 'areas', 'rate_limit', 'network', 'assembly', 'store_results')
+
+
+def notify_status_change(session_id=None, progress=False):
+    """Wake up everything waiting on status_changed
+
+    With a shared job store, the status of ``session_id`` is also written
+    there for the other workers; ``progress`` updates are written at most
+    once per PROGRESS_MIN_INTERVAL.
+    """
+    store = get_job_store()
+    if store is not None and session_id in processing_status:
+        min_interval = app.config['PROGRESS_MIN_INTERVAL'] if progress else 0
+        store.save_status(session_id, processing_status[session_id], min_interval=min_interval)
+    with status_changed:
+        status_changed.notify_all()
+
+
+# Metrics exposed at /metrics, in registration order. Values are kept per
+# process; with several workers each one reports its own.
+METRICS = []
+
+
+class Counter:
+    """Prometheus-style counter, optionally split by labels
+
+    ``labels(*values)`` returns the child for one set of label values; hot
+    paths bind it once and then only pay for a lock and an addition per
+    ``inc``. Metrics register themselves in METRICS for ``render_metrics``.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            # Report unlabelled metrics from the start
+            self.labels()
+        METRICS.append(self)
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            yield '', values, child.value
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Histogram(Counter):
+    """Prometheus-style histogram of observed values, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                yield '_bucket', values + (bound,), cumulative
+            yield '_sum', values, total
+            yield '_count', values, count
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Gauge(Counter):
+    """Gauge whose values are read by ``collect()`` at scrape time
+
+    ``collect`` returns ``{label values tuple: value}``, so state the app
+    already keeps (job counts, counters) is reported without being tracked
+    twice.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, collect, labels=()):
+        self.collect = collect
+        super().__init__(name, help, labels)
+
+    def samples(self):
+        for values, value in self.collect().items():
+            yield '', values, value
+
+
+def _format_sample_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def _format_labels(names, values):
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def render_metrics():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, values, value in metric.samples():
+            names = metric.label_names
+            if suffix == '_bucket':
+                names += ('le',)
+                values = values[:-1] + (_format_sample_value(values[-1]),)
+            labels = _format_labels(names, values)
+            series = f"{metric.name}{suffix}{{{labels}}}" if labels else metric.name + suffix
+            lines.append(f"{series} {_format_sample_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def job_counts():
+    """Number of jobs per state, from the job store when there is one"""
+    store = get_job_store()
+    if store is None:
+        counts = collections.Counter(status['status'] for status in list(processing_status.values()))
+    else:
+        counts = {('processing' if state == 'running' else state): n for state, n in store.stats().items()}
+    states = dict.fromkeys(('queued', 'processing', 'completed', 'error', 'cancelled'), 0)
+    states.update(counts)
+    return {(state,): count for state, count in states.items()}
+
+
+def cache_hit_ratio():
+    hits = GEOCODE_CACHE_LOOKUPS.labels('hit').value
+    misses = GEOCODE_CACHE_LOOKUPS.labels('miss').value
+    return {(): hits / (hits + misses) if hits + misses else 0.0}
+
+
+GEOCODE_REQUEST_SECONDS = Histogram(
+    'cluster_geocode_request_seconds', 'Latency of requests to the geocoder backend', labels=('backend', 'outcome')
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    'cluster_rate_limit_wait_seconds', 'Time lookups waited for a token from the geocoder rate budget',
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+GEOCODE_CACHE_LOOKUPS = Counter(
+    'cluster_geocode_cache_lookups_total', 'Geocode cache lookups of unique points', labels=('result',)
+)
+Gauge('cluster_geocode_cache_hit_ratio', 'Share of geocode cache lookups that were hits', cache_hit_ratio)
+GEOCODE_COALESCED = Counter(
+    'cluster_geocode_coalesced_total', 'Lookups that shared an identical lookup already in flight',
+    labels=('backend',)
+)
+ROWS_PROCESSED = Counter('cluster_rows_processed_total', 'Rows given an address (rate() gives rows per second)')
+STAGE_SECONDS = Counter(
+    'cluster_stage_seconds_total', 'Wall time spent in each stage: parse, lookup, assemble, export',
+    labels=('stage',)
+)
+ADMIN_AREA_ANSWERS = Counter(
+    'cluster_admin_area_answers_total',
+    'Points answered from admin areas: no_streets (lookup skipped) or fallback (empty lookup)',
+    labels=('use',)
+)
+GRID_ANSWERS = Counter(
+    'cluster_grid_answers_total', 'Cache misses answered from the nearest point of a warmed grid'
+)
+NEARBY_REUSES = Counter(
+    'cluster_nearby_reuses_total', 'Cache misses answered with the address of a nearby geocoded point'
+)
+JOB_SECONDS = Histogram(
+    'cluster_job_duration_seconds', 'Wall time of finished jobs by final status', labels=('status',),
+    buckets=(1, 5, 15, 60, 300, 900, 3600, 4 * 3600)
+)
+Gauge('cluster_jobs', 'Jobs by state (across all workers with a shared job store)', job_counts, labels=('state',))
+
+
+class ResultStore:
+    """Completed job results with a memory ceiling, TTL expiry and disk spill
+
+    Dict-like (``in``, ``[]``, ``del``), so it stands in for a plain dict.
+    Results expire ``ttl_seconds`` after they were stored. When the results
+    held in memory exceed ``max_memory_bytes``, the least recently stored
+    ones are written to ``spill_dir`` (Parquet, or pickle when pyarrow is
+    missing or the columns are not Arrow-compatible) and read back lazily
+    when accessed.
+    """
+
+    def __init__(self, spill_dir, max_memory_bytes, ttl_seconds):
+        self.spill_dir = spill_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = collections.OrderedDict()  # session_id -> entry dict, oldest first
+        self.memory_bytes = 0
+        self.counters = {'spilled': 0, 'loaded': 0, 'expired': 0}
+        self.lock = threading.RLock()
+
+    def __contains__(self, session_id):
+        with self.lock:
+            self._expire()
+            return session_id in self.entries
+
+    def __setitem__(self, session_id, df):
+        entry = {'df': df, 'path': None, 'bytes': int(df.memory_usage(deep=True).sum()), 'stored_at': time.time()}
+        with self.lock:
+            if session_id in self.entries:
+                self._remove(session_id)
+            self.entries[session_id] = entry
+            self.memory_bytes += entry['bytes']
+            self._expire()
+            self._spill()
+
+    def __getitem__(self, session_id):
+        df = self.get(session_id)
+        if df is None:
+            raise KeyError(session_id)
+        return df
+
+    def get(self, session_id):
+        """Return a result, or None if there is none (or it expired while being read)"""
+        with self.lock:
+            self._expire()
+            entry = self.entries.get(session_id)
+            if entry is None:
+                return None
+            if entry['df'] is not None:
+                return entry['df']
+            path = entry['path']
+            self.counters['loaded'] += 1
+        
+        # Spilled results are read back for this caller only, not kept in
+        # memory; the file goes away if the result is removed meanwhile
+        try:
+            return read_result_file(path)
+        except FileNotFoundError:
+            return None
+
+    def __delitem__(self, session_id):
+        with self.lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id):
+        entry = self.entries.pop(session_id)
+        if entry['df'] is not None:
+            self.memory_bytes -= entry['bytes']
+        if entry['path'] and os.path.exists(entry['path']):
+            os.remove(entry['path'])
+
+    def _expire(self):
+        """Drop results older than the TTL (lock must be held)"""
+        cutoff = time.time() - self.ttl_seconds
+        for session_id in [sid for sid, entry in self.entries.items() if entry['stored_at'] < cutoff]:
+            self._remove(session_id)
+            self.counters['expired'] += 1
+
+    def _spill(self):
+        """Write the oldest in-memory results to disk until under the ceiling (lock must be held)"""
+        for session_id, entry in self.entries.items():
+            if self.memory_bytes <= self.max_memory_bytes:
+                break
+            if entry['df'] is None:
+                continue
+            
+            if entry['path'] is None:
+                entry['path'] = self._write(session_id, entry['df'])
+            entry['df'] = None
+            self.memory_bytes -= entry['bytes']
+            self.counters['spilled'] += 1
+
+    def _write(self, session_id, df):
+        """Write a result to the spill directory and return its path"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{session_id}.parquet")
+        try:
+            df.to_parquet(path, index=False)
+        except Exception:
+            # No pyarrow, or mixed-type columns Arrow can't hold
+            if os.path.exists(path):
+                os.remove(path)
+            path = os.path.join(self.spill_dir, f"{session_id}.pkl")
+            df.to_pickle(path)
+        return path
+
+    def persist(self, session_id):
+        """Write a result to disk while keeping it in memory, and return the file path"""
+        with self.lock:
+            entry = self.entries[session_id]
+            if entry['path'] is None:
+                entry['path'] = self._write(session_id, entry['df'])
+            return entry['path']
+
+    def expire(self):
+        """Drop expired results"""
+        with self.lock:
+            self._expire()
+
+    def stats(self):
+        """Memory and eviction statistics"""
+        with self.lock:
+            in_memory = sum(1 for entry in self.entries.values() if entry['df'] is not None)
+            return {
+                'results_in_memory': in_memory,
+                'results_on_disk': len(self.entries) - in_memory,
+                'memory_bytes': self.memory_bytes,
+                'memory_limit_bytes': self.max_memory_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                **self.counters
+            }
+
+
+def read_result_file(path):
+    """Read a result written by ResultStore"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def profile_path(session_id):
+    """Where a profiled job's cProfile output is kept (shared by all workers)"""
+    return os.path.join(app.config['RESULT_SPILL_DIR'], f"{secure_filename(session_id)}.prof")
+
+
+results_storage = ResultStore(
+    app.config['RESULT_SPILL_DIR'],
+    max_memory_bytes=app.config['RESULT_MEMORY_LIMIT_MB'] * 1024 * 1024,
+    ttl_seconds=app.config['RESULT_TTL']
+)
+
+
+def expire_sessions():
+    """Forget finished jobs and results older than RESULT_TTL"""
+    results_storage.expire()
+    cutoff = time.time() - app.config['RESULT_TTL']
+    store = get_job_store()
+    if store is not None:
+        store.expire(cutoff)
+        # Drop local copies of results already downloaded through another worker
+        for session_id in list(results_storage.entries):
+            if store.status(session_id) is None:
+                with contextlib.suppress(KeyError):
+                    del results_storage[session_id]
+    for session_id, status in list(processing_status.items()):
+        if status.get('finished_at', float('inf')) < cutoff:
+            processing_status.pop(session_id, None)
+    
+    # Profiles outlive the download of their results, up to the same TTL
+    spill_dir = app.config['RESULT_SPILL_DIR']
+    for name in os.listdir(spill_dir) if os.path.isdir(spill_dir) else []:
+        path = os.path.join(spill_dir, name)
+        with contextlib.suppress(OSError):
+            if name.endswith('.prof') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+    
+    # Resumable uploads that stopped getting parts, and what is left of finished ones
+    upload_dir = app.config['UPLOAD_DIR']
+    idle_cutoff = time.time() - app.config['UPLOAD_IDLE_SECONDS']
+    for upload_id in os.listdir(upload_dir) if os.path.isdir(upload_dir) else []:
+        upload = ChunkedUpload(upload_dir, upload_id)
+        with contextlib.suppress(OSError):
+            if upload.last_activity() < idle_cutoff:
+                upload.delete()
+
+
+def _expire_sessions_periodically(interval=60):
+    while True:
+        time.sleep(interval)
+        try:
+            expire_sessions()
+        except Exception:
+            # A file removed under us or a locked database must not stop later sweeps
+            app.logger.exception('Session cleanup failed; retrying in %s s', interval)
+
+
+_session_janitor = None
+_session_janitor_lock = threading.Lock()
+
+
+@app.before_request
+def start_session_janitor():
+    """Start the thread expiring old sessions, results and uploads, on the first request"""
+    global _session_janitor
+    if _session_janitor is not None:
+        return
+    with _session_janitor_lock:
+        if _session_janitor is None:
+            _session_janitor = threading.Thread(target=_expire_sessions_periodically, name='session-janitor', daemon=True)
+            _session_janitor.start()
+
+
+class JobCheckpoint:
+    """Durable record of a job's input and finished chunks for crash recovery
+
+    Each job gets a directory under ``root`` holding ``job.json`` (job
+    settings), one ``input-NNNNN.pkl`` per input chunk and one
+    ``result-NNNNN.pkl`` per geocoded chunk. Files are written to a temp
+    name and renamed, so a crash never leaves a half-written checkpoint.
+
+    ``lease_lost`` is an event set when another worker has taken the job
+    over; the checkpoint is then left in place for that worker.
+    """
+
+    def __init__(self, root, session_id, lease_lost=None):
+        self.session_id = session_id
+        self.path = os.path.join(root, session_id)
+        self.lease_lost = lease_lost
+        self.cond = threading.Condition()
+        self.spooling = False
+        self.stopped = False
+        self.last_heartbeat = 0
+
+    @classmethod
+    def create(cls, root, session_id, **meta):
+        checkpoint = cls(root, session_id)
+        os.makedirs(checkpoint.path, exist_ok=True)
+        checkpoint.write_meta({'session_id': session_id, 'created_at': time.time(),
+                               'input_complete': False, **meta})
+        return checkpoint
+
+    def _file(self, kind, index):
+        return os.path.join(self.path, f"{kind}-{index:05d}.pkl")
+
+    def _write_atomic(self, path, write):
+        tmp_path = path + '.tmp'
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def read_meta(self):
+        with open(os.path.join(self.path, 'job.json')) as f:
+            return json.load(f)
+
+    def write_meta(self, meta):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+        self._write_atomic(os.path.join(self.path, 'job.json'), write)
+
+    def spool_input(self, chunks, every, timings=None):
+        """Save every input chunk, split to at most ``every`` rows, in a background thread
+
+        The upload is written out at parse speed rather than geocoding
+        speed, so the whole input survives a restart even while the job is
+        still queued or running. The parse time in ``timings`` is recorded
+        with the input, for a job run by another worker.
+        """
+        def spool():
+            try:
+                index = 0
+                for chunk in chunks:
+                    for piece in iter_chunks(chunk, every):
+                        if self.stopped:
+                            return
+                        self._write_atomic(self._file('input', index), piece.to_pickle)
+                        index += 1
+                        with self.cond:
+                            self.cond.notify_all()
+                parse_seconds = None if timings is None else timings['parse']
+                self.write_meta({**self.read_meta(), 'input_complete': True, 'parse_seconds': parse_seconds})
+            except Exception as e:
+                # Recorded in job.json so a reader in another worker sees it too
+                with contextlib.suppress(OSError, ValueError):
+                    self.write_meta({**self.read_meta(), 'error': str(e)})
+            finally:
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+                with self.cond:
+                    self.spooling = False
+                    self.cond.notify_all()
+        
+        self.spooling = True
+        threading.Thread(target=spool, daemon=True).start()
+
+    def heartbeat(self):
+        """Record that the spooler is alive while it waits for more of the upload"""
+        now = time.time()
+        if now - self.last_heartbeat < 1:
+            return
+        self.last_heartbeat = now
+        with contextlib.suppress(OSError, ValueError):
+            self.write_meta({**self.read_meta(), 'spooler_alive_at': now})
+
+    def input_chunks(self, stall_timeout=None):
+        """Yield the saved input chunks in order, waiting for the spooler if needed
+
+        The spooler may run in another worker process. If no new chunk
+        arrives, and no heartbeat, for ``stall_timeout`` seconds before the
+        input is complete, the upload is treated as lost.
+        """
+        index = 0
+        waiting_since = time.time()
+        while True:
+            path = self._file('input', index)
+            if os.path.exists(path):
+                yield pd.read_pickle(path)
+                index += 1
+                waiting_since = time.time()
+                continue
+            
+            meta = self.read_meta()
+            if meta.get('error'):
+                raise RuntimeError(meta['error'])
+            if meta['input_complete']:
+                # The last chunk may have landed just before job.json was updated
+                if not os.path.exists(path):
+                    return
+                continue
+            if stall_timeout and time.time() - max(waiting_since, meta.get('spooler_alive_at', 0)) > stall_timeout:
+                raise RuntimeError('The upload was interrupted; please upload the file again')
+            
+            with self.cond:
+                if self.spooling and not os.path.exists(path):
+                    self.cond.wait(timeout=1)
+                elif not self.spooling:
+                    self.cond.wait(timeout=0.2)
+
+    def save_result(self, index, chunk):
+        self._write_atomic(self._file('result', index), chunk.to_pickle)
+
+    def has_result(self, index):
+        return os.path.exists(self._file('result', index))
+
+    def load_result(self, index):
+        return pd.read_pickle(self._file('result', index))
+
+    def finish(self):
+        """Stop spooling and delete the checkpoint once the job has ended"""
+        self.stopped = True
+        if self.lease_lost is not None and self.lease_lost.is_set():
+            return
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def resume_checkpointed_jobs():
+    """Re-queue jobs left unfinished by a previous run of the server
+
+    Chunks that were already geocoded are loaded from the checkpoint instead
+    of being looked up again. Jobs whose upload was still being parsed when
+    the server stopped cannot be resumed and are reported as errors.
+
+    With a shared job store, interrupted jobs are instead taken over once
+    their lease lapses; this only starts the workers that claim them.
+    """
+    if get_job_store() is not None:
+        get_job_scheduler()
+        return []
+    
+    root = app.config['CHECKPOINT_DIR']
+    if not root or not os.path.isdir(root):
+        return []
+    
+    resumed = []
+    for session_id in sorted(os.listdir(root)):
+        checkpoint = JobCheckpoint(root, session_id)
+        if session_id in processing_status:
+            continue
+        try:
+            meta = checkpoint.read_meta()
+        except (OSError, ValueError):
+            checkpoint.finish()
+            continue
+        
+        if not meta['input_complete']:
+            processing_status[session_id] = {
+                'status': 'error',
+                'message': 'The server restarted while the file was uploading; please upload it again',
+                'finished_at': time.time()
+            }
+            checkpoint.finish()
+            continue
+        
+        processing_status[session_id] = {
+            'status': 'queued',
+            'total': 0,
+            'processed': 0,
+            'rows': 0,
+            'resumed': True,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'results': None,
+            **(meta.get('history') or {})
+        }
+        get_job_scheduler().submit(
+            session_id,
+            process_addresses,
+            args=(checkpoint.input_chunks(), session_id, meta.get('rows_to_process')),
+            kwargs={'checkpoint': checkpoint},
+            priority=meta.get('priority', 1)
+        )
+        resumed.append(session_id)
+    return resumed
+
+
+_jobs_resumed = False
+
+
+@app.before_request
+def resume_jobs_once():
+    """Resume checkpointed jobs (and start job workers) on the first request when run under a WSGI server"""
+    global _jobs_resumed
+    if not _jobs_resumed:
+        _jobs_resumed = True
+        resume_checkpointed_jobs()
+
+
+# Sentinel returned by the cache when a key is not stored
+CACHE_MISS = object()
+
+
+class GeocodeCache:
+    """Persistent SQLite cache of reverse-geocode payloads
+
+    Keys are coordinates rounded to ``precision`` decimal places. Entries older
+    than ``ttl_seconds`` are treated as misses, and once the table grows past
+    ``max_entries`` the least recently used rows are evicted. A stored payload
+    of ``None`` records that the geocoder found nothing at that point.
+
+    Grids warmed by warm_cache_grid are recorded too, so that points inside
+    one can be answered from the nearest grid point (see ``grid_keys``).
+    """
+
+    def __init__(self, path, precision=6, ttl_seconds=90 * 24 * 3600, max_entries=1000000):
+        self.path = path
+        self.precision = precision
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS geocode_cache ('
+            'key TEXT PRIMARY KEY, payload TEXT, created_at REAL, accessed_at REAL)'
+        )
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_geocode_cache_accessed ON geocode_cache (accessed_at)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS warm_grids ('
+            'south REAL, west REAL, north REAL, east REAL, step REAL, precision INTEGER, created_at REAL)'
+        )
+        self.size = self.conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+
+    def make_key(self, lat, lon):
+        """Build the cache key for a coordinate pair"""
+        return f"{float(lat):.{self.precision}f},{float(lon):.{self.precision}f}"
+
+    def get(self, key):
+        """Return the cached payload for key, or CACHE_MISS"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT payload, created_at FROM geocode_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return CACHE_MISS
+            if self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self.conn.execute('DELETE FROM geocode_cache WHERE key = ?', (key,))
+                self.size -= 1
+                return CACHE_MISS
+            self.conn.execute('UPDATE geocode_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def get_many(self, keys):
+        """Return {key: payload} for every stored, unexpired key in keys"""
+        now = time.time()
+        found = {}
+        expired = []
+        with self.lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.conn.execute(
+                    'SELECT key, payload, created_at FROM geocode_cache WHERE key IN '
+                    f"({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, payload, created_at in rows:
+                    if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                        expired.append((key,))
+                    else:
+                        found[key] = json.loads(payload)
+            
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'UPDATE geocode_cache SET accessed_at = ? WHERE key = ?',
+                [(now, key) for key in found]
+            )
+            self.conn.executemany('DELETE FROM geocode_cache WHERE key = ?', expired)
+            self.conn.execute('COMMIT')
+            self.size -= len(expired)
+        return found
+
+    def put(self, key, payload):
+        """Store a payload and evict least recently used entries if over capacity"""
+        now = time.time()
+        with self.lock:
+            existed = self.conn.execute(
+                'SELECT 1 FROM geocode_cache WHERE key = ?', (key,)
+            ).fetchone() is not None
+            self.conn.execute(
+                'INSERT OR REPLACE INTO geocode_cache (key, payload, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, json.dumps(payload), now, now)
+            )
+            if not existed:
+                self.size += 1
+            if self.max_entries and self.size > self.max_entries:
+                self._evict(self.size - self.max_entries)
+
+    def put_many(self, entries, replace=True):
+        """Store ``(key, payload, created_at)`` entries in one transaction
+
+        With ``replace`` an entry overwrites a stored one only if it is
+        newer; otherwise stored keys are left alone. Returns the number of
+        entries written.
+        """
+        now = time.time()
+        rows = [(key, json.dumps(payload), created_at or now, now) for key, payload, created_at in entries]
+        if replace:
+            sql = (
+                'INSERT INTO geocode_cache (key, payload, created_at, accessed_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, created_at = excluded.created_at, '
+                'accessed_at = excluded.accessed_at WHERE excluded.created_at > geocode_cache.created_at'
+            )
+        else:
+            sql = 'INSERT OR IGNORE INTO geocode_cache (key, payload, created_at, accessed_at) VALUES (?, ?, ?, ?)'
+        with self.lock:
+            changes = self.conn.total_changes
+            self.conn.execute('BEGIN')
+            self.conn.executemany(sql, rows)
+            self.conn.execute('COMMIT')
+            written = self.conn.total_changes - changes
+            self.size = self.conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+            if self.max_entries and self.size > self.max_entries:
+                self._evict(self.size - self.max_entries)
+        return written
+
+    def add_grid(self, south, west, north, east, step, precision):
+        """Record a grid of points spaced ``step`` degrees (rounded to ``precision`` decimals) as warmed"""
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO warm_grids (south, west, north, east, step, precision, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (south, west, north, east, step, precision, time.time())
+            )
+
+    def grid_keys(self, lats, lons):
+        """Cache key of the nearest warmed grid point for each coordinate, or None outside every grid
+
+        Where grids overlap the finest one is used. Points up to half a step
+        outside a grid's box still snap to its edge.
+        """
+        with self.lock:
+            grids = self.conn.execute(
+                'SELECT south, west, north, east, step, precision FROM warm_grids ORDER BY step DESC'
+            ).fetchall()
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        keys = [None] * len(lats)
+        for south, west, north, east, step, precision in grids:
+            inside = ((lats >= south - step / 2) & (lats <= north + step / 2)
+                      & (lons >= west - step / 2) & (lons <= east + step / 2))
+            # Same grid points as warm_cache_grid builds
+            lat_index = np.clip(np.round(lats / step), np.ceil(south / step - 1e-6), np.floor(north / step + 1e-6))
+            lon_index = np.clip(np.round(lons / step), np.ceil(west / step - 1e-6), np.floor(east / step + 1e-6))
+            for i in np.flatnonzero(inside):
+                keys[i] = self.make_key(round(lat_index[i] * step, precision), round(lon_index[i] * step, precision))
+        return keys
+
+    def iter_entries(self, batch_size=10000):
+        """Yield ``(key, payload JSON, created_at)`` for every unexpired entry
+
+        Reads a snapshot through its own connection, so lookups are not
+        blocked while a large cache is exported.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            cutoff = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+            cursor = conn.execute(
+                'SELECT key, payload, created_at FROM geocode_cache WHERE created_at >= ?', (cutoff,)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            conn.close()
+
+    def _evict(self, count):
+        """Delete the count least recently used entries (lock must be held)"""
+        self.conn.execute(
+            'DELETE FROM geocode_cache WHERE key IN ('
+            'SELECT key FROM geocode_cache ORDER BY accessed_at LIMIT ?)',
+            (count,)
+        )
+        self.size = self.conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+
+
+_geocode_cache = None
+_geocode_cache_lock = threading.Lock()
+
+
+def get_geocode_cache():
+    """Return the shared geocode cache, opening it on first use"""
+    global _geocode_cache
+    with _geocode_cache_lock:
+        if _geocode_cache is None:
+            _geocode_cache = GeocodeCache(
+                app.config['GEOCODE_CACHE_PATH'],
+                precision=app.config['GEOCODE_CACHE_PRECISION'],
+                ttl_seconds=app.config['GEOCODE_CACHE_TTL'],
+                max_entries=app.config['GEOCODE_CACHE_MAX_ENTRIES']
+            )
+        return _geocode_cache
+
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def unit_vectors(lats, lons):
+    """Convert degree coordinates to 3D points on the unit sphere"""
+    lat_r = np.radians(np.asarray(lats, dtype=float))
+    lon_r = np.radians(np.asarray(lons, dtype=float))
+    cos_lat = np.cos(lat_r)
+    return np.column_stack((cos_lat * np.cos(lon_r), cos_lat * np.sin(lon_r), np.sin(lat_r)))
+
+
+def hilbert_order(lats, lons, bits=20):
+    """Indices that sort coordinates along a Hilbert curve over the globe
+
+    Points next to each other on the curve are close on the ground too, so
+    looking points up in this order keeps neighbours together.
+    """
+    side = 1 << bits
+    x = ((np.clip(np.asarray(lons, dtype=float), -180, 180) + 180) / 360 * (side - 1)).astype(np.int64)
+    y = ((np.clip(np.asarray(lats, dtype=float), -90, 90) + 90) / 180 * (side - 1)).astype(np.int64)
+    d = np.zeros(len(x), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous
+        flip = rx & ~ry
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return np.argsort(d, kind='stable')
+
+
+class AddressPointIndex:
+    """Nearest-address lookups over a local address-point dataset
+
+    Points are stored on the unit sphere in a KD-tree, where the straight-line
+    (chord) distance orders neighbours exactly like the haversine distance, so
+    a whole batch is answered by a single vectorized tree query. Results use
+    the same payload shape as a Nominatim lookup.
+    """
+
+    COLUMNS = ['lat', 'lon', 'house_number', 'road', 'city', 'state', 'postcode']
+
+    def __init__(self, points, max_distance_m=100):
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            raise RuntimeError('The offline address index requires scipy: pip install scipy')
+        
+        points = points.dropna(subset=['lat', 'lon']).reset_index(drop=True)
+        self.records = points.reindex(columns=self.COLUMNS[2:]).fillna('').astype(str).to_dict('records')
+        self.max_distance_m = max_distance_m
+        self.tree = cKDTree(unit_vectors(points['lat'], points['lon']))
+
+    @classmethod
+    def load(cls, path, max_distance_m=100):
+        """Load an address-point CSV or Parquet file"""
+        if path.lower().endswith('.parquet'):
+            points = pd.read_parquet(path, columns=cls.COLUMNS)
+        else:
+            points = pd.read_csv(path, usecols=lambda col: col in cls.COLUMNS, dtype=str)
+        points['lat'] = pd.to_numeric(points['lat'], errors='coerce')
+        points['lon'] = pd.to_numeric(points['lon'], errors='coerce')
+        return cls(points, max_distance_m=max_distance_m)
+
+    def query(self, lats, lons):
+        """Return the nearest address payload (or None) for each coordinate"""
+        if len(lats) == 0:
+            return []
+        
+        max_chord = 2 * np.sin(self.max_distance_m / (2 * EARTH_RADIUS_M))
+        _, nearest = self.tree.query(unit_vectors(lats, lons), k=1, distance_upper_bound=max_chord)
+        
+        payloads = []
+        for i in nearest:
+            if i >= len(self.records):
+                # Nothing within max_distance_m
+                payloads.append(None)
+                continue
+            address = {k: v for k, v in self.records[i].items() if v}
+            parts = [f"{address.get('house_number', '')} {address.get('road', '')}".strip()]
+            parts += [address[k] for k in ('city', 'state', 'postcode') if k in address]
+            payloads.append({
+                'address': address,
+                'display_name': ', '.join(p for p in parts if p)
+            })
+        return payloads
+
+
+class NearbyAddressIndex:
+    """In-memory index of geocode cache keys whose payload is a complete street address
+
+    Points are bucketed into a grid of ``radius_m`` cells on the unit
+    sphere, so everything within ``radius_m`` of a point is in its own cell
+    or one of the 26 around it. Only the cache keys are held; the payloads
+    stay in the cache. Past ``max_points`` the oldest points are dropped.
+    """
+
+    NEIGHBOURS = list(itertools.product((-1, 0, 1), repeat=3))
+
+    def __init__(self, radius_m=15, max_points=500000):
+        self.radius_m = radius_m
+        self.max_points = max_points
+        self.max_chord = 2 * np.sin(radius_m / (2 * EARTH_RADIUS_M))
+        self.scale = EARTH_RADIUS_M / radius_m
+        self.cells = {}  # cell -> {cache key: unit vector}
+        self.points = collections.OrderedDict()  # cache key -> cell, oldest first
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_complete(payload):
+        if not payload:
+            return False
+        house, street = address_components(payload)[:2]
+        return bool(house) and bool(street)
+
+    def _cells(self, vectors):
+        return [tuple(cell) for cell in np.floor(vectors * self.scale).astype(np.int64).tolist()]
+
+    def add(self, cache_keys):
+        """Index cache keys ("lat,lon") known to hold a complete street address"""
+        cache_keys = [key for key in cache_keys if key not in self.points]
+        if not cache_keys:
+            return
+        coords = np.array([key.split(',') for key in cache_keys], dtype=float)
+        vectors = unit_vectors(coords[:, 0], coords[:, 1])
+        with self.lock:
+            for key, vector, cell in zip(cache_keys, vectors.tolist(), self._cells(vectors)):
+                if key in self.points:
+                    continue
+                self.cells.setdefault(cell, {})[key] = vector
+                self.points[key] = cell
+            while len(self.points) > self.max_points:
+                key, cell = self.points.popitem(last=False)
+                self._remove(key, cell)
+
+    def discard(self, cache_keys):
+        """Forget cache keys, e.g. ones no longer in the cache"""
+        with self.lock:
+            for key in cache_keys:
+                cell = self.points.pop(key, None)
+                if cell is not None:
+                    self._remove(key, cell)
+
+    def _remove(self, key, cell):
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def query(self, lats, lons):
+        """Return the nearest indexed cache key within radius_m (or None) for each coordinate"""
+        if len(lats) == 0:
+            return []
+        vectors = unit_vectors(lats, lons)
+        found = []
+        with self.lock:
+            for vector, (x, y, z) in zip(vectors.tolist(), self._cells(vectors)):
+                best, best_chord = None, self.max_chord
+                for dx, dy, dz in self.NEIGHBOURS:
+                    for key, other in self.cells.get((x + dx, y + dy, z + dz), {}).items():
+                        chord = math.dist(vector, other)
+                        if chord <= best_chord:
+                            best, best_chord = key, chord
+                found.append(best)
+        return found
+
+    def leaders(self, lats, lons):
+        """Flag each coordinate that is not within radius_m of an earlier flagged one"""
+        if len(lats) == 0:
+            return []
+        vectors = unit_vectors(lats, lons)
+        cells = {}
+        flags = []
+        for vector, (x, y, z) in zip(vectors.tolist(), self._cells(vectors)):
+            lead = not any(
+                math.dist(vector, other) <= self.max_chord
+                for dx, dy, dz in self.NEIGHBOURS
+                for other in cells.get((x + dx, y + dy, z + dz), ())
+            )
+            if lead:
+                cells.setdefault((x, y, z), []).append(vector)
+            flags.append(lead)
+        return flags
+
+    def warm(self, cache, batch_size=10000):
+        """Index the complete street addresses already in the cache, until the index is full"""
+        batch = []
+        for key, payload, _ in cache.iter_entries():
+            # Most payloads without a house number are skipped without parsing them
+            if '"house_number"' in payload and self.is_complete(json.loads(payload)):
+                batch.append(key)
+            if len(batch) >= batch_size:
+                self.add(batch)
+                batch = []
+                if len(self.points) >= self.max_points:
+                    return
+        self.add(batch)
+
+
+class AdminAreaIndex:
+    """Point-in-polygon lookups over administrative boundaries (city, county, state, ...)
+
+    Loaded from a GeoJSON FeatureCollection of Polygon/MultiPolygon features
+    whose properties give the area's ``kind`` (one of KINDS) and ``name``.
+    Features with ``"streets": false`` mark areas where the geocoder never
+    returns a street address, so points there are answered locally.
+
+    Features are registered in a uniform grid of ``cell_degrees`` cells by
+    bounding box; features spanning more than ``max_cells`` cells (states,
+    countries) are kept in a short list checked against every batch
+    instead. A batch tests each candidate feature once, vectorized over all
+    of the batch's points in its cells, with an even-odd ray test over the
+    feature's edges (holes included). Where areas of one kind overlap, the
+    smallest wins.
+    """
+
+    KINDS = ('city', 'county', 'state', 'postcode', 'country')
+
+    def __init__(self, features, cell_degrees=0.1, max_cells=1024):
+        self.cell_degrees = cell_degrees
+        self.names = []
+        self.kinds = []
+        self.streets = []
+        self.bboxes = []
+        self.edges = []
+        areas = []
+        for properties, polygons in features:
+            kind, name = properties.get('kind'), properties.get('name')
+            if kind not in self.KINDS or not name:
+                continue
+            rings = [np.asarray(ring, dtype=float)[:, :2] for polygon in polygons for ring in polygon if len(ring) >= 3]
+            if not rings:
+                continue
+            # Edges as (x1, y1, x2, y2) rows over every ring, closing each ring
+            self.edges.append(np.vstack([np.hstack([ring, np.roll(ring, -1, axis=0)]) for ring in rings]))
+            points = np.vstack(rings)
+            self.bboxes.append((*points.min(axis=0), *points.max(axis=0)))
+            self.names.append(str(name))
+            self.kinds.append(kind)
+            self.streets.append(properties.get('streets', True) is not False)
+            # Shoelace area of the outer rings, in square degrees
+            outer = [np.asarray(polygon[0], dtype=float)[:, :2] for polygon in polygons if len(polygon[0]) >= 3]
+            areas.append(sum(
+                abs(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2 for x, y in (ring.T for ring in outer)
+            ))
+        
+        # Rank 0 is the largest area; smaller areas of the same kind overwrite larger ones in query()
+        self.rank = np.argsort(np.argsort(-np.asarray(areas, dtype=float), kind='stable'), kind='stable')
+        self.large = []
+        cell_codes, cell_features = [], []
+        for i in range(len(self.names)):
+            min_x, min_y = self._cells(*self.bboxes[i][:2])
+            max_x, max_y = self._cells(*self.bboxes[i][2:])
+            if (max_x - min_x + 1) * (max_y - min_y + 1) > max_cells:
+                self.large.append(i)
+                continue
+            xs, ys = np.meshgrid(np.arange(min_x, max_x + 1), np.arange(min_y, max_y + 1))
+            cell_codes.append(self._cell_code(xs.ravel(), ys.ravel()))
+            cell_features.append(np.full(xs.size, i))
+        
+        # Grid as sorted cell codes, each owning a slice of grid_features
+        codes = np.concatenate(cell_codes) if cell_codes else np.zeros(0, dtype=np.int64)
+        features = np.concatenate(cell_features) if cell_features else np.zeros(0, dtype=np.int64)
+        order = np.argsort(codes, kind='stable')
+        self.grid_codes, starts = np.unique(codes[order], return_index=True)
+        self.grid_starts = np.append(starts, len(codes))
+        self.grid_features = features[order]
+
+    @classmethod
+    def load(cls, path, **options):
+        """Load a GeoJSON FeatureCollection"""
+        with open(path) as f:
+            collection = json.load(f)
+        features = []
+        for feature in collection.get('features', []):
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                continue
+            features.append((feature.get('properties') or {}, polygons))
+        return cls(features, **options)
+
+    def _cells(self, lon, lat):
+        return (int(np.floor(lon / self.cell_degrees)), int(np.floor(lat / self.cell_degrees)))
+
+    @staticmethod
+    def _cell_code(x, y):
+        # Unique while |y| < 2**31, i.e. any cell size above 1e-7 degrees
+        return np.asarray(x, dtype=np.int64) * (1 << 32) + np.asarray(y, dtype=np.int64)
+
+    def _contains(self, feature, lons, lats, max_pairs=2000000):
+        """Even-odd point-in-polygon test of one feature against arrays of points"""
+        x1, y1, x2, y2 = self.edges[feature].T
+        inside = np.zeros(len(lons), dtype=bool)
+        step = max(1, max_pairs // len(x1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for start in range(0, len(lons), step):
+                px = lons[start:start + step, None]
+                py = lats[start:start + step, None]
+                spans = (y1 > py) != (y2 > py)
+                crossing_x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+                inside[start:start + step] = (spans & (px < crossing_x)).sum(axis=1) % 2 == 1
+        return inside
+
+    def query(self, lats, lons):
+        """Return ``(payloads, streets)`` for coordinate arrays
+
+        ``payloads`` holds an address payload with the enclosing areas (or
+        None outside every area); ``streets`` is False where an enclosing
+        area has ``"streets": false``.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        matches = np.full((len(lats), len(self.KINDS)), -1)
+        streets = np.ones(len(lats), dtype=bool)
+        
+        # (point, feature) candidate pairs from the grid cells the points fall in
+        codes = self._cell_code(np.floor(lons / self.cell_degrees), np.floor(lats / self.cell_degrees))
+        slot = np.searchsorted(self.grid_codes, codes)
+        found = slot < len(self.grid_codes)
+        found[found] = self.grid_codes[slot[found]] == codes[found]
+        slot = slot[found]
+        counts = self.grid_starts[slot + 1] - self.grid_starts[slot]
+        pair_points = np.repeat(np.flatnonzero(found), counts)
+        offsets = np.arange(len(pair_points)) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_features = self.grid_features[np.repeat(self.grid_starts[slot], counts) + offsets]
+        
+        # Each candidate feature is tested once against all of its points, largest areas first
+        order = np.argsort(self.rank[pair_features], kind='stable')
+        pair_points, pair_features = pair_points[order], pair_features[order]
+        bounds = np.flatnonzero(np.diff(pair_features)) + 1
+        candidates = [
+            (features[0], points) for features, points in zip(np.split(pair_features, bounds), np.split(pair_points, bounds))
+            if len(features)
+        ]
+        candidates += [(feature, np.arange(len(lats))) for feature in self.large]
+        candidates.sort(key=lambda candidate: self.rank[candidate[0]])
+        
+        for feature, indices in candidates:
+            min_x, min_y, max_x, max_y = self.bboxes[feature]
+            indices = indices[
+                (lons[indices] >= min_x) & (lons[indices] <= max_x) & (lats[indices] >= min_y) & (lats[indices] <= max_y)
+            ]
+            if not len(indices):
+                continue
+            indices = indices[self._contains(feature, lons[indices], lats[indices])]
+            matches[indices, self.KINDS.index(self.kinds[feature])] = feature
+            if not self.streets[feature]:
+                streets[indices] = False
+        
+        # One payload per distinct combination of areas
+        combinations, inverse = np.unique(matches, axis=0, return_inverse=True)
+        unique_payloads = []
+        for combination in combinations:
+            address = {kind: self.names[feature] for kind, feature in zip(self.KINDS, combination) if feature >= 0}
+            unique_payloads.append({'address': address, 'display_name': ', '.join(address.values())} if address else None)
+        payloads = [unique_payloads[i] for i in inverse.ravel()]
+        return payloads, streets.tolist()
+
+
+_admin_areas = None
+_admin_areas_lock = threading.Lock()
+
+
+def get_admin_areas():
+    """Return the admin-area index, loading it on first use, or None when ADMIN_AREAS_PATH is not set"""
+    global _admin_areas
+    if not app.config['ADMIN_AREAS_PATH']:
+        return None
+    with _admin_areas_lock:
+        if _admin_areas is None:
+            _admin_areas = AdminAreaIndex.load(
+                app.config['ADMIN_AREAS_PATH'], cell_degrees=app.config['ADMIN_AREAS_CELL_DEGREES']
+            )
+        return _admin_areas
+
+
+_nearby_index = None
+_nearby_index_lock = threading.Lock()
+
+
+def get_nearby_index():
+    """Return the nearby-address index, creating it on first use, or None when NEARBY_REUSE_METERS is 0
+
+    The points already in the geocode cache are added in the background.
+    """
+    global _nearby_index
+    if app.config['NEARBY_REUSE_METERS'] <= 0:
+        return None
+    with _nearby_index_lock:
+        if _nearby_index is None:
+            _nearby_index = NearbyAddressIndex(
+                app.config['NEARBY_REUSE_METERS'], max_points=app.config['NEARBY_INDEX_MAX_POINTS']
+            )
+            threading.Thread(
+                target=_nearby_index.warm, args=(get_geocode_cache(),), name='nearby-warm', daemon=True
+            ).start()
+        return _nearby_index
+
+
+def location_payload(location):
+    """Reduce a geopy Location to the cacheable address payload"""
+    if not location or not location.raw:
+        return None
+    return {
+        'address': location.raw.get('address', {}),
+        'display_name': location.address
+    }
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter
+
+    ``reserve()`` takes a token and returns how many seconds the caller has to
+    wait before using it, so the same bucket can pace threads (``acquire()``)
+    and coroutines (``await asyncio.sleep(bucket.reserve())``). A rate of
+    ``None`` disables limiting.
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return the delay before it may be used"""
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """Block until a token is available"""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+
+class FairRateBudget:
+    """Rate budget shared by every job, granted round-robin between them
+
+    ``request(client)`` returns a Future that resolves when the caller may
+    send one request. A dispatcher thread hands out tokens from a
+    TokenBucket, cycling over the clients that are waiting so a job with
+    many queued lookups cannot starve the others. Threads block with
+    ``acquire(client)``; coroutines ``await asyncio.wrap_future(...)``.
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.bucket = TokenBucket(rate, burst)
+        self.waiting = collections.OrderedDict()  # client -> deque of futures
+        self.cond = threading.Condition()
+        self.dispatcher = None
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def request(self, client=None):
+        """Queue a request for one token and return its Future"""
+        future = Future()
+        if not self.bucket.rate:
+            future.set_result(None)
+            return future
+        
+        with self.cond:
+            self.waiting.setdefault(client, collections.deque()).append(future)
+            if self.dispatcher is None:
+                self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self.dispatcher.start()
+            self.cond.notify()
+        return future
+
+    def acquire(self, client=None):
+        """Block until a token is granted"""
+        self.request(client).result()
+
+    def _next_future(self):
+        """Pop the next live future, rotating between clients (lock must be held)"""
+        while self.waiting:
+            client, futures = next(iter(self.waiting.items()))
+            future = futures.popleft()
+            # Move the client to the back of the rotation
+            del self.waiting[client]
+            if futures:
+                self.waiting[client] = futures
+            if future.set_running_or_notify_cancel():
+                return future
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self.cond:
+                while not self.waiting:
+                    self.cond.wait()
+            self.bucket.acquire()
+            with self.cond:
+                future = self._next_future()
+            if future is not None:
+                future.set_result(None)
+            else:
+                # Token was taken for a request that got cancelled; return it
+                with self.bucket.lock:
+                    self.bucket.tokens = min(self.bucket.burst, self.bucket.tokens + 1)
+
+
+# Per-request seconds summed for the lookups of the current job, as
+# {'network': ..., 'rate_limit': ...}; set by ChunkGeocoder around its lookups
+lookup_timings = contextvars.ContextVar('lookup_timings', default=None)
+
+
+class GeocoderBackend:
+    """Base class for reverse-geocoding backends
+
+    Subclasses implement ``_reverse(lat, lon)`` returning an address payload
+    (see ``location_payload``) or ``None``, and raise ``GeopyError`` on
+    failure. ``reverse()`` adds the backend's rate limit and retry policy.
+    The rate budget is shared by all callers; ``client`` (the job's session
+    id) is used to share it fairly. Concurrent ``areverse`` calls for the
+    same point, from any job or API request, share one lookup.
+    """
+
+    name = 'base'
+    uses_cache = True  # local backends are faster than the cache and skip it
+    key_precision = 6  # decimals of the in-flight lookup keys, as for GeocodeCache keys
+
+    def __init__(self, rate=None, burst=1, timeout=10, max_retries=2, retry_wait=2.0, concurrency=1):
+        self.rate_budget = FairRateBudget(rate, burst)
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_wait = retry_wait
+        self.request_seconds = GEOCODE_REQUEST_SECONDS.labels(self.name, 'ok')
+        self.failed_request_seconds = GEOCODE_REQUEST_SECONDS.labels(self.name, 'error')
+        self.in_flight = {}  # cache key -> Future of the lookup under way
+        self.in_flight_lock = threading.Lock()
+
+    def _reverse(self, lat, lon):
+        raise NotImplementedError
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter for the given retry attempt"""
+        delay = random.uniform(0, self.retry_wait * 2 ** attempt)
+        sums = lookup_timings.get()
+        if sums is not None:
+            sums['rate_limit'] += delay
+        return delay
+
+    def record_wait(self, seconds):
+        """Record time spent waiting for a rate-limit token"""
+        RATE_LIMIT_WAIT_SECONDS.observe(seconds)
+        sums = lookup_timings.get()
+        if sums is not None:
+            sums['rate_limit'] += seconds
+
+    def record_request(self, started, ok=True):
+        """Record the latency of a request sent at perf_counter() ``started``"""
+        seconds = time.perf_counter() - started
+        (self.request_seconds if ok else self.failed_request_seconds).observe(seconds)
+        sums = lookup_timings.get()
+        if sums is not None:
+            sums['network'] += seconds
+
+    def reverse(self, lat, lon, client=None):
+        """Look up one coordinate, retrying with exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            waited = time.perf_counter()
+            self.rate_budget.acquire(client)
+            started = time.perf_counter()
+            self.record_wait(started - waited)
+            try:
+                payload = self._reverse(lat, lon)
+            except GeopyError:
+                self.record_request(started, ok=False)
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+            else:
+                self.record_request(started)
+                return payload
+
+    def reverse_batch(self, points, client=None):
+        """Look up a list of (lat, lon) pairs"""
+        return [self.reverse(lat, lon, client) for lat, lon in points]
+
+    @contextlib.asynccontextmanager
+    async def async_client(self):
+        """Yield a coroutine function doing one raw lookup
+
+        The default runs the blocking ``_reverse`` on a thread pool sized to
+        the backend's concurrency.
+        """
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            yield lambda lat, lon: loop.run_in_executor(executor, self._reverse, lat, lon)
+        finally:
+            executor.shutdown(wait=False)
+
+    async def areverse(self, lookup, lat, lon, client=None):
+        """Async ``reverse`` using a lookup from ``async_client``
+
+        A call for a point under the same geocode cache key as one already
+        being looked up (by any thread or event loop) waits for that
+        lookup's payload or error instead of spending the rate budget again.
+        Cancelling a waiting call leaves the shared lookup running.
+        """
+        key = f"{float(lat):.{self.key_precision}f},{float(lon):.{self.key_precision}f}"
+        with self.in_flight_lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+        
+        if not leader:
+            GEOCODE_COALESCED.labels(self.name).inc()
+            started = time.perf_counter()
+            try:
+                return await asyncio.shield(asyncio.wrap_future(future))
+            finally:
+                # Waiting on another caller's request counts as network time
+                sums = lookup_timings.get()
+                if sums is not None:
+                    sums['network'] += time.perf_counter() - started
+        
+        try:
+            payload = await self._areverse(lookup, lat, lon, client)
+        except BaseException as e:
+            with self.in_flight_lock:
+                del self.in_flight[key]
+            # Waiters only see lookup errors, not this caller's cancellation
+            if not future.done():
+                future.set_exception(e if isinstance(e, Exception) else GeopyError('The shared lookup was interrupted'))
+            raise
+        with self.in_flight_lock:
+            del self.in_flight[key]
+        if not future.done():
+            future.set_result(payload)
+        return payload
+
+    async def _areverse(self, lookup, lat, lon, client=None):
+        for attempt in range(self.max_retries + 1):
+            waited = time.perf_counter()
+            await asyncio.wrap_future(self.rate_budget.request(client))
+            started = time.perf_counter()
+            self.record_wait(started - waited)
+            try:
+                payload = await lookup(lat, lon)
+            except GeopyError:
+                self.record_request(started, ok=False)
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+            else:
+                self.record_request(started)
+                return payload
+
+
+class NominatimBackend(GeocoderBackend):
+    """Public or self-hosted Nominatim server"""
+
+    name = 'nominatim'
+
+    def __init__(self, url=None, user_agent='cluster_finder', **limits):
+        super().__init__(**limits)
+        self.options = {'user_agent': user_agent, 'timeout': self.timeout}
+        if url:
+            scheme, _, domain = url.partition('://')
+            self.options.update(scheme=scheme, domain=domain.rstrip('/'))
+        
+        sync_options = dict(self.options)
+        if requests_available:
+            # Keep one pooled keep-alive connection per concurrent lookup
+            sync_options['adapter_factory'] = functools.partial(
+                RequestsAdapter, pool_connections=1, pool_maxsize=self.concurrency
+            )
+        self.geolocator = Nominatim(**sync_options)
+
+    def _reverse(self, lat, lon):
+        location = self.geolocator.reverse(
+            (lat, lon),
+            exactly_one=True,
+            zoom=18,
+            language='en'
+        )
+        return location_payload(location)
+
+    @contextlib.asynccontextmanager
+    async def async_client(self):
+        if not aiohttp_available:
+            async with super().async_client() as lookup:
+                yield lookup
+            return
+        
+        # One aiohttp session per run keeps connections alive across lookups
+        async with Nominatim(**self.options, adapter_factory=AioHTTPAdapter) as geolocator:
+            async def lookup(lat, lon):
+                location = await geolocator.reverse(
+                    (lat, lon),
+                    exactly_one=True,
+                    zoom=18,
+                    language='en'
+                )
+                return location_payload(location)
+            yield lookup
+
+
+class OfflineBackend(GeocoderBackend):
+    """Local address-point index; answers whole batches without network calls"""
+
+    name = 'offline'
+    uses_cache = False
+
+    def __init__(self, index, **limits):
+        super().__init__(**limits)
+        self.index = index
+
+    def _reverse(self, lat, lon):
+        return self.index.query([lat], [lon])[0]
+
+    def reverse_batch(self, points, client=None):
+        # One index query answers the batch, so it counts as one request
+        started = time.perf_counter()
+        payloads = self.index.query([p[0] for p in points], [p[1] for p in points])
+        self.record_request(started)
+        return payloads
+
+
+# Default limits per backend; GEOCODER_RATE/BURST/TIMEOUT/MAX_RETRIES/CONCURRENCY override them
+GEOCODER_BACKENDS = {
+    # Public server usage policy: at most one request per second
+    'nominatim': {'rate': 1.0, 'burst': 1, 'timeout': 10, 'max_retries': 2, 'concurrency': 2},
+    'self_hosted': {'rate': 25.0, 'burst': 10, 'timeout': 5, 'max_retries': 3, 'concurrency': 16},
+    'offline': {'rate': None, 'burst': 1, 'timeout': 0, 'max_retries': 0, 'concurrency': 1},
+    'mock': {'rate': None, 'burst': 1, 'timeout': 2, 'max_retries': 0, 'concurrency': 32},
+}
+
+
+def create_geocoder_backend(name, url=None, **overrides):
+    """Build a backend by name, applying any non-None limit overrides"""
+    if name not in GEOCODER_BACKENDS:
+        raise ValueError(f"Unknown geocoder backend '{name}', expected one of {sorted(GEOCODER_BACKENDS)}")
+    
+    limits = dict(GEOCODER_BACKENDS[name])
+    limits.update({k: v for k, v in overrides.items() if v is not None})
+    
+    if name == 'offline':
+        path = app.config['OFFLINE_ADDRESS_INDEX']
+        if not path:
+            raise ValueError('The offline backend needs OFFLINE_ADDRESS_INDEX')
+        index = AddressPointIndex.load(path, max_distance_m=app.config['OFFLINE_MAX_DISTANCE_M'])
+        return OfflineBackend(index, **limits)
+    
+    if name == 'self_hosted' and not url:
+        raise ValueError('The self_hosted backend needs GEOCODER_URL')
+    if name == 'mock':
+        url = url or 'http://127.0.0.1:8089'
+    return NominatimBackend(url=url, **limits)
+
+
+_geocoder_backend = None
+_geocoder_backend_lock = threading.Lock()
 
-The app will run locally on your computer and can be used repeatedly!
-"""
 
-from flask import Flask, render_template, request, send_file, jsonify, session
-import pandas as pd
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
-import os
-import time
-from datetime import datetime
-from werkzeug.utils import secure_filename
-import tempfile
-import json
-import threading
-import queue
+def get_geocoder_backend():
+    """Return the configured geocoder backend, creating it on first use"""
+    global _geocoder_backend
+    with _geocoder_backend_lock:
+        if _geocoder_backend is None:
+            name = app.config['GEOCODER_BACKEND']
+            if not name:
+                name = 'offline' if app.config['OFFLINE_ADDRESS_INDEX'] else 'nominatim'
+            _geocoder_backend = create_geocoder_backend(
+                name,
+                url=app.config['GEOCODER_URL'],
+                rate=app.config['GEOCODER_RATE'],
+                burst=app.config['GEOCODER_BURST'],
+                timeout=app.config['GEOCODER_TIMEOUT'],
+                max_retries=app.config['GEOCODER_MAX_RETRIES'],
+                concurrency=app.config['GEOCODER_CONCURRENCY']
+            )
+            # Lookups that would share a cache entry share one request
+            _geocoder_backend.key_precision = app.config['GEOCODE_CACHE_PRECISION']
+        return _geocoder_backend
 
-# Create Flask app
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here-change-this'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
 
-# Global variables for processing status
-processing_status = {}
-results_storage = {}
+async def _lookup_all(backend, points, on_result, client=None, cancel_event=None):
+    """Resolve points with a fixed number of concurrent workers"""
+    pending = iter(points)
+    
+    async with backend.async_client() as lookup:
+        async def worker():
+            # Workers share one iterator, so each point is taken exactly once
+            for point in pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                try:
+                    payload = await backend.areverse(lookup, *point, client=client)
+                except Exception as e:
+                    on_result(point, None, e)
+                else:
+                    on_result(point, payload, None)
+        
+        await asyncio.gather(*(worker() for _ in range(min(backend.concurrency, len(points)))))
+
+
+def lookup_concurrently(backend, points, on_result, client=None, cancel_event=None):
+    """Look up (lat, lon) points concurrently, calling on_result(point, payload, error)
+
+    Lookups overlap their network latency while still drawing from the
+    backend's rate budget as ``client``. Stops taking new points once
+    ``cancel_event`` is set. Runs its own event loop, so call it from a
+    worker thread.
+    """
+    if points:
+        asyncio.run(_lookup_all(backend, points, on_result, client, cancel_event))
+
+
+class ReverseBatcher:
+    """Coalesces lookups from concurrent API requests into shared backend batches
+
+    ``lookup`` has the same signature as lookup_concurrently, so it can be
+    handed to a ChunkGeocoder. Points are queued; a dispatcher thread waits
+    up to ``window`` seconds after the first one arrives (or until
+    ``max_batch`` are queued) and looks the whole batch up concurrently on
+    one of ``workers`` threads. A point already queued or in flight for
+    another request is not looked up twice. A caller waits at most
+    ``timeout`` seconds plus the time the backend's rate allows for its
+    points; points not resolved by then get a TimeoutError (their lookup
+    carries on and still fills the cache).
+    """
+
+    def __init__(self, backend, window=0.005, max_batch=500, workers=4, client='api', timeout=30):
+        self.backend = backend
+        self.window = window
+        self.max_batch = max_batch
+        self.client = client
+        self.timeout = timeout
+        self.futures = {}  # point -> Future, while queued or in flight
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-batch')
+        self.dispatcher = None
+        self.batches = 0
+
+    def lookup(self, backend, points, on_result, client=None, cancel_event=None):
+        """Queue points and call on_result(point, payload, error) for each once resolved"""
+        with self.cond:
+            futures = []
+            for point in points:
+                future = self.futures.get(point)
+                if future is None:
+                    future = self.futures[point] = Future()
+                    self.queue.append(point)
+                futures.append(future)
+            if self.dispatcher is None:
+                self.dispatcher = threading.Thread(target=self._dispatch, name='api-batcher', daemon=True)
+                self.dispatcher.start()
+            self.cond.notify()
+        
+        rate = self.backend.rate_budget.rate
+        deadline = time.monotonic() + self.timeout + (len(points) / rate if rate else 0)
+        for point, future in zip(points, futures):
+            try:
+                payload = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                on_result(point, None, e)
+            else:
+                on_result(point, payload, None)
+
+    def _dispatch(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                # Give concurrent requests a moment to join the batch
+                deadline = time.monotonic() + self.window
+                while len(self.queue) < self.max_batch and time.monotonic() < deadline:
+                    self.cond.wait(deadline - time.monotonic())
+                batch = [self.queue.popleft() for _ in range(min(self.max_batch, len(self.queue)))]
+                self.batches += 1
+            self.executor.submit(self._run, batch)
+
+    def _run(self, batch):
+        def on_result(point, payload, error):
+            with self.cond:
+                future = self.futures.pop(point)
+            if error is None:
+                future.set_result(payload)
+            else:
+                future.set_exception(error)
+        
+        try:
+            lookup_concurrently(self.backend, batch, on_result, self.client)
+        except Exception as e:
+            with self.cond:
+                unresolved = [self.futures.pop(point) for point in batch if point in self.futures]
+            for future in unresolved:
+                future.set_exception(e)
+
+
+_reverse_batcher = None
+_reverse_batcher_lock = threading.Lock()
+
+
+def get_reverse_batcher():
+    """Return the shared API batcher, creating it on first use"""
+    global _reverse_batcher
+    with _reverse_batcher_lock:
+        if _reverse_batcher is None:
+            _reverse_batcher = ReverseBatcher(
+                get_geocoder_backend(),
+                window=app.config['API_BATCH_WINDOW_MS'] / 1000,
+                max_batch=app.config['API_BATCH_MAX'],
+                timeout=app.config['API_LOOKUP_TIMEOUT']
+            )
+        return _reverse_batcher
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled"""
+
+
+class JobScheduler:
+    """Fixed pool of worker threads running jobs from a priority queue
+
+    Jobs with a lower priority number run first; equal priorities run in
+    submission order. Each job gets a ``cancel_event`` keyword argument that
+    is set when the job is cancelled while running; a job cancelled while
+    still queued never runs and its ``on_cancel`` callback is called instead.
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.heap = []  # (priority, sequence, session_id)
+        self.jobs = {}  # session_id -> (func, args, kwargs, cancel_event, on_cancel) while queued or running
+        self.sequence = 0
+        self.cond = threading.Condition()
+        self.threads = []
+
+    def submit(self, session_id, func, args=(), kwargs=None, priority=1, on_cancel=None):
+        """Queue func(*args, **kwargs, cancel_event=...) to run as job session_id"""
+        with self.cond:
+            if not self.threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                    thread.start()
+                    self.threads.append(thread)
+            self.jobs[session_id] = (func, args, kwargs or {}, threading.Event(), on_cancel)
+            heapq.heappush(self.heap, (priority, self.sequence, session_id))
+            self.sequence += 1
+            self.cond.notify()
+
+    def position(self, session_id):
+        """1-based position of a queued job, or None if it is not waiting"""
+        with self.cond:
+            waiting = sorted(entry for entry in self.heap if entry[2] in self.jobs)
+            for position, entry in enumerate(waiting, start=1):
+                if entry[2] == session_id:
+                    return position
+        return None
+
+    def queued(self):
+        """Number of jobs waiting for a worker"""
+        with self.cond:
+            return sum(1 for entry in self.heap if entry[2] in self.jobs)
+
+    def cancel(self, session_id):
+        """Cancel a queued or running job
+
+        Returns 'queued' or 'running' for the state the job was cancelled
+        in, or None if the job is unknown or already finished.
+        """
+        with self.cond:
+            if session_id not in self.jobs:
+                return None
+            func, args, kwargs, cancel_event, on_cancel = self.jobs[session_id]
+            cancel_event.set()
+            queued = any(entry[2] == session_id for entry in self.heap)
+            if queued:
+                # Never started; the worker skips it when popped
+                del self.jobs[session_id]
+        
+        if not queued:
+            return 'running'
+        if on_cancel is not None:
+            on_cancel()
+        return 'queued'
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.heap:
+                    self.cond.wait()
+                _, _, session_id = heapq.heappop(self.heap)
+                job = self.jobs.get(session_id)
+            if job is None:
+                continue
+            
+            func, args, kwargs, cancel_event, _ = job
+            try:
+                func(*args, **kwargs, cancel_event=cancel_event)
+            finally:
+                with self.cond:
+                    self.jobs.pop(session_id, None)
+
+
+class JobStore:
+    """Job state, progress and result locations shared by every worker process
+
+    Backed by SQLite in WAL mode, so any process on the host (or any host
+    sharing the file) can report on any job. Queued jobs are claimed by a
+    worker under a lease of ``lease_seconds`` that it renews while the job
+    runs; a job whose lease has lapsed, because its worker died, is handed
+    to the next worker that asks. Status writes from a worker that no longer
+    holds the lease are ignored.
+    """
+
+    FINAL_STATES = ('completed', 'error', 'cancelled')
+
+    def __init__(self, path, worker_id, lease_seconds=30):
+        self.path = path
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.last_saved = {}  # session_id -> time of the last status write
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT UNIQUE NOT NULL, '
+            'priority INTEGER, rows_to_process INTEGER, state TEXT, status TEXT, '
+            'worker TEXT, lease_expires REAL, cancel_requested INTEGER DEFAULT 0, '
+            'result_path TEXT, created_at REAL, finished_at REAL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (state, priority, seq)')
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Hold the write lock across a read-modify-write (lock must be held)"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    def add(self, session_id, status, priority=1, rows_to_process=None):
+        """Queue a new job"""
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO jobs (session_id, priority, rows_to_process, state, status, created_at) '
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (session_id, priority, rows_to_process, json.dumps(status), time.time())
+            )
+
+    def claim(self):
+        """Lease the next queued (or abandoned) job to this worker
+
+        Returns ``(session_id, rows_to_process)``, or None when there is
+        nothing to run.
+        """
+        now = time.time()
+        with self.lock, self._transaction():
+            row = self.conn.execute(
+                "SELECT session_id, rows_to_process FROM jobs WHERE state = 'queued' "
+                "OR (state = 'running' AND lease_expires < ?) ORDER BY priority, seq LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    "UPDATE jobs SET state = 'running', worker = ?, lease_expires = ? WHERE session_id = ?",
+                    (self.worker_id, now + self.lease_seconds, row[0])
+                )
+        return row
+
+    def renew(self, session_id):
+        """Extend this worker's lease on a job
+
+        Returns 'cancel' if the job has been cancelled, 'lost' if another
+        worker holds the lease now, or None.
+        """
+        with self.lock:
+            updated = self.conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE session_id = ? AND worker = ? AND state = 'running'",
+                (time.time() + self.lease_seconds, session_id, self.worker_id)
+            ).rowcount
+            if not updated:
+                return 'lost'
+            cancel_requested = self.conn.execute(
+                'SELECT cancel_requested FROM jobs WHERE session_id = ?', (session_id,)
+            ).fetchone()[0]
+        return 'cancel' if cancel_requested else None
+
+    def save_status(self, session_id, status, min_interval=0):
+        """Store the status of a job this worker holds the lease on"""
+        now = time.time()
+        final = status['status'] in self.FINAL_STATES
+        if not final and now - self.last_saved.get(session_id, 0) < min_interval:
+            return
+        self.last_saved[session_id] = now
+        with self.lock:
+            self.conn.execute(
+                'UPDATE jobs SET status = ?, state = CASE WHEN ? THEN ? ELSE state END, '
+                'finished_at = CASE WHEN ? THEN ? ELSE finished_at END '
+                'WHERE session_id = ? AND worker = ?',
+                (json.dumps(status), final, status['status'], final, now, session_id, self.worker_id)
+            )
+        if final:
+            self.last_saved.pop(session_id, None)
+
+    def status(self, session_id):
+        """Return a job's status dict, or None if the job is unknown"""
+        with self.lock:
+            row = self.conn.execute('SELECT status FROM jobs WHERE session_id = ?', (session_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def position(self, session_id):
+        """1-based position of a queued job, or None if it is not waiting"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs AS waiting JOIN jobs AS job ON job.session_id = ? "
+                "WHERE job.state = 'queued' AND waiting.state = 'queued' "
+                "AND (waiting.priority < job.priority OR (waiting.priority = job.priority AND waiting.seq <= job.seq))",
+                (session_id,)
+            ).fetchone()
+        return row[0] or None
+
+    def queued(self):
+        """Number of jobs waiting for a worker"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0]
+
+    def request_cancel(self, session_id):
+        """Cancel a job, returning 'queued', 'running' or None like JobScheduler.cancel
+
+        A queued job is marked cancelled straight away; a running one is
+        flagged and its worker stops it when it next renews the lease.
+        """
+        now = time.time()
+        with self.lock, self._transaction():
+            row = self.conn.execute(
+                'SELECT state, status FROM jobs WHERE session_id = ?', (session_id,)
+            ).fetchone()
+            if row is None or row[0] in self.FINAL_STATES:
+                return None
+            if row[0] == 'running':
+                self.conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE session_id = ?', (session_id,))
+                return 'running'
+            
+            status = json.loads(row[1])
+            status['status'] = 'cancelled'
+            status['finished_at'] = now
+            self.conn.execute(
+                "UPDATE jobs SET state = 'cancelled', status = ?, finished_at = ? WHERE session_id = ?",
+                (json.dumps(status), now, session_id)
+            )
+        return 'queued'
+
+    def set_result(self, session_id, path):
+        """Record where a completed job's result file is"""
+        with self.lock:
+            self.conn.execute('UPDATE jobs SET result_path = ? WHERE session_id = ?', (path, session_id))
+
+    def result_path(self, session_id):
+        """Path of a job's result file, or None"""
+        with self.lock:
+            row = self.conn.execute('SELECT result_path FROM jobs WHERE session_id = ?', (session_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def delete(self, session_id):
+        """Forget a job and delete its result file"""
+        with self.lock:
+            row = self.conn.execute('SELECT result_path FROM jobs WHERE session_id = ?', (session_id,)).fetchone()
+            self.conn.execute('DELETE FROM jobs WHERE session_id = ?', (session_id,))
+        if row is not None and row[0] and os.path.exists(row[0]):
+            os.remove(row[0])
+
+    def expire(self, cutoff):
+        """Forget jobs that finished before cutoff, deleting their result files"""
+        with self.lock, self._transaction():
+            rows = self.conn.execute(
+                'SELECT result_path FROM jobs WHERE finished_at < ?', (cutoff,)
+            ).fetchall()
+            self.conn.execute('DELETE FROM jobs WHERE finished_at < ?', (cutoff,))
+        for (path,) in rows:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def stats(self):
+        """Number of jobs per state"""
+        with self.lock:
+            return dict(self.conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """Return the shared job store, or None when JOB_STORE_PATH is not set"""
+    global _job_store
+    if not app.config['JOB_STORE_PATH']:
+        return None
+    with _job_store_lock:
+        # Each process opens its own connection, e.g. after a gunicorn fork
+        if _job_store is None or _job_store.pid != os.getpid():
+            if not app.config['CHECKPOINT_DIR']:
+                raise RuntimeError('JOB_STORE_PATH needs CHECKPOINT_DIR to share job input between workers')
+            _job_store = JobStore(
+                app.config['JOB_STORE_PATH'],
+                worker_id=f"{socket.gethostname()}:{os.getpid()}",
+                lease_seconds=app.config['JOB_LEASE_SECONDS']
+            )
+        return _job_store
+
+
+class LeasedJobScheduler:
+    """Worker threads that claim jobs from a JobStore shared with other processes
+
+    Same interface as JobScheduler, except that ``submit`` only needs the
+    session ID: the job is already in the store, and whichever worker claims
+    it calls ``run(session_id, rows_to_process, cancel_event, lease_lost)``.
+    A heartbeat thread renews the leases of running jobs, and sets their
+    ``cancel_event`` when they are cancelled from another process or their
+    lease has been lost (``lease_lost`` is set as well then).
+    """
+
+    def __init__(self, store, run, workers=2, poll_interval=0.5):
+        self.store = store
+        self.run = run
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.running = {}  # session_id -> (cancel_event, lease_lost)
+        self.cond = threading.Condition()
+        self.threads = []
+
+    def start(self):
+        """Start the worker and heartbeat threads if they are not running"""
+        with self.cond:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name='job-lease-heartbeat', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, session_id, *args, **kwargs):
+        """Wake an idle worker for a job just added to the store"""
+        self.start()
+        with self.cond:
+            self.cond.notify()
+
+    def position(self, session_id):
+        return self.store.position(session_id)
+
+    def queued(self):
+        return self.store.queued()
+
+    def cancel(self, session_id):
+        """Cancel a queued or running job, in this process or another"""
+        cancelled_while = self.store.request_cancel(session_id)
+        with self.cond:
+            if session_id in self.running:
+                self.running[session_id][0].set()
+        if cancelled_while == 'queued':
+            # Never started, so nobody else will clean up its input
+            JobCheckpoint(app.config['CHECKPOINT_DIR'], session_id).finish()
+        return cancelled_while
+
+    def _work(self):
+        while True:
+            claimed = self.store.claim()
+            if claimed is None:
+                with self.cond:
+                    self.cond.wait(timeout=self.poll_interval)
+                continue
+            
+            session_id, rows_to_process = claimed
+            cancel_event, lease_lost = threading.Event(), threading.Event()
+            with self.cond:
+                self.running[session_id] = (cancel_event, lease_lost)
+            try:
+                self.run(session_id, rows_to_process, cancel_event, lease_lost)
+            finally:
+                with self.cond:
+                    self.running.pop(session_id, None)
+
+    def _heartbeat(self):
+        interval = min(1.0, self.store.lease_seconds / 3)
+        while True:
+            time.sleep(interval)
+            with self.cond:
+                running = list(self.running.items())
+            for session_id, (cancel_event, lease_lost) in running:
+                outcome = self.store.renew(session_id)
+                if outcome == 'lost':
+                    lease_lost.set()
+                if outcome is not None:
+                    cancel_event.set()
+
+
+_job_scheduler = None
+_job_scheduler_lock = threading.Lock()
+
+
+def get_job_scheduler():
+    """Return the shared job scheduler, creating it on first use
+
+    With a job store this is a LeasedJobScheduler whose workers start
+    claiming jobs straight away.
+    """
+    global _job_scheduler
+    with _job_scheduler_lock:
+        if _job_scheduler is None:
+            store = get_job_store()
+            if store is None:
+                _job_scheduler = JobScheduler(workers=app.config['JOB_WORKERS'])
+            else:
+                _job_scheduler = LeasedJobScheduler(store, run_stored_job, workers=app.config['JOB_WORKERS'])
+                _job_scheduler.start()
+        return _job_scheduler
+
+
+class MockNominatimHandler(BaseHTTPRequestHandler):
+    """Nominatim-compatible /reverse endpoint returning synthetic addresses"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real server
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # response waits ~40 ms for the client's delayed ACK
+    disable_nagle_algorithm = True
+    latency = 0.0  # seconds added to every response
+    error_rate = 0.0  # fraction of requests answered with 503
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path.rstrip('/') != '/reverse' or 'lat' not in params or 'lon' not in params:
+            self.send_error(404)
+            return
+        
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.send_error(503)
+            return
+        
+        lat = float(params['lat'][0])
+        lon = float(params['lon'][0])
+        address = {
+            'house_number': str(int(abs(lat * 1e4)) % 9999 + 1),
+            'road': f"Mock Street {int(abs(lon * 100)) % 500}",
+            'city': 'Mockville',
+            'state': 'Mock State',
+            'postcode': f"{int(abs(lat * 1e3)) % 100000:05d}"
+        }
+        body = json.dumps({
+            'lat': str(lat),
+            'lon': str(lon),
+            'display_name': ', '.join(address.values()),
+            'address': address
+        }).encode()
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockNominatimServer(ThreadingHTTPServer):
+    """Threaded HTTP server sized for many concurrent client connections"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_mock_nominatim(port=8089, latency=0.0, error_rate=0.0):
+    """Start a mock Nominatim server in a daemon thread and return it (port 0 picks a free port)"""
+    handler = type('MockHandler', (MockNominatimHandler,), {'latency': latency, 'error_rate': error_rate})
+    server = MockNominatimServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# File types accepted by /upload
+UPLOAD_FORMATS = ('.xlsx', '.xls', '.csv', '.parquet')
+REQUIRED_COLUMNS = ['Center_Latitude', 'Center_Longitude']
+
+
+def upload_format(filename):
+    """Return the lower-case extension of filename if it is an accepted upload type"""
+    ext = os.path.splitext(filename)[1].lower()
+    return ext if ext in UPLOAD_FORMATS else None
+
+
+class UploadParseError(ValueError):
+    """Raised when an uploaded file is corrupt or not in the format its name says"""
+
+
+def read_upload_chunks(stream, fmt, chunk_rows=5000, usecols=None, timings=None):
+    """Parse an uploaded file stream into DataFrames of up to chunk_rows rows
+
+    Rows are yielded as soon as they are parsed, so processing can start
+    before the whole file has been read. ``.xlsx`` files are read with
+    openpyxl's read-only mode and CSV/Parquet in native batches; legacy
+    ``.xls`` files have to be parsed whole. ``usecols`` limits parsing to
+    the named columns; names missing from the file are ignored. Parse
+    time is added to ``timings['parse']`` if given. A file the parser
+    rejects raises UploadParseError; read errors and a missing pyarrow
+    are passed on as they are.
+    """
+    chunks = _parse_upload_chunks(stream, fmt, chunk_rows, usecols)
+    try:
+        while True:
+            # Time spent parsing, not waiting for the consumer
+            started = time.perf_counter()
+            try:
+                chunk = next(chunks, None)
+            except (OSError, RuntimeError):
+                raise
+            except Exception as e:
+                detail = str(e).strip().splitlines()[0][:200] if str(e).strip() else type(e).__name__
+                raise UploadParseError(
+                    f'The file could not be read as {fmt}; it may be corrupt or saved in another format ({detail})'
+                ) from e
+            seconds = time.perf_counter() - started
+            STAGE_SECONDS.labels('parse').inc(seconds)
+            if timings is not None:
+                timings['parse'] += seconds
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        chunks.close()
+
+
+def _parse_upload_chunks(stream, fmt, chunk_rows, usecols):
+    wanted = None if usecols is None else (lambda name: name in usecols)
+    
+    if fmt == '.csv':
+        yield from pd.read_csv(stream, chunksize=chunk_rows, usecols=wanted)
+    
+    elif fmt == '.parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError('Parquet uploads require pyarrow: pip install pyarrow')
+        parquet = pq.ParquetFile(stream)
+        columns = None if usecols is None else [name for name in parquet.schema_arrow.names if name in usecols]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    
+    elif fmt == '.xls':
+        df = pd.read_excel(stream, usecols=wanted)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+    
+    else:
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+            keep = [i for i, name in enumerate(columns) if usecols is None or name in usecols]
+            columns = [columns[i] for i in keep]
+            
+            batch = []
+            yielded = False
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                batch.append([row[i] if i < len(row) else None for i in keep])
+                if len(batch) == chunk_rows:
+                    yield pd.DataFrame(batch, columns=columns)
+                    yielded = True
+                    batch = []
+            if batch or not yielded:
+                yield pd.DataFrame(batch, columns=columns)
+        finally:
+            workbook.close()
+
+
+def prefetch(iterable, depth=2):
+    """Run an iterator in a background thread, buffering up to depth items
+
+    Lets parsing of later chunks overlap with processing of earlier ones.
+    Exceptions raised by the iterator are re-raised in the consumer, and
+    closing the returned generator stops (and closes) the iterator.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((None, e))
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+    
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def detach_upload_stream(file):
+    """Take ownership of an uploaded file's stream
+
+    Werkzeug closes request files when the request ends; swapping in an
+    empty stream lets a background parser keep reading after the response.
+    The caller must close the returned stream.
+    """
+    stream = file.stream
+    file.stream = io.BytesIO()
+    return stream
+
+
+# Signalled whenever a part of a resumable upload arrives, to wake up its reader
+upload_part_arrived = threading.Condition()
+
+
+class ChunkedUpload:
+    """A file sent to /uploads as numbered, checksummed parts and assembled on disk
+
+    Each upload gets a directory under ``root`` holding ``upload.json``
+    (file name, size, part size and the /upload form options), ``data``
+    (the file, preallocated to its full size) and an empty ``part-N``
+    marker for every part written. Parts may arrive in any order, more
+    than once and at any worker sharing ``root``; each is checked against
+    its SHA-256 before being written at its offset.
+    """
+
+    def __init__(self, root, upload_id):
+        self.upload_id = upload_id
+        self.path = os.path.join(root, secure_filename(upload_id))
+        self.meta = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def create(cls, root, filename, size, part_bytes, options):
+        upload = cls(root, os.urandom(8).hex())
+        os.makedirs(upload.path)
+        with open(upload._file('data'), 'wb') as f:
+            f.truncate(size)
+        upload.meta = {
+            'upload_id': upload.upload_id,
+            'filename': filename,
+            'size': size,
+            'part_bytes': part_bytes,
+            'options': options,
+            'created_at': time.time()
+        }
+        upload.write_meta(upload.meta)
+        return upload
+
+    @classmethod
+    def open(cls, root, upload_id):
+        """Return an existing upload, or None if there is no such upload"""
+        upload = cls(root, upload_id)
+        try:
+            upload.meta = upload.read_meta()
+        except (OSError, ValueError):
+            return None
+        return upload
+
+    @property
+    def size(self):
+        return self.meta['size']
+
+    @property
+    def part_bytes(self):
+        return self.meta['part_bytes']
+
+    @property
+    def parts(self):
+        return -(-self.size // self.part_bytes)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def read_meta(self):
+        with open(self._file('upload.json')) as f:
+            return json.load(f)
+
+    def write_meta(self, meta):
+        tmp_path = self._file('upload.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._file('upload.json'))
+
+    def update_meta(self, **changes):
+        with self.lock:
+            self.meta = {**self.read_meta(), **changes}
+            self.write_meta(self.meta)
+
+    def write_part(self, index, data, sha256):
+        """Verify and store one part; raises ValueError if it is out of range or damaged"""
+        if not 0 <= index < self.parts:
+            raise ValueError(f'Part {index} is out of range; the upload has {self.parts} parts')
+        offset = index * self.part_bytes
+        length = min(self.part_bytes, self.size - offset)
+        if len(data) != length:
+            raise ValueError(f'Part {index} should be {length} bytes, got {len(data)}')
+        if hashlib.sha256(data).hexdigest() != sha256.strip().lower():
+            raise ValueError(f'Part {index} does not match its checksum; please send it again')
+        if os.path.exists(self._file(f'part-{index}')):
+            return
+        
+        with open(self._file('data'), 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # Marked only once its bytes are on disk, so a reader never sees a partial part
+        with open(self._file(f'part-{index}'), 'w'):
+            pass
+        with upload_part_arrived:
+            upload_part_arrived.notify_all()
+
+    def received(self):
+        """Sorted indexes of the parts written so far"""
+        return sorted(int(name[5:]) for name in os.listdir(self.path) if name.startswith('part-'))
+
+    def last_activity(self):
+        # Every new part, and every change to upload.json, touches the directory
+        return os.path.getmtime(self.path)
+
+    def wait_for_part(self, index, on_wait=None):
+        """Block until part ``index`` has been written
+
+        Raises RuntimeError if the upload is deleted, or gets no new part
+        for UPLOAD_IDLE_SECONDS, first.
+        """
+        while not os.path.exists(self._file(f'part-{index}')):
+            try:
+                idle = time.time() - self.last_activity()
+            except OSError:
+                raise RuntimeError('The upload was cancelled')
+            if idle > app.config['UPLOAD_IDLE_SECONDS']:
+                raise RuntimeError('The upload stopped before the file was complete; please upload it again')
+            if on_wait is not None:
+                on_wait()
+            with upload_part_arrived:
+                upload_part_arrived.wait(timeout=0.5)
+
+    def open_stream(self):
+        """Binary file object over the assembled file that waits for parts still to come"""
+        return io.BufferedReader(_UploadReader(self), buffer_size=1024 * 1024)
+
+    def finish(self):
+        """Delete the assembled file once the job has read all it needs from it"""
+        with contextlib.suppress(OSError):
+            os.remove(self._file('data'))
+        with contextlib.suppress(OSError, ValueError):
+            self.update_meta(finished=True)
+
+    def delete(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def status(self):
+        """Response body for /uploads: the parts still missing and, once started, the job"""
+        meta = self.meta
+        with contextlib.suppress(OSError, ValueError):
+            meta = self.read_meta()
+        received = set(self.received())
+        missing = [index for index in range(self.parts) if index not in received]
+        return {
+            'upload_id': self.upload_id,
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'part_bytes': meta['part_bytes'],
+            'parts': self.parts,
+            'received': len(received),
+            'missing': missing,
+            # The job has read all it needs; remaining parts are not wanted
+            'finished': meta.get('finished', False),
+            'job': meta.get('job'),
+            'error': meta.get('error')
+        }
+
+
+class _UploadReader(io.RawIOBase):
+    """Seekable raw reader over a ChunkedUpload
+
+    Reading a part that has not arrived yet blocks until it does, so CSV
+    rows are parsed while the rest of the file is still being sent; Excel
+    and Parquet files, which are read from their end, wait for the whole
+    file. ``on_wait`` is called while waiting. Closing the reader finishes
+    the upload.
+    """
+
+    def __init__(self, upload):
+        self.upload = upload
+        self.position = 0
+        self.file = None
+        self.on_wait = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def waiting(self):
+        # on_wait may be set while a read is already waiting
+        if self.on_wait is not None:
+            self.on_wait()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.upload.size
+        if offset < 0:
+            raise ValueError('negative seek position')
+        self.position = offset
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.upload.size:
+            return 0
+        index = self.position // self.upload.part_bytes
+        self.upload.wait_for_part(index, on_wait=self.waiting)
+        if self.file is None:
+            self.file = open(self.upload._file('data'), 'rb')
+        
+        # Read no further than this part; the next one may not be there yet
+        part_end = min((index + 1) * self.upload.part_bytes, self.upload.size)
+        self.file.seek(self.position)
+        data = self.file.read(min(len(buffer), part_end - self.position))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            if self.file is not None:
+                self.file.close()
+            self.upload.finish()
+        super().close()
+
+
+def start_chunked_upload_job(upload):
+    """Start the job for a resumable upload once its first rows have arrived
+
+    Runs in a background thread of the worker that created the upload. The
+    job, or the reason it could not start, is recorded in upload.json for
+    GET /uploads/<upload_id> on any worker.
+    """
+    stream = upload.open_stream()
+    try:
+        body, code = start_upload_job(stream, upload.meta['filename'], upload.meta['options'])
+    except Exception as e:
+        body = {'error': str(e)}
+    
+    if 'error' in body:
+        with contextlib.suppress(OSError, ValueError):
+            upload.update_meta(error=body['error'])
+        return
+    with contextlib.suppress(OSError, ValueError):
+        upload.update_meta(job=body)
+    
+    # Waiting for parts is not a stalled spooler (see JobCheckpoint.input_chunks)
+    checkpoint_path = os.path.join(app.config['CHECKPOINT_DIR'], body['session_id'])
+    if app.config['CHECKPOINT_DIR'] and os.path.isdir(checkpoint_path):
+        stream.raw.on_wait = JobCheckpoint(app.config['CHECKPOINT_DIR'], body['session_id']).heartbeat
+
+
+class ResultWriter:
+    """Incremental writer for one export format
+
+    Call ``write(chunk)`` for each DataFrame chunk in order, then ``close()``.
+    Output goes to ``out``, any binary file-like object with ``write``.
+    """
+
+    extension = ''
+    mimetype = 'application/octet-stream'
+
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, chunk):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CsvResultWriter(ResultWriter):
+    extension = '.csv'
+    mimetype = 'text/csv'
+
+    def __init__(self, out):
+        super().__init__(out)
+        self.header = True
+
+    def write(self, chunk):
+        self.out.write(chunk.to_csv(index=False, header=self.header).encode('utf-8'))
+        self.header = False
+
+
+def json_default(value):
+    """JSON value for what json.dumps can't encode: numpy scalars as numbers, anything else as text"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class GeoJsonResultWriter(ResultWriter):
+    """FeatureCollection of points; rows without valid coordinates get a null geometry"""
+
+    extension = '.geojson'
+    mimetype = 'application/geo+json'
+
+    def __init__(self, out):
+        super().__init__(out)
+        self.out.write(b'{"type": "FeatureCollection", "features": [')
+        self.first = True
+
+    def write(self, chunk):
+        lats = pd.to_numeric(chunk['Center_Latitude'], errors='coerce')
+        lons = pd.to_numeric(chunk['Center_Longitude'], errors='coerce')
+        properties = chunk.astype(object).where(chunk.notna(), None).to_dict('records')
+        
+        features = []
+        for lat, lon, props in zip(lats, lons, properties):
+            geometry = None
+            if pd.notna(lat) and pd.notna(lon):
+                geometry = {'type': 'Point', 'coordinates': [lon, lat]}
+            features.append(json.dumps(
+                {'type': 'Feature', 'geometry': geometry, 'properties': props}, default=json_default
+            ))
+        if features:
+            self.out.write(((',' if not self.first else '') + ','.join(features)).encode('utf-8'))
+            self.first = False
+
+    def close(self):
+        self.out.write(b']}')
+
+
+class ParquetResultWriter(ResultWriter):
+    """One Parquet row group per chunk"""
+
+    extension = '.parquet'
+    mimetype = 'application/vnd.apache.parquet'
+
+    def __init__(self, out):
+        super().__init__(out)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Parquet export requires pyarrow: pip install pyarrow')
+        self.pa = pyarrow
+        self.writer = None
+
+    def write(self, chunk):
+        if self.writer is None:
+            table = self.pa.Table.from_pandas(chunk, preserve_index=False)
+            self.writer = self.pa.parquet.ParquetWriter(self.out, table.schema)
+        else:
+            table = self.pa.Table.from_pandas(chunk, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class XlsxResultWriter(ResultWriter):
+    """Excel workbook built with openpyxl's write-only mode"""
+
+    extension = '.xlsx'
+    mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    def __init__(self, out):
+        super().__init__(out)
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet('Addresses')
+        self.header = True
+
+    def write(self, chunk):
+        if self.header:
+            self.sheet.append([str(col) for col in chunk.columns])
+            self.header = False
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.out)
+
+
+# Export formats for /download?format=...
+EXPORT_FORMATS = {
+    'xlsx': XlsxResultWriter,
+    'csv': CsvResultWriter,
+    'parquet': ParquetResultWriter,
+    'geojson': GeoJsonResultWriter,
+}
+
+
+class _PipeWriter:
+    """Binary file-like object that passes written bytes to a queue in blocks"""
+
+    block_size = 64 * 1024
+    closed = False
+
+    def __init__(self, put):
+        self.put = put
+        self.pending = bytearray()
+
+    def write(self, data):
+        self.pending += data
+        if len(self.pending) >= self.block_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.pending:
+            self.put(bytes(self.pending))
+            self.pending = bytearray()
+
+
+def stream_export(chunks, fmt):
+    """Yield an export file in pieces while a writer thread encodes the chunks
+
+    The first bytes go out as soon as the writer produces them instead of
+    after the whole file has been built. Closing the generator (e.g. when
+    the client disconnects) stops the writer.
+    """
+    pieces = queue.Queue(maxsize=16)
+    stop = threading.Event()
+    done = object()
+    blocked_seconds = 0.0  # writer time spent waiting for the client
+    
+    def put(item):
+        nonlocal blocked_seconds
+        started = time.perf_counter()
+        try:
+            while not stop.is_set():
+                try:
+                    pieces.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            raise OSError('Export stream closed')
+        finally:
+            blocked_seconds += time.perf_counter() - started
+    
+    def produce():
+        started = time.perf_counter()
+        try:
+            out = _PipeWriter(put)
+            writer = EXPORT_FORMATS[fmt](out)
+            for chunk in chunks:
+                writer.write(chunk)
+            writer.close()
+            out.flush()
+            put(done)
+        except Exception as e:
+            if not stop.is_set():
+                put(e)
+        finally:
+            # Encoding time only, not time the client took to read it
+            STAGE_SECONDS.labels('export').inc(time.perf_counter() - started - blocked_seconds)
+    
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = pieces.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_chunks(df, chunk_rows=5000):
+    """Split a DataFrame into consecutive chunks of up to chunk_rows rows"""
+    if len(df) == 0:
+        yield df
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
 
 # HTML Template
 HTML_TEMPLATE = '''
@@ -367,9 +3436,9 @@ HTML_TEMPLATE = '''
         
         <div class="upload-section" id="uploadSection">
             <div style="font-size: 3em; margin-bottom: 20px;">📁</div>
-            <p style="margin-bottom: 20px;">Drop your Excel file here or click to browse</p>
+            <p style="margin-bottom: 20px;">Drop your Excel, CSV or Parquet file here or click to browse</p>
             <label for="fileInput" class="upload-button">Choose File</label>
-            <input type="file" id="fileInput" accept=".xlsx,.xls" />
+            <input type="file" id="fileInput" accept=".xlsx,.xls,.csv,.parquet" />
             <div class="file-info" id="fileInfo"></div>
         </div>
         
@@ -404,6 +3473,15 @@ HTML_TEMPLATE = '''
             <button class="button button-success" id="downloadBtn" onclick="downloadResults()" style="display: none;">
                 📥 Download Results
             </button>
+            <select id="downloadFormat" style="display: none;">
+                <option value="xlsx">Excel (.xlsx)</option>
+                <option value="csv">CSV</option>
+                <option value="parquet">Parquet</option>
+                <option value="geojson">GeoJSON</option>
+            </select>
+            <button class="button button-secondary" id="cancelBtn" onclick="cancelJob()" style="display: none;">
+                ✖ Cancel
+            </button>
             <button class="button button-secondary" onclick="resetApp()">
                 🔄 Start Over
             </button>
@@ -457,8 +3535,8 @@ HTML_TEMPLATE = '''
         });
         
         function handleFile(file) {
-            if (!file.name.match(/\.(xlsx|xls)$/)) {
-                alert('Please upload an Excel file (.xlsx or .xls)');
+            if (!file.name.match(/\.(xlsx|xls|csv|parquet)$/i)) {
+                alert('Please upload an Excel, CSV or Parquet file (.xlsx, .xls, .csv or .parquet)');
                 return;
             }
             
@@ -491,13 +3569,17 @@ HTML_TEMPLATE = '''
             document.getElementById('resultsSection').classList.remove('show');
             
             try {
-                // Upload and start processing
-                const response = await fetch('/upload', {
-                    method: 'POST',
-                    body: formData
-                });
-                
-                const data = await response.json();
+                // Upload and start processing; large files are sent in resumable parts
+                let data;
+                if (uploadedFile.size > PART_UPLOAD_THRESHOLD && window.crypto && crypto.subtle) {
+                    data = await uploadInParts(uploadedFile, { mode: processingMode });
+                } else {
+                    const response = await fetch('/upload', {
+                        method: 'POST',
+                        body: formData
+                    });
+                    data = await response.json();
+                }
                 
                 if (data.error) {
                     showStatus('error', data.error);
@@ -507,7 +3589,8 @@ HTML_TEMPLATE = '''
                 }
                 
                 sessionId = data.session_id;
-                showStatus('info', `Processing ${data.total_rows} locations...`);
+                document.getElementById('cancelBtn').style.display = 'inline-block';
+                showStatus('info', data.total_rows === null ? 'Processing locations...' : `Processing ${data.total_rows} locations...`);
                 
                 // Start monitoring progress
                 monitorProgress();
@@ -519,28 +3602,113 @@ HTML_TEMPLATE = '''
             }
         }
         
-        async function monitorProgress() {
+        // Files over this size go through /uploads, which survives dropped connections
+        const PART_UPLOAD_THRESHOLD = 4 * 1024 * 1024;
+        
+        const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+        
+        async function sha256Hex(buffer) {
+            const digest = await crypto.subtle.digest('SHA-256', buffer);
+            return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+        }
+        
+        // Send a file as checksummed parts and return what /upload would have.
+        // An upload of the same file interrupted earlier (even by a page reload)
+        // carries on with the parts the server is still missing.
+        async function uploadInParts(file, options) {
+            const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}:${options.mode}`;
+            let upload = null;
+            const previousId = localStorage.getItem(resumeKey);
+            if (previousId) {
+                const response = await fetch(`/uploads/${previousId}`);
+                upload = response.ok ? await response.json() : null;
+            }
+            if (!upload || upload.error || upload.finished) {
+                const response = await fetch('/uploads', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ filename: file.name, size: file.size, ...options })
+                });
+                upload = await response.json();
+                if (upload.error) {
+                    return upload;
+                }
+                localStorage.setItem(resumeKey, upload.upload_id);
+            }
+            
+            const missing = new Set(upload.missing);
+            let sent = upload.parts - missing.size;
+            for (let index = 0; index < upload.parts && !upload.finished && !upload.error; index++) {
+                if (!missing.has(index)) {
+                    continue;
+                }
+                const start = index * upload.part_bytes;
+                const part = await file.slice(start, start + upload.part_bytes).arrayBuffer();
+                const checksum = await sha256Hex(part);
+                for (let attempt = 1; ; attempt++) {
+                    const response = await fetch(`/uploads/${upload.upload_id}/${index}`, {
+                        method: 'PUT',
+                        headers: { 'X-Checksum-SHA256': checksum },
+                        body: part
+                    }).catch(() => null);
+                    if (response && response.ok) {
+                        upload = await response.json();
+                        break;
+                    }
+                    // Dropped connections, damaged parts and server errors are retried
+                    if (attempt === 6 || (response && response.status === 404)) {
+                        throw new Error(response ? (await response.json()).error : 'connection lost');
+                    }
+                    await sleep(1000 * 2 ** attempt);
+                }
+                sent++;
+                showStatus('info', `Uploading... ${Math.round(sent / upload.parts * 100)}%`);
+            }
+            
+            // The job starts once its first rows have been read
+            while (!upload.job && !upload.error) {
+                await sleep(500);
+                upload = await (await fetch(`/uploads/${upload.upload_id}`)).json();
+            }
+            localStorage.removeItem(resumeKey);
+            return upload.job || { error: upload.error };
+        }
+        
+        function monitorProgress() {
+            // Prefer the server-sent event stream; fall back to polling
+            if (!window.EventSource) {
+                pollProgress();
+                return;
+            }
+            
+            const state = {};
+            let received = false;
+            const source = new EventSource(`/progress/${sessionId}/stream`);
+            
+            source.onmessage = (event) => {
+                received = true;
+                // Each event only carries the fields that changed
+                Object.assign(state, JSON.parse(event.data));
+                if (!updateProgress(state)) {
+                    source.close();
+                }
+            };
+            
+            source.onerror = () => {
+                if (!received) {
+                    source.close();
+                    pollProgress();
+                }
+            };
+        }
+        
+        function pollProgress() {
             const interval = setInterval(async () => {
                 try {
                     const response = await fetch(`/progress/${sessionId}`);
                     const data = await response.json();
-                    
-                    // Update progress bar
-                    const progress = (data.processed / data.total) * 100;
-                    document.getElementById('progressFill').style.width = progress + '%';
-                    document.getElementById('progressFill').textContent = Math.round(progress) + '%';
-                    
-                    if (data.status === 'completed') {
+                    if (!updateProgress(data)) {
                         clearInterval(interval);
-                        showResults(data.results);
-                        document.getElementById('processBtn').disabled = false;
-                        document.getElementById('processBtn').innerHTML = '🔍 Find Addresses';
-                        showStatus('success', 'Processing complete!');
-                    } else if (data.status === 'error') {
-                        clearInterval(interval);
-                        showStatus('error', 'Processing error: ' + data.message);
-                        document.getElementById('processBtn').disabled = false;
-                        document.getElementById('processBtn').innerHTML = '🔍 Find Addresses';
                     }
                 } catch (error) {
                     console.error('Progress monitoring error:', error);
@@ -548,6 +3716,38 @@ HTML_TEMPLATE = '''
             }, 1000);
         }
         
+        // Show a progress update; returns false once the job has finished
+        function updateProgress(data) {
+            // Update progress bar
+            const progress = data.total ? (data.processed / data.total) * 100 : 0;
+            document.getElementById('progressFill').style.width = progress + '%';
+            document.getElementById('progressFill').textContent = Math.round(progress) + '%';
+            
+            if (data.status === 'queued') {
+                showStatus('info', `Waiting in queue (position ${data.queue_position})...`);
+                return true;
+            } else if (data.status === 'processing') {
+                if (data.eta_seconds !== undefined) {
+                    showStatus('info', `Looked up ${data.processed} of ${data.total} unique locations - about ${Math.ceil(data.eta_seconds)}s remaining`);
+                }
+                return true;
+            }
+            
+            document.getElementById('cancelBtn').style.display = 'none';
+            document.getElementById('processBtn').disabled = false;
+            document.getElementById('processBtn').innerHTML = '🔍 Find Addresses';
+            
+            if (data.status === 'completed') {
+                showResults(data.results);
+                showStatus('success', 'Processing complete!');
+            } else if (data.status === 'error') {
+                showStatus('error', 'Processing error: ' + data.message);
+            } else if (data.status === 'cancelled') {
+                showStatus('error', 'Processing cancelled');
+            }
+            return false;
+        }
+        
         function showResults(results) {
             document.getElementById('resultsSection').classList.add('show');
             
@@ -558,6 +3758,11 @@ HTML_TEMPLATE = '''
                     <div class="stat-number">${results.stats.complete_address}</div>
                     <div class="stat-label">Complete Addresses</div>
                 </div>
+                ${results.stats.nearby_address ? `
+                <div class="stat-card">
+                    <div class="stat-number">${results.stats.nearby_address}</div>
+                    <div class="stat-label">From Nearby Points</div>
+                </div>` : ''}
                 <div class="stat-card">
                     <div class="stat-number">${results.stats.street_only}</div>
                     <div class="stat-label">Street Only</div>
@@ -570,6 +3775,10 @@ HTML_TEMPLATE = '''
                     <div class="stat-number">${results.stats.total}</div>
                     <div class="stat-label">Total Processed</div>
                 </div>
+                <div class="stat-card">
+                    <div class="stat-number">${results.cache.hits}</div>
+                    <div class="stat-label">Cache Hits</div>
+                </div>
             `;
             
             // Show sample addresses
@@ -586,6 +3795,7 @@ HTML_TEMPLATE = '''
             }
             
             document.getElementById('downloadBtn').style.display = 'inline-block';
+            document.getElementById('downloadFormat').style.display = 'inline-block';
         }
         
         async function downloadResults() {
@@ -594,7 +3804,17 @@ HTML_TEMPLATE = '''
                 return;
             }
             
-            window.location.href = `/download/${sessionId}`;
+            const format = document.getElementById('downloadFormat').value;
+            window.location.href = `/download/${sessionId}?format=${format}`;
+        }
+        
+        async function cancelJob() {
+            if (!sessionId) {
+                return;
+            }
+            
+            await fetch(`/cancel/${sessionId}`, { method: 'POST' });
+            showStatus('info', 'Cancelling...');
         }
         
         function showStatus(type, message) {
@@ -624,225 +3844,1727 @@ def upload_file():
             return jsonify({'error': 'No file provided'}), 400
         
         file = request.files['file']
-        mode = request.form.get('mode', 'test')
-        
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        if upload_format(file.filename) is None:
+            return jsonify({'error': f'Unsupported file type, expected one of {list(UPLOAD_FORMATS)}'}), 400
         
-        # Read the file
-        df = pd.read_excel(filepath)
+        body, code = start_upload_job(detach_upload_stream(file), file.filename, request.form)
+        return jsonify(body), code
         
-        # Validate required columns
-        required_cols = ['Center_Latitude', 'Center_Longitude']
-        missing_cols = [col for col in required_cols if col not in df.columns]
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def start_upload_job(stream, filename, options):
+    """Validate an upload's columns and queue its job; returns (response body, HTTP status)
+
+    ``stream`` is a binary file object the job takes ownership of (it is
+    closed when parsing ends) and ``options`` the form fields of /upload.
+    The first rows are parsed before returning, the rest while the job runs.
+    """
+    mode = options.get('mode', 'test')
+    fmt = upload_format(filename)
+    
+    # Optional comma-separated list of extra columns to keep; others are not parsed
+    usecols = None
+    if options.get('columns'):
+        extra_cols = [col.strip() for col in options['columns'].split(',') if col.strip()]
+        usecols = list(dict.fromkeys(REQUIRED_COLUMNS + ['City'] + extra_cols))
+    
+    # Full runs of a named dataset reuse the addresses of rows that are
+    # unchanged since its last full run. Only an explicit name does: files
+    # from different people often share a name like clusters.xlsx
+    dataset = (options.get('dataset') or '').strip() or None
+    id_column = options.get('id_column') or None
+    reuse_previous = options.get('reuse', '1').lower() not in ('0', 'false', 'no', 'off')
+    if id_column and usecols is not None:
+        usecols = list(dict.fromkeys(usecols + [id_column]))
+    
+    # Parse straight from the upload stream; the first chunk is read now
+    # to validate the columns and the rest while geocoding runs
+    timings = dict.fromkeys(JOB_STAGES, 0.0)
+    chunks = read_upload_chunks(stream, fmt, app.config['UPLOAD_CHUNK_ROWS'], usecols=usecols, timings=timings)
+    try:
+        first = next(chunks, None)
+    except UploadParseError as e:
+        stream.close()
+        return {'error': str(e)}, 400
+    except Exception:
+        stream.close()
+        raise
+    
+    # Validate required columns
+    columns = [] if first is None else list(first.columns)
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if id_column and id_column not in columns:
+        missing_cols.append(id_column)
+    
+    if missing_cols:
+        chunks.close()
+        stream.close()
+        return {'error': f'Missing required columns: {missing_cols}'}, 400
+    
+    def upload_source():
+        try:
+            yield first
+            yield from chunks
+        finally:
+            discard_upload()
+    
+    def discard_upload():
+        chunks.close()
+        stream.close()
+    
+    # Generate session ID
+    session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.urandom(4).hex()}"
+    
+    # Determine number of rows to process (unknown in full mode until parsed)
+    if mode == 'test':
+        rows_to_process = min(5, len(first))
+    else:
+        rows_to_process = None
+    
+    # Initialize processing status
+    status = {
+        'status': 'queued',
+        'total': 0,
+        'processed': 0,
+        'rows': 0,
+        'parsing': True,
+        'cache_hits': 0,
+        'cache_misses': 0,
+        'results': None,
+        'created_at': time.time(),
+        'timings': timings,
+        # Run the job under cProfile and keep the profile for /profile/<session_id>
+        'profile': options.get('profile', '').lower() in ('1', 'true', 'on', 'yes')
+    }
+    history = None
+    if mode != 'test' and dataset and app.config['DATASET_DIR']:
+        history = {'dataset': dataset, 'id_column': id_column, 'reuse_previous': reuse_previous}
+        status.update(history)
+    
+    # Full runs are checkpointed so they survive a restart; their upload
+    # is spooled to the checkpoint straight away, even while queued.
+    # With a shared job store every job is, so any worker can run it.
+    store = get_job_store()
+    priority = 0 if mode == 'test' else 1
+    checkpoint = None
+    if store is not None or (mode != 'test' and app.config['CHECKPOINT_DIR']):
+        checkpoint = JobCheckpoint.create(
+            app.config['CHECKPOINT_DIR'], session_id,
+            rows_to_process=rows_to_process, priority=priority, history=history
+        )
+        if mode == 'test':
+            # Only the first rows are needed
+            discard_upload()
+            checkpoint.spool_input([first.head(rows_to_process)], app.config['CHECKPOINT_EVERY'], timings)
+        else:
+            checkpoint.spool_input(upload_source(), app.config['CHECKPOINT_EVERY'], timings)
+    
+    def cancel_queued():
+        if checkpoint is not None:
+            checkpoint.finish()
+        else:
+            discard_upload()
+    
+    # Queue the job; test runs go ahead of full runs
+    if store is not None:
+        # Claimed by the first free worker, in this process or another
+        store.add(session_id, status, priority=priority, rows_to_process=rows_to_process)
+        get_job_scheduler().submit(session_id)
+    else:
+        processing_status[session_id] = status
+        get_job_scheduler().submit(
+            session_id,
+            process_addresses,
+            args=(
+                checkpoint.input_chunks() if checkpoint is not None else prefetch(upload_source()),
+                session_id, rows_to_process
+            ),
+            kwargs={'checkpoint': checkpoint},
+            priority=priority,
+            on_cancel=cancel_queued
+        )
+    
+    return {
+        'session_id': session_id,
+        'total_rows': rows_to_process,
+        'mode': mode,
+        'dataset': history and dataset,
+        # Whether unchanged rows can be copied from an earlier run
+        'incremental': bool(history and reuse_previous
+                            and os.path.exists(DatasetHistory.snapshot_path(app.config['DATASET_DIR'], dataset)))
+    }, 200
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable upload, for files over MAX_CONTENT_LENGTH or flaky links
+
+    Takes JSON with ``filename``, ``size`` in bytes, an optional
+    ``part_bytes`` and the /upload form fields (``mode``, ``columns``, ...).
+    The file is then sent as parts 0 to ``parts - 1`` with PUT
+    /uploads/<upload_id>/<index>, each with its hex SHA-256 in an
+    ``X-Checksum-SHA256`` header, in any order and repeated as needed.
+    After a dropped connection GET /uploads/<upload_id> lists the parts
+    still missing. Parsing and geocoding start as soon as the first rows
+    have arrived (for Excel and Parquet files, once all of the file has);
+    the upload's ``job`` then holds what /upload would have returned.
+    """
+    spec = request.get_json(silent=True) or {}
+    filename = str(spec.get('filename') or '')
+    if upload_format(filename) is None:
+        return jsonify({'error': f'Unsupported file type, expected one of {list(UPLOAD_FORMATS)}'}), 400
+    try:
+        size = int(spec.get('size'))
+        part_bytes = int(spec.get('part_bytes') or app.config['UPLOAD_PART_BYTES'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size and part_bytes must be whole numbers of bytes'}), 400
+    if not 0 < size <= app.config['UPLOAD_MAX_BYTES']:
+        return jsonify({'error': f"size must be between 1 and {app.config['UPLOAD_MAX_BYTES']} bytes"}), 400
+    
+    # Each part is one request, so it has to fit in MAX_CONTENT_LENGTH
+    part_bytes = min(max(part_bytes, 64 * 1024), app.config['MAX_CONTENT_LENGTH'])
+    options = {
+        key: str(value) for key, value in spec.items()
+        if key not in ('filename', 'size', 'part_bytes') and value is not None
+    }
+    upload = ChunkedUpload.create(app.config['UPLOAD_DIR'], filename, size, part_bytes, options)
+    threading.Thread(target=start_chunked_upload_job, args=(upload,), daemon=True).start()
+    return jsonify(upload.status()), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Parts still missing from a resumable upload, and its job once started"""
+    upload = ChunkedUpload.open(app.config['UPLOAD_DIR'], upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload.status())
+
+@app.route('/uploads/<upload_id>/<int:index>', methods=['PUT'])
+def upload_part(upload_id, index):
+    """Store one part of a resumable upload
+
+    A part that fails its checksum is rejected with 400 and should be sent
+    again. Sending a part that already arrived is harmless, so a client that
+    is unsure whether a part got through can simply repeat it.
+    """
+    upload = ChunkedUpload.open(app.config['UPLOAD_DIR'], upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    checksum = request.headers.get('X-Checksum-SHA256')
+    if not checksum:
+        return jsonify({'error': 'Missing X-Checksum-SHA256 header'}), 400
+    
+    if not upload.meta.get('finished'):
+        try:
+            upload.write_part(index, request.get_data(cache=False), checksum)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except FileNotFoundError:
+            # Finished or deleted while this part was on its way
+            if not os.path.isdir(upload.path):
+                return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload.status())
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    """Abandon a resumable upload; a job already reading it fails"""
+    upload = ChunkedUpload.open(app.config['UPLOAD_DIR'], upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    upload.delete()
+    return jsonify({'upload_id': upload_id, 'deleted': True})
+
+def address_components(payload):
+    """Extract (house number, street, city, state, postcode, display name) from a payload"""
+    addr = payload['address']
+    return (
+        addr.get('house_number', ''),
+        addr.get('road') or addr.get('street') or addr.get('highway', ''),
+        addr.get('city') or addr.get('town') or addr.get('village', ''),
+        addr.get('state', ''),
+        addr.get('postcode', ''),
+        payload['display_name']
+    )
+
+def assemble_address_columns(payloads, failed=None, nearby=None):
+    """Build Physical_Address, Street_Name and Address_Quality for a list of payloads
+
+    Components are collected into plain columns once and the address strings
+    and quality are derived with vectorized column operations. A ``None``
+    payload gives 'Coordinates Only' with an empty address (the caller fills
+    in the coordinates); entries flagged in ``failed`` give 'Error', and
+    complete addresses flagged in ``nearby`` (taken from a nearby point)
+    give 'Nearby Street Address'.
+    """
+    empty = ('', '', '', '', '', '')
+    components = pd.DataFrame(
+        [address_components(p) if p else empty for p in payloads],
+        columns=['house_number', 'street', 'city', 'state', 'postcode', 'display_name'],
+        dtype=object
+    ).fillna('').astype(str)
+    
+    resolved = np.array([bool(p) for p in payloads], dtype=bool)
+    failed = np.zeros(len(payloads), dtype=bool) if failed is None else np.asarray(failed, dtype=bool)
+    nearby = np.zeros(len(payloads), dtype=bool) if nearby is None else np.asarray(nearby, dtype=bool)
+    has_house = (components['house_number'] != '').to_numpy()
+    has_street = (components['street'] != '').to_numpy()
+    complete = has_house & has_street
+    
+    # Street_Name is "<house> <street>" when both are known, else just the street
+    street_name = components['street'].where(
+        ~complete, components['house_number'] + ' ' + components['street']
+    )
+    
+    # Append ", city, state, postcode", skipping missing parts
+    tail = pd.Series('', index=components.index)
+    for col in ('city', 'state', 'postcode'):
+        tail = tail + (', ' + components[col]).where(components[col] != '', '')
+    
+    physical = (street_name + tail).where(has_street, components['display_name'])
+    
+    quality = np.select(
+        [failed, ~resolved, complete & nearby, complete, has_street],
+        ['Error', 'Coordinates Only', 'Nearby Street Address', 'Complete Street Address', 'Street Only'],
+        default='Area Only'
+    )
+    usable = resolved & ~failed
+    return pd.DataFrame({
+        'Physical_Address': np.where(usable, physical, ''),
+        'Street_Name': np.where(usable, street_name, ''),
+        'Address_Quality': quality
+    })
+
+def address_fields(payload, nearby=False):
+    """(Physical_Address, Street_Name, Address_Quality) for one payload
+
+    Same rules as assemble_address_columns, without the per-call overhead
+    of building columns; used for small API requests.
+    """
+    if not payload:
+        return '', '', 'Coordinates Only'
+    house, street, city, state, postcode, display_name = (
+        '' if value is None else str(value) for value in address_components(payload)
+    )
+    complete = house != '' and street != ''
+    street_name = f"{house} {street}" if complete else street
+    if not street:
+        return display_name, street_name, 'Area Only'
+    physical = street_name + ''.join(', ' + part for part in (city, state, postcode) if part)
+    if not complete:
+        return physical, street_name, 'Street Only'
+    return physical, street_name, 'Nearby Street Address' if nearby else 'Complete Street Address'
+
+def result_payload(physical, street_name, quality):
+    """Rebuild a payload from a result row's address columns, or None if it has no address
+
+    The inverse of address_fields: the payload gives back the same three
+    columns. Which trailing part is the city, state or postcode can only be
+    guessed, since missing parts are left out of Physical_Address. Nearby
+    Street Address rows give None too: the address is another point's.
+    """
+    if quality == 'Area Only':
+        return {'address': {}, 'display_name': physical}
+    if quality not in ('Complete Street Address', 'Street Only') or not street_name:
+        return None
+    
+    address = {}
+    if quality == 'Complete Street Address':
+        address['house_number'], _, address['road'] = street_name.partition(' ')
+    else:
+        address['road'] = street_name
+    tail = physical[len(street_name):] if physical.startswith(street_name) else ''
+    parts = tail[2:].split(', ') if tail.startswith(', ') else []
+    if len(parts) >= 3:
+        address['city'], address['state'], address['postcode'] = ', '.join(parts[:-2]), parts[-2], parts[-1]
+    elif parts:
+        if any(char.isdigit() for char in parts[-1]):
+            address['postcode'] = parts.pop()
+        address.update(zip(('city', 'state'), parts))
+    return {'address': address, 'display_name': physical}
+
+class TooManyLookups(Exception):
+    """Raised by ChunkGeocoder.resolve, before any lookup, when more points need one than ``max_lookups``"""
+
+    def __init__(self, needed, limit):
+        super().__init__(f'{needed} points need a lookup, more than the limit of {limit}')
+        self.needed = needed
+        self.limit = limit
+
+
+class ChunkGeocoder:
+    """Adds address columns to successive chunks of one job's rows
+
+    Results are kept per unique coordinate key for the whole job, so a key
+    repeated in a later chunk is not looked up again; ``max_payloads`` caps
+    how many are kept, dropping the oldest (they are still in the cache).
+    ``on_progress`` is called whenever the lookup counters change. Cache
+    misses are resolved by ``lookup`` (lookup_concurrently by default) and
+    draw from the backend's shared rate budget as ``client``; setting
+    ``cancel_event`` makes the next lookup step raise JobCancelled, and
+    more misses left to look up than ``max_lookups`` raise TooManyLookups.
+    Wall time per stage (see JOB_STAGES) is added up in ``timings`` if
+    given; lookup time is split between network and rate limiting in
+    proportion to the time the requests spent on each.
+
+    With an AdminAreaIndex as ``areas``, points in areas without street
+    data are answered from it instead of the geocoder, and points the
+    geocoder has no address for get their enclosing areas.
+
+    Misses inside a grid warmed by warm_cache_grid take the payload of the
+    nearest grid point when it has one; street addresses answered this way
+    are marked 'Nearby Street Address', like those from ``nearby``.
+
+    Cache misses are looked up in Hilbert curve order. With a
+    NearbyAddressIndex as ``nearby``, misses near a point with a complete
+    street address (from the cache or another job) take its address
+    instead, and of misses near each other only the first is looked up
+    before the rest check the index again.
+    """
+
+    def __init__(self, backend, cache, precision=6, on_progress=None, client=None, cancel_event=None,
+                 max_payloads=None, lookup=None, timings=None, areas=None, nearby=None, max_lookups=None):
+        self.backend = backend
+        self.lookup = lookup or lookup_concurrently
+        self.cache = cache
+        self.precision = precision
+        self.on_progress = on_progress or (lambda: None)
+        self.client = client
+        self.cancel_event = cancel_event
+        self.max_payloads = max_payloads
+        self.max_lookups = max_lookups
+        self.timings = timings
+        self.areas = areas
+        self.nearby = nearby
+        self.payloads = {}
+        self.failed = set()
+        self.nearby_keys = set()  # keys given a nearby point's address
+        self.lookups_done = 0
+        self.pending = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.area_answers = 0  # points answered from areas without a lookup
+        self.area_fallbacks = 0  # points given their areas after an empty lookup
+        self.nearby_answers = 0  # points given a nearby point's address without a lookup
+        self.grid_answers = 0  # points given the nearest warmed grid point's address
+
+    @property
+    def lookups_total(self):
+        return self.lookups_done + self.pending
+
+    def check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def add_time(self, stage, seconds):
+        if self.timings is not None:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def query_areas(self, keys):
+        started = time.perf_counter()
+        try:
+            return self.areas.query([key[0] for key in keys], [key[1] for key in keys])
+        finally:
+            self.add_time('areas', time.perf_counter() - started)
+
+    def fill_from_areas(self, keys):
+        """Give keys the geocoder returned no address for their enclosing areas"""
+        empty = [key for key in keys if key in self.payloads and self.payloads[key] is None]
+        if self.areas is None or not empty:
+            return
+        payloads, _ = self.query_areas(empty)
+        for key, payload in zip(empty, payloads):
+            if payload is not None:
+                self.payloads[key] = payload
+                self.area_fallbacks += 1
+                ADMIN_AREA_ANSWERS.labels('fallback').inc()
+
+    def reuse_grid(self, keys):
+        """Give keys inside a warmed grid the cached payload of the nearest grid point; return the others"""
+        if not keys:
+            return keys
+        started = time.perf_counter()
+        grid_keys = self.cache.grid_keys([key[0] for key in keys], [key[1] for key in keys])
+        cached = self.cache.get_many(list({grid_key for grid_key in grid_keys if grid_key is not None}))
+        remaining = []
+        for key, grid_key in zip(keys, grid_keys):
+            # Nothing found at the grid point says little about this one
+            payload = cached.get(grid_key)
+            if payload:
+                self.payloads[key] = payload
+                self.nearby_keys.add(key)
+            else:
+                remaining.append(key)
+        self.add_time('cache', time.perf_counter() - started)
         
-        if missing_cols:
-            os.remove(filepath)
-            return jsonify({'error': f'Missing required columns: {missing_cols}'}), 400
+        answered = len(keys) - len(remaining)
+        self.grid_answers += answered
+        self.lookups_done += answered
+        GRID_ANSWERS.inc(answered)
+        return remaining
+
+    def reuse_nearby(self, keys):
+        """Give keys near a point with a complete street address its payload; return the others"""
+        if self.nearby is None or not keys:
+            return keys
+        started = time.perf_counter()
+        found = self.nearby.query([key[0] for key in keys], [key[1] for key in keys])
+        cached = self.cache.get_many(list({cache_key for cache_key in found if cache_key is not None}))
+        remaining = []
+        stale = []
+        for key, cache_key in zip(keys, found):
+            payload = cached.get(cache_key)
+            if self.nearby.is_complete(payload):
+                self.payloads[key] = payload
+                self.nearby_keys.add(key)
+            else:
+                remaining.append(key)
+                if cache_key is not None:
+                    stale.append(cache_key)
+        self.nearby.discard(stale)
+        self.add_time('cache', time.perf_counter() - started)
         
-        # Generate session ID
-        session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.urandom(4).hex()}"
+        answered = len(keys) - len(remaining)
+        if answered:
+            self.nearby_answers += answered
+            self.lookups_done += answered
+            self.pending -= answered
+            NEARBY_REUSES.inc(answered)
+            self.on_progress()
+        return remaining
+
+    def resolve(self, keys):
+        """Make sure every key has a payload or is marked as failed"""
+        self.check_cancelled()
+        new_keys = [key for key in keys if key not in self.payloads and key not in self.failed]
+        if not new_keys:
+            return
         
-        # Determine number of rows to process
-        if mode == 'test':
-            rows_to_process = min(5, len(df))
-        else:
-            rows_to_process = len(df)
+        if not self.backend.uses_cache:
+            # Local backends answer every key in one batch call
+            started = time.perf_counter()
+            self.payloads.update(zip(new_keys, self.backend.reverse_batch(new_keys, self.client)))
+            self.add_time('network', time.perf_counter() - started)
+            self.fill_from_areas(new_keys)
+            self.lookups_done += len(new_keys)
+            self.on_progress()
+            return
         
-        # Initialize processing status
-        processing_status[session_id] = {
-            'status': 'processing',
-            'total': rows_to_process,
-            'processed': 0,
-            'results': None
-        }
+        # Check the cache before asking the geocoder
+        started = time.perf_counter()
+        cache_keys = [self.cache.make_key(*key) for key in new_keys]
+        cached = self.cache.get_many(cache_keys)
+        self.add_time('cache', time.perf_counter() - started)
+        misses = []
+        for key, cache_key in zip(new_keys, cache_keys):
+            if cache_key in cached:
+                self.payloads[key] = cached[cache_key]
+            else:
+                misses.append(key)
+        if self.nearby is not None:
+            self.nearby.add([cache_key for cache_key in cache_keys if self.nearby.is_complete(cached.get(cache_key))])
+        self.cache_hits += len(new_keys) - len(misses)
+        self.cache_misses += len(misses)
+        GEOCODE_CACHE_LOOKUPS.labels('hit').inc(len(new_keys) - len(misses))
+        GEOCODE_CACHE_LOOKUPS.labels('miss').inc(len(misses))
+        self.lookups_done += len(new_keys) - len(misses)
+        misses = self.reuse_grid(misses)
         
-        # Start processing in background thread
-        thread = threading.Thread(
-            target=process_addresses,
-            args=(df, session_id, rows_to_process)
-        )
-        thread.start()
+        if self.areas is not None and misses:
+            # Areas without street data would only ever give an area-level address
+            payloads, streets = self.query_areas(misses)
+            remaining = []
+            for key, payload, has_streets in zip(misses, payloads, streets):
+                if payload is not None and not has_streets:
+                    self.payloads[key] = payload
+                else:
+                    remaining.append(key)
+            answered = len(misses) - len(remaining)
+            self.area_answers += answered
+            self.lookups_done += answered
+            ADMIN_AREA_ANSWERS.labels('no_streets').inc(answered)
+            misses = remaining
+        if misses:
+            # Neighbouring points follow each other, so they share warm cache pages and nearby answers
+            order = hilbert_order([key[0] for key in misses], [key[1] for key in misses])
+            misses = [misses[i] for i in order]
+        if self.max_lookups is not None and len(misses) > self.max_lookups:
+            raise TooManyLookups(len(misses), self.max_lookups)
+        self.pending = len(misses)
+        self.on_progress()
         
-        # Clean up uploaded file
-        os.remove(filepath)
+        def on_result(key, payload, error):
+            if error is None:
+                cache_key = self.cache.make_key(*key)
+                self.cache.put(cache_key, payload)
+                self.payloads[key] = payload
+                if self.nearby is not None and self.nearby.is_complete(payload):
+                    self.nearby.add([cache_key])
+            elif isinstance(error, GeopyError):
+                # Lookup failed after retries; don't cache the failure
+                self.payloads[key] = None
+            else:
+                self.failed.add(key)
+            self.lookups_done += 1
+            self.pending -= 1
+            self.on_progress()
         
-        return jsonify({
-            'session_id': session_id,
-            'total_rows': rows_to_process,
-            'mode': mode
-        })
+        rounds = [misses]
+        if self.nearby is not None and misses:
+            # Look up one point per neighbourhood first; the rest may then share its address
+            misses = self.reuse_nearby(misses)
+            first = self.nearby.leaders([key[0] for key in misses], [key[1] for key in misses])
+            rounds = [[key for key, lead in zip(misses, first) if lead],
+                      [key for key, lead in zip(misses, first) if not lead]]
         
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        sums = {'network': 0.0, 'rate_limit': 0.0}
+        token = lookup_timings.set(sums)
+        started = time.perf_counter()
+        nearby_seconds = 0.0
+        try:
+            for i, points in enumerate(rounds):
+                if i:
+                    nearby_started = time.perf_counter()
+                    points = self.reuse_nearby(points)
+                    nearby_seconds += time.perf_counter() - nearby_started
+                self.lookup(self.backend, points, on_result, self.client, self.cancel_event)
+                self.check_cancelled()
+        finally:
+            lookup_timings.reset(token)
+            elapsed = time.perf_counter() - started - nearby_seconds
+            busy = sums['network'] + sums['rate_limit']
+            self.add_time('network', elapsed * sums['network'] / busy if busy else elapsed)
+            self.add_time('rate_limit', elapsed * sums['rate_limit'] / busy if busy else 0.0)
+        self.check_cancelled()
+        self.fill_from_areas(new_keys)
 
-def process_addresses(df, session_id, rows_to_process):
-    """Process addresses in background"""
-    try:
-        # Limit dataframe to rows to process
-        working_df = df.head(rows_to_process).copy()
+    def process(self, chunk):
+        """Return a copy of chunk with Physical_Address, Street_Name and Address_Quality"""
+        started = time.perf_counter()
+        chunk = chunk.copy()
         
-        # Initialize geocoder
-        geolocator = Nominatim(user_agent=f"cluster_finder_{session_id}", timeout=10)
-        geocode = RateLimiter(
-            geolocator.reverse,
-            min_delay_seconds=1.0,
-            return_value_on_exception=None
+        # Group rows into unique coordinate keys so each point is looked up once
+        lats = pd.to_numeric(chunk['Center_Latitude'], errors='coerce')
+        lons = pd.to_numeric(chunk['Center_Longitude'], errors='coerce')
+        valid = (lats.notna() & lons.notna()).to_numpy()
+        codes, unique_keys = pd.MultiIndex.from_arrays([
+            lats[valid].round(self.precision),
+            lons[valid].round(self.precision)
+        ]).factorize()
+        keys = list(unique_keys)
+        lookup_started = time.perf_counter()
+        self.resolve(keys)
+        lookup_seconds = time.perf_counter() - lookup_started
+        
+        # Build the result columns once per key, then copy them to every row
+        key_fields = assemble_address_columns(
+            [self.payloads.get(key) for key in keys],
+            failed=[key in self.failed for key in keys],
+            nearby=[key in self.nearby_keys for key in keys]
         )
+        physical = np.full(len(chunk), 'Invalid coordinates', dtype=object)
+        street_name = np.full(len(chunk), '', dtype=object)
+        quality = np.full(len(chunk), 'Error', dtype=object)
+        physical[valid] = key_fields['Physical_Address'].to_numpy()[codes]
+        street_name[valid] = key_fields['Street_Name'].to_numpy()[codes]
+        quality[valid] = key_fields['Address_Quality'].to_numpy()[codes]
+        
+        fill_coordinate_addresses(physical, quality, lats, lons, chunk['City'] if 'City' in chunk.columns else None)
+        
+        chunk['Physical_Address'] = physical
+        chunk['Street_Name'] = street_name
+        chunk['Address_Quality'] = quality
         
-        # Add result columns
-        working_df['Physical_Address'] = ''
-        working_df['Street_Name'] = ''
-        working_df['Address_Quality'] = ''
+        if self.max_payloads is not None and len(self.payloads) > self.max_payloads:
+            for key in list(itertools.islice(self.payloads, len(self.payloads) - self.max_payloads)):
+                del self.payloads[key]
+                self.nearby_keys.discard(key)
         
-        # Statistics
-        stats = {
-            'complete_address': 0,
-            'street_only': 0,
-            'area_only': 0,
-            'coordinates_only': 0,
-            'total': rows_to_process
+        assembly_seconds = time.perf_counter() - started - lookup_seconds
+        self.add_time('assembly', assembly_seconds)
+        STAGE_SECONDS.labels('lookup').inc(lookup_seconds)
+        STAGE_SECONDS.labels('assemble').inc(assembly_seconds)
+        ROWS_PROCESSED.inc(len(chunk))
+        return chunk
+
+
+# Address_Quality values; stored results keep the column as this categorical
+ADDRESS_QUALITIES = pd.CategoricalDtype([
+    'Complete Street Address', 'Nearby Street Address', 'Street Only', 'Area Only', 'Coordinates Only', 'Error'
+])
+# Qualities whose Street_Name is "<house number> <street>"
+WITH_HOUSE_NUMBER = ['Complete Street Address', 'Nearby Street Address']
+
+# Columns stored results hold instead of Physical_Address and Street_Name:
+# the part of the address after Street_Name (the whole place name for Area
+# Only rows; missing where the address is made up from the coordinates),
+# the street and the house number
+ADDRESS_TAIL = '_address_tail'
+STREET = '_street'
+HOUSE_NUMBER = '_house_number'
+COMPACT_ADDRESS_COLUMNS = [ADDRESS_TAIL, STREET, HOUSE_NUMBER, 'Address_Quality']
+
+
+def fill_coordinate_addresses(physical, quality, lats, lons, city=None):
+    """Fill in Physical_Address, in place, for rows whose address comes from their coordinates
+
+    Rows without an address get "lat, lon" with six decimals, followed by
+    their City if known; rows whose lookup failed get "lat, lon" and rows
+    with invalid coordinates 'Invalid coordinates'.
+    """
+    valid = (lats.notna() & lons.notna()).to_numpy()
+    physical[~valid] = 'Invalid coordinates'
+    
+    # Rows without an address fall back to their own coordinates
+    no_address = valid & (quality == 'Coordinates Only')
+    if no_address.any():
+        fallback = lats[no_address].map('{:.6f}'.format) + ', ' + lons[no_address].map('{:.6f}'.format)
+        if city is not None:
+            city = city[no_address]
+            fallback = fallback.where(city.isna(), fallback + ', ' + city.astype(str))
+        physical[no_address] = fallback.to_numpy()
+    
+    lookup_failed = valid & (quality == 'Error')
+    if lookup_failed.any():
+        physical[lookup_failed] = (
+            lats[lookup_failed].astype(str) + ', ' + lons[lookup_failed].astype(str)
+        ).to_numpy()
+
+
+def compact_results(chunk):
+    """Dictionary-encode a geocoded chunk's address columns for keeping in memory
+
+    Physical_Address and Street_Name are split into house number, street
+    and the rest of the address, each a categorical, so every distinct
+    value is held once however many rows share it; Address_Quality becomes
+    a one-byte code. expand_results() puts the strings back together, from
+    the row's coordinates where they were made up from them. Chunks that
+    are already compact are returned unchanged.
+    """
+    if 'Physical_Address' not in chunk.columns:
+        return chunk
+    physical = chunk['Physical_Address'].to_numpy(dtype=object)
+    street_name = chunk['Street_Name'].to_numpy(dtype=object)
+    quality = pd.Categorical(chunk['Address_Quality'], dtype=ADDRESS_QUALITIES)
+    complete = np.isin(quality.codes, ADDRESS_QUALITIES.categories.get_indexer(WITH_HOUSE_NUMBER))
+    street_only = quality.codes == ADDRESS_QUALITIES.categories.get_loc('Street Only')
+    area = quality.codes == ADDRESS_QUALITIES.categories.get_loc('Area Only')
+    
+    # Split each distinct Street_Name, and (Physical_Address, Street_Name) pair, once
+    street_codes, street_names = pd.factorize(street_name)
+    physical_codes, physicals = pd.factorize(physical)
+    width = max(len(street_names), 1)
+    pairs, pair_values = pd.factorize(physical_codes.astype(np.int64) * width + street_codes)
+    tails = np.array(
+        [physicals[value // width][len(street_names[value % width]):] for value in pair_values],
+        dtype=object
+    )
+    parts = [name.partition(' ') for name in street_names]
+    houses = np.array([house for house, _, _ in parts], dtype=object)
+    roads = np.array([road for _, _, road in parts], dtype=object)
+    
+    tail = np.full(len(chunk), np.nan, dtype=object)
+    tail[complete | street_only] = tails[pairs[complete | street_only]]
+    tail[area] = physical[area]
+    street = np.full(len(chunk), np.nan, dtype=object)
+    street[complete] = roads[street_codes[complete]]
+    street[street_only] = street_name[street_only]
+    house = np.full(len(chunk), np.nan, dtype=object)
+    house[complete] = houses[street_codes[complete]]
+    
+    compact = {}
+    for col in chunk.columns:
+        if col == 'Physical_Address':
+            compact[ADDRESS_TAIL] = pd.Categorical(tail)
+        elif col == 'Street_Name':
+            compact[STREET] = pd.Categorical(street)
+            compact[HOUSE_NUMBER] = pd.Categorical(house)
+        elif col == 'Address_Quality':
+            compact[col] = quality
+        else:
+            compact[col] = chunk[col]
+    return pd.DataFrame(compact, index=chunk.index)
+
+
+def expand_results(chunk):
+    """Plain columns with Physical_Address and Street_Name for compact results, as for export"""
+    if ADDRESS_TAIL not in chunk.columns:
+        return chunk
+    quality = np.asarray(chunk['Address_Quality'], dtype=object)
+    complete = np.isin(quality, WITH_HOUSE_NUMBER)
+    street_only = quality == 'Street Only'
+    street = np.asarray(chunk[STREET], dtype=object)
+    street_name = np.full(len(chunk), '', dtype=object)
+    street_name[complete] = np.asarray(chunk[HOUSE_NUMBER], dtype=object)[complete] + ' ' + street[complete]
+    street_name[street_only] = street[street_only]
+    
+    physical = np.asarray(chunk[ADDRESS_TAIL], dtype=object).copy()
+    with_street = complete | street_only
+    physical[with_street] = street_name[with_street] + physical[with_street]
+    if pd.isna(physical).any():
+        fill_coordinate_addresses(
+            physical, quality,
+            pd.to_numeric(chunk['Center_Latitude'], errors='coerce'),
+            pd.to_numeric(chunk['Center_Longitude'], errors='coerce'),
+            chunk['City'] if 'City' in chunk.columns else None
+        )
+    
+    columns = {}
+    for col in chunk.columns:
+        if col == ADDRESS_TAIL:
+            columns['Physical_Address'] = physical
+        elif col == STREET:
+            columns['Street_Name'] = street_name
+        elif col == HOUSE_NUMBER:
+            continue
+        elif col == 'Address_Quality':
+            columns[col] = quality
+        elif isinstance(chunk[col].dtype, pd.CategoricalDtype):
+            columns[col] = chunk[col].astype(chunk[col].cat.categories.dtype)
+        else:
+            columns[col] = chunk[col]
+    return pd.DataFrame(columns, index=chunk.index)
+
+
+def concat_results(chunks):
+    """Concatenate compact result chunks into one, keeping them compact
+
+    The address categoricals are merged rather than turned back into
+    strings, and input text columns in which values repeat (such as City)
+    are made categorical as well.
+    """
+    df = pd.concat([chunk.drop(columns=COMPACT_ADDRESS_COLUMNS) for chunk in chunks], ignore_index=True)
+    for col in COMPACT_ADDRESS_COLUMNS:
+        # Give every chunk the same categories, so that only codes are concatenated
+        categories = pd.Index(np.concatenate([
+            chunk[col].cat.categories.to_numpy(dtype=object) for chunk in chunks
+        ])).unique()
+        df[col] = pd.concat([chunk[col].cat.set_categories(categories) for chunk in chunks], ignore_index=True)
+    df['Address_Quality'] = df['Address_Quality'].astype(ADDRESS_QUALITIES)
+    
+    for col in df.columns:
+        if pd.api.types.is_string_dtype(df[col].dtype) and df[col].nunique(dropna=False) <= len(df) // 2:
+            with contextlib.suppress(TypeError):
+                df[col] = df[col].astype('category')
+    return df[list(chunks[0].columns)]
+
+
+def address_stats(quality, total):
+    """Count rows per address quality for the results summary"""
+    counts = pd.Series(quality).value_counts()
+    return {
+        'complete_address': int(counts.get('Complete Street Address', 0)),
+        'nearby_address': int(counts.get('Nearby Street Address', 0)),
+        'street_only': int(counts.get('Street Only', 0)),
+        'area_only': int(counts.get('Area Only', 0)),
+        'coordinates_only': int(counts.get('Coordinates Only', 0)),
+        'total': total
+    }
+
+class DatasetHistory:
+    """Results of the last completed full run of a named dataset, for incremental re-runs
+
+    Rows are identified by a fingerprint of their coordinates and City
+    (plus ``id_column`` when given). ``process`` copies the address columns
+    of rows whose fingerprint was in the previous run and only sends the
+    other rows to ``compute``; rows that had no address last time are
+    always recomputed, since a lookup may succeed now. Each stored row
+    keeps the time its address was looked up, and rows older than
+    ``max_age`` seconds are recomputed too, as the geocode cache would.
+    ``save`` replaces the stored results with those of the current run.
+    """
+
+    COLUMNS = ['Physical_Address', 'Street_Name', 'Address_Quality']
+    REUSABLE = ('Complete Street Address', 'Street Only', 'Area Only')
+
+    def __init__(self, root, name, id_column=None, reuse=True, max_age=None):
+        self.path = self.snapshot_path(root, name)
+        self.id_column = id_column
+        self.max_age = max_age
+        self.previous = None
+        if reuse and os.path.exists(self.path):
+            self.previous = pd.read_pickle(self.path)
+            if 'resolved_at' not in self.previous.columns:
+                # Snapshots from before per-row times: date them by the file
+                self.previous['resolved_at'] = os.path.getmtime(self.path)
+            self.positions = pd.Index(self.previous['fingerprint'])
+        self.fingerprints = []
+        self.resolved_at = []  # per chunk, when each row's address was looked up
+        self.reused = 0
+        self.recomputed = 0
+
+    @staticmethod
+    def snapshot_path(root, name):
+        return os.path.join(root, f"{secure_filename(name) or 'dataset'}.pkl")
+
+    def fingerprint(self, chunk):
+        """64-bit hash per row of the columns that decide its address"""
+        parts = {
+            'lat': pd.to_numeric(chunk['Center_Latitude'], errors='coerce'),
+            'lon': pd.to_numeric(chunk['Center_Longitude'], errors='coerce')
         }
+        if 'City' in chunk.columns:
+            parts['city'] = chunk['City'].astype(object)
+        if self.id_column:
+            parts['id'] = chunk[self.id_column].astype(str)
+        return pd.util.hash_pandas_object(pd.DataFrame(parts), index=False).to_numpy()
+
+    def _match(self, chunk):
+        """Note a chunk's fingerprints and times; return positions in the previous run and which rows to reuse"""
+        fingerprints = self.fingerprint(chunk)
+        self.fingerprints.append(fingerprints)
+        now = time.time()
+        if self.previous is None:
+            self.resolved_at.append(np.full(len(chunk), now))
+            return None, np.zeros(len(chunk), dtype=bool)
+        
+        found = self.positions.get_indexer(fingerprints)
+        reuse = found >= 0
+        resolved_at = np.full(len(chunk), now)
+        resolved_at[reuse] = self.previous['resolved_at'].to_numpy()[found[reuse]]
+        if self.max_age:
+            reuse &= now - resolved_at <= self.max_age
+        self.resolved_at.append(np.where(reuse, resolved_at, now))
+        return found, reuse
+
+    def record(self, chunk):
+        """Note the fingerprints of a chunk whose result came from elsewhere (a checkpoint)"""
+        self._match(chunk)
+
+    def process(self, chunk, compute):
+        """Return chunk with the address columns, reusing the previous run's where possible"""
+        found, reuse = self._match(chunk)
+        self.reused += int(reuse.sum())
+        self.recomputed += int((~reuse).sum())
+        if not reuse.any():
+            return compute(chunk)
         
-        sample_addresses = []
+        result = chunk.copy()
+        computed = compute(chunk[~reuse]) if not reuse.all() else None
+        for col in self.COLUMNS:
+            values = np.empty(len(chunk), dtype=object)
+            values[reuse] = self.previous[col].to_numpy()[found[reuse]]
+            if computed is not None:
+                values[~reuse] = computed[col].to_numpy()
+            result[col] = values
+        return result
+
+    def save(self, results):
+        """Store the address columns of this run's (compact) results for the next run"""
+        fingerprints = np.concatenate(self.fingerprints) if self.fingerprints else np.array([], dtype=np.uint64)
+        resolved_at = np.concatenate(self.resolved_at) if self.resolved_at else np.array([], dtype=float)
+        reusable = results['Address_Quality'].isin(self.REUSABLE).to_numpy()
+        # Reusable rows have a looked-up address, so no coordinates are needed to expand them
+        snapshot = expand_results(results.loc[reusable, COMPACT_ADDRESS_COLUMNS])
+        snapshot = snapshot[self.COLUMNS].reset_index(drop=True)
+        snapshot.insert(0, 'fingerprint', fingerprints[reusable])
+        snapshot['resolved_at'] = resolved_at[reusable]
+        snapshot = snapshot.drop_duplicates('fingerprint').reset_index(drop=True)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        snapshot.to_pickle(tmp_path)
+        os.replace(tmp_path, self.path)
+
+
+def process_addresses(source, session_id, rows_to_process=None, checkpoint=None, cancel_event=None):
+    """Process addresses in background
+
+    ``source`` is a DataFrame or an iterable of DataFrame chunks (e.g. a
+    streaming upload); chunks are geocoded as they arrive. ``rows_to_process``
+    limits the job to the first rows, ``None`` processes everything. Setting
+    ``cancel_event`` stops the job at the next lookup step.
+
+    With a ``checkpoint``, ``source`` is the checkpoint's input; each chunk's
+    result is saved as it completes, and chunks that already have a saved
+    result (from before a restart) are not geocoded again.
+
+    Time spent per stage is kept in the status's ``timings``. If the status
+    has ``profile`` set, the job runs under cProfile and the profile is
+    saved for /profile/<session_id>.
+    """
+    chunks = [source] if isinstance(source, pd.DataFrame) else source
+    status = processing_status[session_id]
+    status['status'] = 'processing'
+    status.pop('queue_position', None)
+    started = time.time()
+    timings = status.setdefault('timings', dict.fromkeys(JOB_STAGES, 0.0))
+    if not timings.get('queue_wait') and 'created_at' in status:
+        timings['queue_wait'] = started - status['created_at']
+    notify_status_change(session_id)
+    
+    profiler = None
+    if status.get('profile'):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process; run unprofiled
+            profiler = None
+    
+    def save_profile():
+        nonlocal profiler
+        if profiler is not None:
+            profiler.disable()
+            path = profile_path(session_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            profiler.dump_stats(path)
+            status['profile_url'] = f"/profile/{session_id}"
+            profiler = None
+    
+    def update_progress():
+        lookups_done = geocoder.lookups_done
+        lookups_total = geocoder.lookups_total
+        elapsed = time.time() - started
+        status['processed'] = lookups_done
+        status['total'] = lookups_total
+        status['cache_hits'] = geocoder.cache_hits
+        status['cache_misses'] = geocoder.cache_misses
+        status['rate'] = round(lookups_done / max(elapsed, 1e-3), 1)
+        status['eta_seconds'] = round(elapsed / max(lookups_done, 1) * (lookups_total - lookups_done), 1)
+        notify_status_change(session_id, progress=True)
+    
+    try:
+        # Initialize geocoder
+        geocoder = ChunkGeocoder(
+            get_geocoder_backend(),
+            get_geocode_cache(),
+            precision=app.config['DEDUP_PRECISION'],
+            on_progress=update_progress,
+            client=session_id,
+            cancel_event=cancel_event,
+            timings=timings,
+            areas=get_admin_areas(),
+            nearby=get_nearby_index()
+        )
+        compute = geocoder.process
+        history = None
+        if status.get('dataset') and app.config['DATASET_DIR']:
+            history = DatasetHistory(
+                app.config['DATASET_DIR'], status['dataset'],
+                id_column=status.get('id_column'), reuse=status.get('reuse_previous', True),
+                max_age=app.config['GEOCODE_CACHE_TTL']
+            )
+            compute = functools.partial(history.process, compute=geocoder.process)
         
-        # Process each row
-        for idx, row in working_df.iterrows():
-            lat = row['Center_Latitude']
-            lon = row['Center_Longitude']
+        # Geocode each chunk as soon as it has been parsed
+        results = []
+        rows = 0
+        for index, chunk in enumerate(chunks):
+            if rows_to_process is not None:
+                chunk = chunk.head(rows_to_process - rows)
             
-            try:
-                if pd.notna(lat) and pd.notna(lon):
-                    # Get address from coordinates
-                    location = geocode(
-                        (lat, lon),
-                        exactly_one=True,
-                        zoom=18,
-                        language='en'
-                    )
-                    
-                    if location and location.raw:
-                        addr = location.raw.get('address', {})
-                        
-                        # Extract components
-                        house_num = addr.get('house_number', '')
-                        street = addr.get('road') or addr.get('street') or addr.get('highway', '')
-                        city = addr.get('city') or addr.get('town') or addr.get('village', '')
-                        state = addr.get('state', '')
-                        postcode = addr.get('postcode', '')
-                        
-                        # Build address
-                        if house_num and street:
-                            address_parts = [f"{house_num} {street}"]
-                            if city: address_parts.append(city)
-                            if state: address_parts.append(state)
-                            if postcode: address_parts.append(postcode)
-                            
-                            address = ', '.join(address_parts)
-                            working_df.at[idx, 'Physical_Address'] = address
-                            working_df.at[idx, 'Street_Name'] = f"{house_num} {street}"
-                            working_df.at[idx, 'Address_Quality'] = 'Complete Street Address'
-                            stats['complete_address'] += 1
-                            
-                            if len(sample_addresses) < 5:
-                                sample_addresses.append(address)
-                                
-                        elif street:
-                            address_parts = [street]
-                            if city: address_parts.append(city)
-                            if state: address_parts.append(state)
-                            if postcode: address_parts.append(postcode)
-                            
-                            address = ', '.join(address_parts)
-                            working_df.at[idx, 'Physical_Address'] = address
-                            working_df.at[idx, 'Street_Name'] = street
-                            working_df.at[idx, 'Address_Quality'] = 'Street Only'
-                            stats['street_only'] += 1
-                            
-                        else:
-                            working_df.at[idx, 'Physical_Address'] = location.address
-                            working_df.at[idx, 'Address_Quality'] = 'Area Only'
-                            stats['area_only'] += 1
-                    else:
-                        # Use coordinates
-                        fallback = f"{lat:.6f}, {lon:.6f}"
-                        if 'City' in row and pd.notna(row['City']):
-                            fallback += f", {row['City']}"
-                        working_df.at[idx, 'Physical_Address'] = fallback
-                        working_df.at[idx, 'Address_Quality'] = 'Coordinates Only'
-                        stats['coordinates_only'] += 1
-                else:
-                    working_df.at[idx, 'Physical_Address'] = 'Invalid coordinates'
-                    working_df.at[idx, 'Address_Quality'] = 'Error'
-                    
-            except Exception as e:
-                working_df.at[idx, 'Physical_Address'] = f"{lat}, {lon}"
-                working_df.at[idx, 'Address_Quality'] = 'Error'
+            # Results are kept compact; addresses are only spelled out for export
+            if checkpoint is None:
+                results.append(compact_results(compute(chunk)))
+            elif checkpoint.has_result(index):
+                results.append(compact_results(checkpoint.load_result(index)))
+                if history is not None:
+                    history.record(chunk)
+            else:
+                results.append(compact_results(compute(chunk)))
+                checkpoint.save_result(index, results[-1])
             
-            # Update progress
-            processing_status[session_id]['processed'] = idx + 1
+            rows += len(chunk)
+            status['rows'] = rows
+            if history is not None:
+                status['rows_reused'] = history.reused
+                status['rows_recomputed'] = history.recomputed
+            if rows_to_process is not None and rows >= rows_to_process:
+                break
+        status['parsing'] = False
+        if checkpoint is not None:
+            # Parsed by the spooler, possibly in another worker
+            parse_seconds = None
+            with contextlib.suppress(OSError, ValueError):
+                parse_seconds = checkpoint.read_meta().get('parse_seconds')
+            if parse_seconds is not None:
+                timings['parse'] = parse_seconds
+        update_progress()
         
-        # Store results
+        store_started = time.perf_counter()
+        working_df = concat_results(results)
+        del results
+        
+        complete = working_df[working_df['Address_Quality'] == 'Complete Street Address']
+        sample = complete.drop_duplicates([ADDRESS_TAIL, STREET, HOUSE_NUMBER]).head(5)
+        sample_addresses = expand_results(sample)['Physical_Address'].tolist()
+        
+        # Store results; other workers read them from the spill directory
         results_storage[session_id] = working_df
+        if get_job_store() is not None:
+            get_job_store().set_result(session_id, results_storage.persist(session_id))
+        if history is not None:
+            # The next run of the dataset compares against this one; a failure
+            # to save only means it recomputes everything
+            with contextlib.suppress(OSError):
+                history.save(working_df)
+        timings['store_results'] = time.perf_counter() - store_started
+        save_profile()
         
-        # Update status
-        processing_status[session_id]['status'] = 'completed'
-        processing_status[session_id]['results'] = {
-            'stats': stats,
+        # Update status; results first so pollers never see 'completed' without them
+        status['results'] = {
+            'stats': address_stats(working_df['Address_Quality'], rows),
+            'cache': {'hits': geocoder.cache_hits, 'misses': geocoder.cache_misses},
+            'areas': {'answered': geocoder.area_answers, 'fallbacks': geocoder.area_fallbacks},
+            'nearby_reused': geocoder.nearby_answers,
+            'grid_answers': geocoder.grid_answers,
+            'unique_lookups': geocoder.lookups_total,
             'sample_addresses': sample_addresses
         }
+        if history is not None:
+            status['results']['incremental'] = {
+                'dataset': status['dataset'],
+                'reused': history.reused,
+                'recomputed': history.recomputed
+            }
+        status['status'] = 'completed'
         
+    except JobCancelled:
+        status['status'] = 'cancelled'
+    
     except Exception as e:
-        processing_status[session_id]['status'] = 'error'
-        processing_status[session_id]['message'] = str(e)
+        status['status'] = 'error'
+        status['message'] = str(e)
+    
+    finally:
+        save_profile()
+        status['finished_at'] = time.time()
+        JOB_SECONDS.labels(status['status']).observe(status['finished_at'] - started)
+        notify_status_change(session_id)
+        # Stop the upload parser if the row limit was reached early
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        # Completed, failed and cancelled jobs don't need resuming
+        if checkpoint is not None:
+            checkpoint.finish()
+
+def run_stored_job(session_id, rows_to_process, cancel_event, lease_lost):
+    """Run a job claimed from the job store, reading its input from the checkpoint"""
+    status = get_job_store().status(session_id)
+    if status['status'] == 'processing':
+        # Taken over from a worker that stopped renewing its lease
+        status['resumed'] = True
+    processing_status[session_id] = status
+    checkpoint = JobCheckpoint(app.config['CHECKPOINT_DIR'], session_id, lease_lost=lease_lost)
+    try:
+        process_addresses(
+            checkpoint.input_chunks(stall_timeout=app.config['JOB_LEASE_SECONDS']),
+            session_id, rows_to_process, checkpoint=checkpoint, cancel_event=cancel_event
+        )
+    finally:
+        # The store is the source of truth; don't keep a copy that could go stale
+        processing_status.pop(session_id, None)
+
+def estimate_rows(path, fmt, sample_bytes=1 << 20):
+    """Roughly how many data rows a file on disk has, without parsing it, or None if unknown
+
+    Parquet and ``.xlsx`` files record their row count (an ``.xlsx`` may
+    overstate it); CSV rows are counted in the first ``sample_bytes`` and
+    scaled up to the file size.
+    """
+    try:
+        if fmt == '.parquet':
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(path).metadata.num_rows
+        if fmt == '.xlsx':
+            workbook = openpyxl.load_workbook(path, read_only=True)
+            try:
+                max_row = workbook.active.max_row
+            finally:
+                workbook.close()
+            return None if max_row is None else max(max_row - 1, 0)
+        if fmt == '.csv':
+            size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                sample = f.read(sample_bytes)
+            lines = sample.count(b'\n') + (not sample.endswith(b'\n') and len(sample) == size)
+            if len(sample) < size:
+                lines = lines * size / max(len(sample), 1)
+            return max(int(lines) - 1, 0)
+    except Exception:
+        # No pyarrow, or a file the parser will complain about itself
+        return None
+    return None
+
+
+def run_batch(input_path, output_path, chunk_rows=None, usecols=None, limit=None,
+              max_payloads=100000, progress_stream=None):
+    """Geocode a file on disk into another file, without the web app
+
+    The input is parsed in chunks of ``chunk_rows`` rows and each chunk is
+    appended to ``output_path`` (format taken from its extension) as soon
+    as it is geocoded, so memory use does not grow with the file size.
+    ``limit`` stops after that many rows. Throughput and an ETA, from the
+    rows geocoded so far against estimate_rows(), are printed to
+    ``progress_stream`` (stderr by default). The output is written to a
+    temporary name and only renamed into place once complete. Returns the
+    address_stats() summary.
+    """
+    progress_stream = progress_stream or sys.stderr
+    chunk_rows = chunk_rows or app.config['UPLOAD_CHUNK_ROWS']
+    fmt = upload_format(input_path)
+    if fmt is None:
+        raise ValueError(f'Unsupported input type, expected one of {list(UPLOAD_FORMATS)}')
+    writer_classes = {writer_class.extension: writer_class for writer_class in EXPORT_FORMATS.values()}
+    writer_class = writer_classes.get(os.path.splitext(output_path)[1].lower())
+    if writer_class is None:
+        raise ValueError(f'Unsupported output type, expected one of {list(writer_classes)}')
+    
+    # Parsing runs ahead of geocoding, so bytes read say little about progress
+    total_rows = estimate_rows(input_path, fmt)
+    if limit is not None:
+        total_rows = limit if total_rows is None else min(total_rows, limit)
+    tmp_path = output_path + '.part'
+    geocoder = ChunkGeocoder(
+        get_geocoder_backend(),
+        get_geocode_cache(),
+        precision=app.config['DEDUP_PRECISION'],
+        client='batch',
+        max_payloads=max_payloads,
+        areas=get_admin_areas(),
+        nearby=get_nearby_index()
+    )
+    started = time.time()
+    last_report = 0
+    rows = 0
+    stats = address_stats([], 0)
+    
+    def report(final=False):
+        nonlocal last_report
+        now = time.time()
+        if not final and now - last_report < 1:
+            return
+        last_report = now
+        elapsed = max(now - started, 1e-3)
+        progress = ''
+        if final:
+            progress = '100% done'
+        elif total_rows:
+            # The estimate can be low; stay short of 100% until the end
+            fraction = min(rows / total_rows, 0.99)
+            eta = elapsed * (1 - fraction) / fraction if fraction > 0 else 0
+            progress = f"{fraction:.0%} done  ETA {int(eta) // 3600}:{int(eta) % 3600 // 60:02d}:{int(eta) % 60:02d}"
+        progress_stream.write(
+            f"\r{rows:,} rows  {rows / elapsed:,.0f} rows/s  "
+            f"{geocoder.lookups_done:,} lookups ({geocoder.cache_hits:,} cached)  "
+            f"{progress}  " + ('\n' if final else '')
+        )
+        progress_stream.flush()
+    
+    with open(input_path, 'rb') as stream:
+        chunks = prefetch(read_upload_chunks(stream, fmt, chunk_rows, usecols=usecols))
+        try:
+            with open(tmp_path, 'wb') as out:
+                writer = writer_class(out)
+                for chunk in chunks:
+                    missing_cols = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+                    if missing_cols:
+                        raise ValueError(f'Missing required columns: {missing_cols}')
+                    if limit is not None:
+                        chunk = chunk.head(limit - rows)
+                    
+                    result = geocoder.process(chunk)
+                    writer.write(result)
+                    for name, count in address_stats(result['Address_Quality'], len(result)).items():
+                        stats[name] += count
+                    rows += len(chunk)
+                    report()
+                    if limit is not None and rows >= limit:
+                        break
+                writer.close()
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            chunks.close()
+    report(final=True)
+    return stats
+
+# Header line of exported cache files; the precision says how keys were rounded
+CACHE_EXPORT_HEADER = '# cluster-geocode-cache v1 precision='
+
+
+def export_cache(path, cache=None):
+    """Write the unexpired geocode cache entries to a gzipped tab-separated file
+
+    One ``key<TAB>created_at<TAB>payload JSON`` line per entry, so a warm
+    cache can be copied to another server with import_cache. Returns the
+    number of entries written.
+    """
+    cache = cache or get_geocode_cache()
+    tmp_path = path + '.part'
+    count = 0
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(f"{CACHE_EXPORT_HEADER}{cache.precision}\n")
+            for key, payload, created_at in cache.iter_entries():
+                f.write(f"{key}\t{created_at:.0f}\t{payload}\n")
+                count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def import_cache(path, cache=None, batch_size=5000):
+    """Load a file written by export_cache, keeping whichever copy of an entry is newer
+
+    Keys are re-rounded to this cache's precision and entries past its TTL
+    are skipped. Returns counts of entries read, written and expired.
+    """
+    cache = cache or get_geocode_cache()
+    cutoff = time.time() - cache.ttl_seconds if cache.ttl_seconds else 0
+    stats = {'read': 0, 'written': 0, 'expired': 0}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        if not f.readline().startswith(CACHE_EXPORT_HEADER):
+            raise ValueError(f"{path} is not a geocode cache export")
+        for lines in iter(lambda: list(itertools.islice(f, batch_size)), []):
+            entries = []
+            for line in lines:
+                key, created_at, payload = line.rstrip('\n').split('\t', 2)
+                stats['read'] += 1
+                if float(created_at) < cutoff:
+                    stats['expired'] += 1
+                    continue
+                entries.append((cache.make_key(*key.split(',')), json.loads(payload), float(created_at)))
+            stats['written'] += cache.put_many(entries)
+    return stats
+
+
+def warm_cache_grid(south, west, north, east, step, max_points=10000000, batch_size=5000, progress_stream=None):
+    """Look up every point of a lat/lon grid over a bounding box into the geocode cache
+
+    The grid is recorded in the cache, so a later point inside it that is
+    not cached itself is answered from the nearest grid point (at most
+    about ``step`` * 0.7 away) instead of being looked up; ``step`` (in
+    degrees) trades accuracy against the number of lookups. Grid points
+    are rounded to the key spacing, 10**-precision degrees with the coarser
+    of DEDUP_PRECISION and GEOCODE_CACHE_PRECISION. Points already cached
+    are skipped and lookups draw from the rate budget as client 'warmup'.
+    Returns counts of points, cached and looked up.
+    """
+    progress_stream = progress_stream or sys.stderr
+    precision = min(app.config['DEDUP_PRECISION'], app.config['GEOCODE_CACHE_PRECISION'])
+    if not step or step <= 0:
+        raise ValueError('The grid step must be a positive number of degrees')
+    
+    # The tolerance keeps edges like 40.8 / 0.001 = 40799.999... on the grid
+    lat_range = range(int(np.ceil(south / step - 1e-6)), int(np.floor(north / step + 1e-6)) + 1)
+    lon_range = range(int(np.ceil(west / step - 1e-6)), int(np.floor(east / step + 1e-6)) + 1)
+    total = len(lat_range) * len(lon_range)
+    if total > max_points:
+        # The smallest 1/2/5 x 10^k step whose grid fits
+        fitting = np.sqrt(max(north - south, 0) * max(east - west, 0) / max_points)
+        magnitude = 10 ** np.floor(np.log10(fitting)) if fitting > 0 else 10 ** -precision
+        suggested = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= fitting)
+        raise ValueError(
+            f"The grid has {total:,} points (more than {max_points:,}); use a step of at least {suggested:g} degrees"
+        )
+    lats = [round(i * step, precision) for i in lat_range]
+    lons = [round(i * step, precision) for i in lon_range]
+    
+    # Recorded up front: grid points not cached yet are simply looked up by jobs
+    cache = get_geocode_cache()
+    cache.add_grid(south, west, north, east, step, precision)
+    geocoder = ChunkGeocoder(
+        get_geocoder_backend(),
+        cache,
+        precision=precision,
+        client='warmup',
+        areas=get_admin_areas()
+    )
+    started = time.time()
+    done = 0
+    points = itertools.product(lats, lons)
+    for batch in iter(lambda: list(itertools.islice(points, batch_size)), []):
+        geocoder.resolve(batch)
+        # Everything is in the cache now; don't keep it in memory too
+        geocoder.payloads.clear()
+        done += len(batch)
+        elapsed = max(time.time() - started, 1e-3)
+        eta = elapsed / done * (total - done)
+        progress_stream.write(
+            f"\r{done:,}/{total:,} points  {done / elapsed:,.0f} points/s  "
+            f"{geocoder.cache_hits:,} already cached  ETA {int(eta) // 3600}:{int(eta) % 3600 // 60:02d}:{int(eta) % 60:02d}  "
+        )
+        progress_stream.flush()
+    progress_stream.write('\n')
+    return {
+        'points': total,
+        'already_cached': geocoder.cache_hits,
+        'looked_up': geocoder.cache_misses - geocoder.area_answers,
+        'answered_from_areas': geocoder.area_answers,
+        'failed': len(geocoder.failed)
+    }
+
+
+def warm_cache_from_results(path, chunk_rows=None, created_at=None):
+    """Fill the geocode cache from a previous result file, without any lookups
+
+    Rows of a file this app produced (Center_Latitude, Center_Longitude and
+    the Physical_Address, Street_Name and Address_Quality columns) are
+    turned back into payloads with result_payload. Keys already in the
+    cache are left alone; rows without an address are skipped so they are
+    looked up again. Entries are dated ``created_at`` (the file's
+    modification time by default), so an old file's addresses expire with
+    GEOCODE_CACHE_TTL as if they had been cached when it was made. Returns
+    counts of rows, entries written and rows without an address.
+    """
+    fmt = upload_format(path)
+    if fmt is None:
+        raise ValueError(f'Unsupported input type, expected one of {list(UPLOAD_FORMATS)}')
+    output_columns = ['Physical_Address', 'Street_Name', 'Address_Quality']
+    cache = get_geocode_cache()
+    precision = app.config['DEDUP_PRECISION']
+    created_at = created_at or os.path.getmtime(path)
+    stats = {'rows': 0, 'written': 0, 'without_address': 0}
+    with open(path, 'rb') as stream:
+        for chunk in read_upload_chunks(
+            stream, fmt, chunk_rows or app.config['UPLOAD_CHUNK_ROWS'], usecols=REQUIRED_COLUMNS + output_columns
+        ):
+            missing_cols = [col for col in REQUIRED_COLUMNS + output_columns if col not in chunk.columns]
+            if missing_cols:
+                raise ValueError(f'Missing required columns: {missing_cols}')
+            lats = pd.to_numeric(chunk['Center_Latitude'], errors='coerce').round(precision)
+            lons = pd.to_numeric(chunk['Center_Longitude'], errors='coerce').round(precision)
+            text = chunk[output_columns].fillna('').astype(str)
+            entries = {}
+            for lat, lon, physical, street_name, quality in zip(
+                lats.tolist(), lons.tolist(), *(text[col].tolist() for col in output_columns)
+            ):
+                payload = None if np.isnan(lat) or np.isnan(lon) else result_payload(physical, street_name, quality)
+                if payload is None:
+                    stats['without_address'] += 1
+                else:
+                    entries[cache.make_key(lat, lon)] = payload
+            stats['rows'] += len(chunk)
+            stats['written'] += cache.put_many(
+                [(key, payload, created_at) for key, payload in entries.items()], replace=False
+            )
+    return stats
+
+def current_status(session_id):
+    """Return the status dict of a job with its queue position refreshed, or None"""
+    if get_job_store() is not None:
+        status = get_job_store().status(session_id)
+    else:
+        status = processing_status.get(session_id)
+    if status is not None and status['status'] == 'queued':
+        status['queue_position'] = get_job_scheduler().position(session_id)
+    return status
 
 @app.route('/progress/<session_id>')
 def get_progress(session_id):
     """Get processing progress"""
-    if session_id not in processing_status:
+    status = current_status(session_id)
+    if status is None:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    if 'timings' in status:
+        status = {**status, 'timings': {stage: round(seconds, 3) for stage, seconds in status['timings'].items()}}
+    return jsonify(status)
+
+@app.route('/progress/<session_id>/stream')
+def stream_progress(session_id):
+    """Push progress to the browser as server-sent events
+
+    The first event carries the compact progress fields; later events only
+    the fields that changed. The final event also includes the results.
+    """
+    if current_status(session_id) is None:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    def events():
+        sent = {}
+        last_event = time.time()
+        while True:
+            status = current_status(session_id)
+            if status is None:
+                return
+            
+            snapshot = {k: status[k] for k in PROGRESS_FIELDS if k in status}
+            delta = {k: v for k, v in snapshot.items() if sent.get(k) != v}
+            finished = snapshot['status'] not in ('queued', 'processing')
+            if finished:
+                delta['results'] = status.get('results')
+            
+            if delta:
+                yield f"data: {json.dumps(delta)}\n\n"
+                sent.update(snapshot)
+                last_event = time.time()
+            elif time.time() - last_event > 15:
+                yield ': keepalive\n\n'
+                last_event = time.time()
+            
+            if finished:
+                return
+            
+            # Sleep until something changes, then let bursts of updates settle;
+            # changes made by other workers can only be polled for
+            with status_changed:
+                status_changed.wait(timeout=5 if get_job_store() is None else 0)
+            time.sleep(app.config['PROGRESS_MIN_INTERVAL'])
+    
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/storage')
+def storage_stats():
+    """Report result store memory use and eviction counters"""
+    expire_sessions()
+    store = get_job_store()
+    return jsonify({
+        'results': results_storage.stats(),
+        'sessions': len(processing_status) if store is None else sum(store.stats().values()),
+        'jobs': None if store is None else store.stats()
+    })
+
+@app.route('/profile/<session_id>')
+def download_profile(session_id):
+    """Download the cProfile output of a job uploaded with profile=1
+
+    Open it with ``python -m pstats`` or snakeviz; ``?format=text`` returns
+    the functions with the most cumulative time as plain text instead.
+    Only the job's own thread is profiled, not the upload parser.
+    """
+    path = profile_path(session_id)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    if request.args.get('format') == 'text':
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats('cumulative').print_stats(50)
+        return Response(out.getvalue(), mimetype='text/plain')
+    return send_file(path, as_attachment=True, download_name=f"{session_id}.prof")
+
+@app.route('/metrics')
+def metrics():
+    """Counters and histograms for Prometheus to scrape
+
+    Values are per worker process, apart from the job counts, which come
+    from the shared job store when there is one.
+    """
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/cancel/<session_id>', methods=['POST'])
+def cancel_job(session_id):
+    """Cancel a queued or running job"""
+    if current_status(session_id) is None:
         return jsonify({'error': 'Session not found'}), 404
     
-    return jsonify(processing_status[session_id])
+    cancelled_while = get_job_scheduler().cancel(session_id)
+    if cancelled_while is None:
+        return jsonify({'error': 'Job already finished'}), 409
+    # A shared job store has already recorded the cancellation
+    if cancelled_while == 'queued' and session_id in processing_status:
+        processing_status[session_id]['status'] = 'cancelled'
+        processing_status[session_id]['finished_at'] = time.time()
+        processing_status[session_id].pop('queue_position', None)
+        notify_status_change()
+    
+    return jsonify({'session_id': session_id, 'cancelled': cancelled_while})
 
 @app.route('/download/<session_id>')
 def download_results(session_id):
     """Download processed results"""
-    if session_id not in results_storage:
+    store = get_job_store()
+    df = results_storage.get(session_id)
+    if df is None and store is not None and store.result_path(session_id):
+        # Completed by another worker
+        with contextlib.suppress(FileNotFoundError):
+            df = read_result_file(store.result_path(session_id))
+    if df is None:
         return jsonify({'error': 'Results not found'}), 404
     
-    df = results_storage[session_id]
+    fmt = request.args.get('format', 'xlsx').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format '{fmt}', expected one of {list(EXPORT_FORMATS)}"}), 400
     
-    # Create temporary file for download
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_filename = f"cluster_addresses_{timestamp}.xlsx"
-    output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
+    writer_class = EXPORT_FORMATS[fmt]
     
-    # Save to Excel with formatting
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Addresses', index=False)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_filename = f"cluster_addresses_{timestamp}{writer_class.extension}"
     
-    # Send file and clean up
-    response = send_file(output_path, as_attachment=True, download_name=output_filename)
+    # Stream the file straight to the client as it is written, spelling
+    # out the addresses of each chunk only as it is exported
+    chunks = (expand_results(chunk) for chunk in iter_chunks(df, app.config['UPLOAD_CHUNK_ROWS']))
+    response = Response(
+        stream_export(chunks, fmt),
+        mimetype=writer_class.mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{output_filename}"'}
+    )
     
     # Clean up after sending
     @response.call_on_close
     def cleanup():
-        if os.path.exists(output_path):
-            os.remove(output_path)
         # Clean up session data
-        if session_id in results_storage:
+        with contextlib.suppress(KeyError):
             del results_storage[session_id]
         if session_id in processing_status:
             del processing_status[session_id]
+        if store is not None:
+            store.delete(session_id)
     
     return response
 
+def api_max_lookups(backend):
+    """Most uncached points one /api/reverse request may look up, or None for no limit"""
+    if app.config['API_MAX_LOOKUPS'] > 0:
+        return app.config['API_MAX_LOOKUPS']
+    rate = backend.rate_budget.rate
+    if not rate:
+        return None
+    return max(int(rate * app.config['API_LOOKUP_TIMEOUT']), 1)
+
+
+@app.route('/api/reverse', methods=['POST'])
+def api_reverse():
+    """Reverse-geocode a JSON array of points and return the results synchronously
+
+    Points are ``[lat, lon]`` pairs or ``{"lat": ..., "lon": ..., "city": ...}``
+    objects (``city`` is optional). Each result has the same address fields
+    and quality classification as a row of an uploaded sheet. Cached points
+    are answered straight away; the rest are looked up in batches shared
+    with concurrent requests. A request needing more lookups than
+    api_max_lookups() is refused with 413, so one caller cannot hold a
+    worker for minutes on a slow geocoder; large sets go through /upload.
+    """
+    points = request.get_json(silent=True)
+    if not isinstance(points, list) or not points:
+        return jsonify({'error': 'Expected a non-empty JSON array of points'}), 400
+    if len(points) > app.config['API_MAX_POINTS']:
+        return jsonify({'error': f"At most {app.config['API_MAX_POINTS']} points per request"}), 413
+    
+    lats, lons, cities = [], [], []
+    for point in points:
+        if isinstance(point, dict):
+            lat, lon, city = point.get('lat'), point.get('lon'), point.get('city')
+        elif isinstance(point, list) and len(point) == 2:
+            (lat, lon), city = point, None
+        else:
+            return jsonify({'error': f'Invalid point {point!r}, expected [lat, lon] or {{"lat": ..., "lon": ...}}'}), 400
+        lats.append(lat)
+        lons.append(lon)
+        cities.append(city)
+    
+    # Numeric strings count as coordinates, as they do in uploaded sheets
+    lat_values = pd.to_numeric(pd.Series(lats, dtype=object), errors='coerce').to_numpy(dtype=float)
+    lon_values = pd.to_numeric(pd.Series(lons, dtype=object), errors='coerce').to_numpy(dtype=float)
+    valid = ~(np.isnan(lat_values) | np.isnan(lon_values))
+    precision = app.config['DEDUP_PRECISION']
+    keys = list(zip(np.round(lat_values, precision).tolist(), np.round(lon_values, precision).tolist()))
+    
+    batcher = get_reverse_batcher()
+    geocoder = ChunkGeocoder(
+        batcher.backend,
+        get_geocode_cache(),
+        precision=precision,
+        client=batcher.client,
+        lookup=batcher.lookup,
+        areas=get_admin_areas(),
+        nearby=get_nearby_index(),
+        max_lookups=api_max_lookups(batcher.backend)
+    )
+    try:
+        geocoder.resolve(list(dict.fromkeys(key for key, ok in zip(keys, valid) if ok)))
+    except TooManyLookups as e:
+        return jsonify({
+            'error': f'{e.needed} of these points are not cached and this endpoint looks up at most '
+                     f'{e.limit} per request; send fewer points, or upload them as a file to /upload'
+        }), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+    
+    # Per-row fallbacks match ChunkGeocoder.process
+    results = []
+    for lat, lon, city, key, ok, in_lat, in_lon in zip(
+        lat_values.tolist(), lon_values.tolist(), cities, keys, valid, lats, lons
+    ):
+        if not ok:
+            physical, street_name, quality = 'Invalid coordinates', '', 'Error'
+        elif key in geocoder.failed:
+            physical, street_name, quality = f"{lat}, {lon}", '', 'Error'
+        else:
+            physical, street_name, quality = address_fields(geocoder.payloads.get(key), key in geocoder.nearby_keys)
+            if quality == 'Coordinates Only':
+                physical = f"{lat:.6f}, {lon:.6f}" + ('' if city is None else f", {city}")
+        results.append({
+            'lat': in_lat, 'lon': in_lon,
+            'Physical_Address': physical, 'Street_Name': street_name, 'Address_Quality': quality
+        })
+    ROWS_PROCESSED.inc(len(results))
+    
+    return jsonify({
+        'results': results,
+        'cache_hits': geocoder.cache_hits,
+        'lookups': geocoder.cache_misses - geocoder.area_answers - geocoder.nearby_answers - geocoder.grid_answers
+    })
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run the Cluster Address Finder web app, or geocode INPUT into OUTPUT from the command line'
+    )
+    parser.add_argument('input', nargs='?', help=f"file to geocode ({', '.join(UPLOAD_FORMATS)})")
+    parser.add_argument('output', nargs='?', help='file to write (.xlsx, .csv, .parquet or .geojson)')
+    parser.add_argument('--chunk-rows', type=int, default=app.config['UPLOAD_CHUNK_ROWS'],
+                        help='rows parsed, geocoded and written at a time')
+    parser.add_argument('--columns', help='comma-separated extra columns to keep (default: all)')
+    parser.add_argument('--limit', type=int, help='only process the first LIMIT rows')
+    parser.add_argument('--warm-grid', nargs=4, type=float, metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'),
+                        help='look up every grid point in a bounding box into the geocode cache')
+    parser.add_argument('--step', type=float,
+                        help='grid spacing in degrees for --warm-grid (required with it), e.g. 0.001 for ~100 m')
+    parser.add_argument('--warm-from', metavar='RESULTS',
+                        help='fill the geocode cache from a previous result file, without lookups')
+    parser.add_argument('--export-cache', metavar='PATH', help='write the geocode cache to a gzipped file')
+    parser.add_argument('--import-cache', metavar='PATH', help='merge a file written by --export-cache into the cache')
+    args = parser.parse_args()
+    if args.warm_grid and args.step is None:
+        parser.error('--step is required with --warm-grid')
+    
+    cache_commands = [
+        (args.warm_grid, lambda: warm_cache_grid(*args.warm_grid, step=args.step)),
+        (args.warm_from, lambda: warm_cache_from_results(args.warm_from, chunk_rows=args.chunk_rows)),
+        (args.import_cache, lambda: import_cache(args.import_cache)),
+        (args.export_cache, lambda: {'exported': export_cache(args.export_cache)}),
+    ]
+    if any(option for option, _ in cache_commands):
+        try:
+            # Imports and warm-ups run before an export, so one call can do both
+            for option, command in cache_commands:
+                if option:
+                    print(json.dumps(command(), indent=2))
+        except (OSError, ValueError, RuntimeError) as e:
+            sys.exit(f"Error: {e}")
+        except KeyboardInterrupt:
+            sys.exit('Interrupted')
+        sys.exit(0)
+    
+    if args.input:
+        if not args.output:
+            parser.error('OUTPUT is required when INPUT is given')
+        usecols = None
+        if args.columns:
+            extra_cols = [col.strip() for col in args.columns.split(',') if col.strip()]
+            usecols = list(dict.fromkeys(REQUIRED_COLUMNS + ['City'] + extra_cols))
+        try:
+            stats = run_batch(args.input, args.output, chunk_rows=args.chunk_rows, usecols=usecols, limit=args.limit)
+        except (OSError, ValueError, RuntimeError) as e:
+            sys.exit(f"Error: {e}")
+        except KeyboardInterrupt:
+            sys.exit('Interrupted')
+        print(json.dumps(stats, indent=2))
+        sys.exit(0)
+    
     print("\n" + "="*60)
     print("CLUSTER ADDRESS FINDER WEB APP")
     print("="*60)
@@ -852,4 +5574,11 @@ if __name__ == '__main__':
     print("\nTo stop the server, press Ctrl+C")
     print("="*60 + "\n")
     
+    # Pick up jobs interrupted by a previous run, here rather than on the first request
+    _jobs_resumed = True
+    start_session_janitor()
+    resumed = resume_checkpointed_jobs()
+    if resumed:
+        print(f"Resuming {len(resumed)} unfinished job(s)\n")
+    
     app.run(debug=False, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
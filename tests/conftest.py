@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# Keep the app's caches and work directories out of the source tree
+os.environ.setdefault('GEOCODE_CACHE_PATH', os.path.join(os.environ.get('TMPDIR', '/tmp'), 'cluster_test_cache.sqlite3'))
+os.environ.setdefault('DATASET_DIR', '')
+os.environ.setdefault('CHECKPOINT_DIR', '')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """Stands in for time.time so entries can be aged without sleeping"""
+
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import cluster_app
+    clock = Clock()
+    monkeypatch.setattr(cluster_app.time, 'time', clock)
+    return clock
@@ -0,0 +1,56 @@
+import pytest
+
+import cluster_app
+from cluster_app import GeocodeCache, GeocoderBackend, ReverseBatcher, app
+
+
+class CountingBackend(GeocoderBackend):
+    """A backend limited to one request per second, counting the requests it gets"""
+
+    name = 'counting'
+
+    def __init__(self):
+        super().__init__(rate=1.0, burst=10, max_retries=0, concurrency=4)
+        self.requests = []
+
+    def _reverse(self, lat, lon):
+        self.requests.append((lat, lon))
+        return {'address': {'house_number': '1', 'road': 'Main Street'}, 'display_name': 'x'}
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = CountingBackend()
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite3'))
+    cache.put(cache.make_key(40.0, -74.0), {'address': {'road': 'Cached Road'}, 'display_name': 'x'})
+    monkeypatch.setattr(cluster_app, 'get_reverse_batcher', lambda: ReverseBatcher(backend, timeout=5))
+    monkeypatch.setattr(cluster_app, 'get_geocode_cache', lambda: cache)
+    monkeypatch.setitem(app.config, 'API_LOOKUP_TIMEOUT', 3)
+    monkeypatch.setitem(app.config, 'API_MAX_LOOKUPS', 0)
+    return backend
+
+
+def points(count):
+    return [[40.0, -74.0]] + [[41.0 + i / 100, -74.0] for i in range(count)]
+
+
+def test_requests_within_the_rate_budget_are_looked_up(backend):
+    response = app.test_client().post('/api/reverse', json=points(3))
+    
+    assert response.status_code == 200
+    assert len(backend.requests) == 3
+    assert response.get_json()['lookups'] == 3
+
+
+def test_requests_needing_more_lookups_than_the_rate_allows_are_refused(backend):
+    response = app.test_client().post('/api/reverse', json=points(4))
+    
+    assert response.status_code == 413
+    assert '/upload' in response.get_json()['error']
+    assert backend.requests == []
+
+
+def test_the_limit_can_be_set_explicitly(backend, monkeypatch):
+    monkeypatch.setitem(app.config, 'API_MAX_LOOKUPS', 1)
+    assert app.test_client().post('/api/reverse', json=points(2)).status_code == 413
+    assert app.test_client().post('/api/reverse', json=points(1)).status_code == 200
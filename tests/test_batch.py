@@ -0,0 +1,60 @@
+import io
+import re
+
+import pandas as pd
+import pytest
+
+import cluster_app
+from cluster_app import OfflineBackend, estimate_rows, run_batch
+
+
+def clusters(rows):
+    return pd.DataFrame({
+        'Cluster_ID': range(rows),
+        'Center_Latitude': [40.0 + i / 10000 for i in range(rows)],
+        'Center_Longitude': [-74.0] * rows,
+        'City': ['Springfield, "Old Town"'] * rows,
+    })
+
+
+def test_csv_rows_are_estimated_from_a_sample(tmp_path):
+    path = tmp_path / 'clusters.csv'
+    clusters(20000).to_csv(path, index=False)
+    assert estimate_rows(str(path), '.csv') == pytest.approx(20000, rel=0.05)
+    assert estimate_rows(str(path), '.csv', sample_bytes=1 << 30) == 20000
+
+
+def test_parquet_and_xlsx_rows_come_from_the_file(tmp_path):
+    clusters(1234).to_parquet(tmp_path / 'clusters.parquet', index=False)
+    clusters(56).to_excel(tmp_path / 'clusters.xlsx', index=False)
+    assert estimate_rows(str(tmp_path / 'clusters.parquet'), '.parquet') == 1234
+    assert estimate_rows(str(tmp_path / 'clusters.xlsx'), '.xlsx') == 56
+    assert estimate_rows(str(tmp_path / 'missing.parquet'), '.parquet') is None
+    assert estimate_rows(str(tmp_path / 'clusters.xls'), '.xls') is None
+
+
+class SlowIndex:
+    """Answers every point with the same street, taking a second per batch"""
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def query(self, lats, lons):
+        self.clock.now += 1
+        return [{'address': {'house_number': '1', 'road': 'Main Street'}, 'display_name': 'x'}] * len(lats)
+
+
+def test_progress_follows_the_rows_geocoded(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cluster_app, 'get_geocoder_backend', lambda: OfflineBackend(SlowIndex(clock)))
+    monkeypatch.setattr(cluster_app, 'get_nearby_index', lambda: None)
+    monkeypatch.setattr(cluster_app, 'get_admin_areas', lambda: None)
+    path = tmp_path / 'clusters.csv'
+    clusters(2000).to_csv(path, index=False)
+    progress = io.StringIO()
+    
+    stats = run_batch(str(path), str(tmp_path / 'out.csv'), chunk_rows=500, progress_stream=progress)
+    
+    assert stats['complete_address'] == 2000
+    # The whole file is parsed ahead of geocoding, but progress only counts geocoded rows
+    done = [int(percent) for percent in re.findall(r'(\d+)% done', progress.getvalue())]
+    assert done[0] < 40 and done == sorted(done) and done[-1] == 100
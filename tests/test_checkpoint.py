@@ -0,0 +1,115 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import cluster_app
+from cluster_app import JobCheckpoint, resume_checkpointed_jobs
+
+
+def upload(rows, start=0):
+    return pd.DataFrame({
+        'Cluster_ID': range(start, start + rows),
+        'Center_Latitude': [40.0 + i / 1000 for i in range(start, start + rows)],
+        'Center_Longitude': [-74.0] * rows,
+    })
+
+
+def spool(checkpoint, chunks, every):
+    checkpoint.spool_input(iter(chunks), every, timings={'parse': 1.5})
+    with checkpoint.cond:
+        checkpoint.cond.wait_for(lambda: not checkpoint.spooling, timeout=5)
+
+
+def test_input_is_saved_in_pieces_and_read_back_in_order(tmp_path):
+    checkpoint = JobCheckpoint.create(str(tmp_path), 'job', rows_to_process=None, priority=1)
+    spool(checkpoint, [upload(5), upload(3, start=5)], every=2)
+    
+    assert sorted(name for name in os.listdir(checkpoint.path) if name.startswith('input')) == [
+        f'input-{i:05d}.pkl' for i in range(5)
+    ]
+    meta = checkpoint.read_meta()
+    assert meta['input_complete'] and meta['parse_seconds'] == 1.5 and meta['priority'] == 1
+    # Read through a fresh handle, as a restarted server would
+    chunks = list(JobCheckpoint(str(tmp_path), 'job').input_chunks())
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1, 2, 1]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), upload(8))
+
+
+def test_a_failed_upload_is_reported_to_the_reader(tmp_path):
+    def chunks():
+        yield upload(2)
+        raise ValueError('Error tokenizing data')
+    
+    checkpoint = JobCheckpoint.create(str(tmp_path), 'job')
+    spool(checkpoint, chunks(), every=10)
+    
+    reader = JobCheckpoint(str(tmp_path), 'job').input_chunks()
+    assert len(next(reader)) == 2
+    with pytest.raises(RuntimeError, match='Error tokenizing data'):
+        next(reader)
+
+
+def test_results_are_kept_until_the_job_finishes(tmp_path):
+    checkpoint = JobCheckpoint.create(str(tmp_path), 'job')
+    checkpoint.save_result(0, upload(2))
+    assert checkpoint.has_result(0) and not checkpoint.has_result(1)
+    pd.testing.assert_frame_equal(checkpoint.load_result(0), upload(2))
+    
+    # A worker that lost its lease leaves the checkpoint to the new owner
+    lease_lost = threading.Event()
+    lease_lost.set()
+    JobCheckpoint(str(tmp_path), 'job', lease_lost=lease_lost).finish()
+    assert os.path.isdir(checkpoint.path)
+    
+    checkpoint.finish()
+    assert not os.path.exists(checkpoint.path)
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.submitted = {}
+
+    def submit(self, session_id, func, args=(), kwargs=None, priority=1, on_cancel=None):
+        self.submitted[session_id] = (func, args, kwargs, priority)
+
+
+@pytest.fixture
+def restarted(tmp_path, monkeypatch):
+    """An app with CHECKPOINT_DIR at tmp_path, no jobs in memory and a scheduler that only records jobs"""
+    scheduler = FakeScheduler()
+    monkeypatch.setitem(cluster_app.app.config, 'CHECKPOINT_DIR', str(tmp_path))
+    monkeypatch.setitem(cluster_app.app.config, 'JOB_STORE_PATH', '')
+    monkeypatch.setattr(cluster_app, 'processing_status', {})
+    monkeypatch.setattr(cluster_app, 'get_job_scheduler', lambda: scheduler)
+    return scheduler
+
+
+def test_unfinished_jobs_are_requeued_after_a_restart(tmp_path, restarted):
+    done = JobCheckpoint.create(str(tmp_path), 'done', rows_to_process=3, priority=0, history={'dataset': 'd'})
+    spool(done, [upload(3)], every=2)
+    done.save_result(0, upload(2))
+    JobCheckpoint.create(str(tmp_path), 'uploading')
+    os.makedirs(tmp_path / 'corrupt')
+    
+    assert resume_checkpointed_jobs() == ['done']
+    
+    func, args, kwargs, priority = restarted.submitted['done']
+    assert func is cluster_app.process_addresses and priority == 0
+    assert [len(chunk) for chunk in args[0]] == [2, 1]
+    assert args[1:] == ('done', 3)
+    assert kwargs['checkpoint'].has_result(0) and not kwargs['checkpoint'].has_result(1)
+    status = cluster_app.processing_status
+    assert status['done']['status'] == 'queued' and status['done']['resumed'] and status['done']['dataset'] == 'd'
+    
+    # An upload cut off mid-parse can't be resumed; its checkpoint goes
+    assert status['uploading']['status'] == 'error'
+    assert sorted(os.listdir(tmp_path)) == ['done']
+
+
+def test_jobs_already_known_are_not_requeued(tmp_path, restarted):
+    spool(JobCheckpoint.create(str(tmp_path), 'running'), [upload(1)], every=1)
+    cluster_app.processing_status['running'] = {'status': 'processing'}
+    assert resume_checkpointed_jobs() == []
+    assert not restarted.submitted
@@ -0,0 +1,46 @@
+import hashlib
+
+import pytest
+
+from cluster_app import ChunkedUpload
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def upload(tmp_path):
+    return ChunkedUpload.create(str(tmp_path), 'clusters.csv', 10, 4, {'mode': 'full'})
+
+
+def test_parts_are_written_at_their_offsets_in_any_order(upload):
+    data = b'0123456789'
+    for index in (2, 0, 1):
+        part = data[index * 4:index * 4 + 4]
+        upload.write_part(index, part, sha256(part))
+    
+    assert upload.status()['missing'] == []
+    with open(upload._file('data'), 'rb') as f:
+        assert f.read() == data
+
+
+def test_part_with_wrong_checksum_is_rejected_and_not_marked(upload):
+    with pytest.raises(ValueError, match='checksum'):
+        upload.write_part(0, b'0123', sha256(b'xxxx'))
+    
+    assert 0 in upload.status()['missing']
+    # The same part sent again intact is accepted
+    upload.write_part(0, b'0123', sha256(b'0123'))
+    assert 0 not in upload.status()['missing']
+
+
+def test_checksum_is_case_and_whitespace_insensitive(upload):
+    upload.write_part(2, b'89', ' ' + sha256(b'89').upper() + '\n')
+    assert 2 not in upload.status()['missing']
+
+
+@pytest.mark.parametrize('index, data', [(3, b'x'), (-1, b'0123'), (0, b'012'), (2, b'8')])
+def test_out_of_range_or_wrong_length_parts_are_rejected(upload, index, data):
+    with pytest.raises(ValueError):
+        upload.write_part(index, data, sha256(data))
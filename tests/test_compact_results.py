@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cluster_app import (
+    ADDRESS_TAIL, ChunkGeocoder, OfflineBackend, compact_results, concat_results, expand_results
+)
+
+PAYLOADS = {
+    # Complete street address
+    (40.1, -74.1): {'address': {'house_number': '12', 'road': 'Main Street', 'city': 'Springfield',
+                                'state': 'NY', 'postcode': '10001'}, 'display_name': 'x'},
+    # Street without a house number, and a street name that contains spaces
+    (40.2, -74.2): {'address': {'road': 'Old Mill Road', 'state': 'NY'}, 'display_name': 'x'},
+    # Area only
+    (40.3, -74.3): {'address': {'city': 'Riverside'}, 'display_name': 'Riverside, NY'},
+    # Complete address without any trailing parts
+    (40.4, -74.4): {'address': {'house_number': '7B', 'road': 'Elm Lane'}, 'display_name': 'x'},
+}
+
+
+class FakeIndex:
+    def query(self, lats, lons):
+        return [PAYLOADS.get((lat, lon)) for lat, lon in zip(lats, lons)]
+
+
+def geocoded_chunk(rows):
+    geocoder = ChunkGeocoder(OfflineBackend(FakeIndex()), None, precision=6)
+    geocoder.failed.add((40.6, -74.6))
+    geocoder.nearby_keys.add((40.4, -74.4))
+    return geocoder.process(pd.DataFrame(rows))
+
+
+@pytest.fixture
+def chunk():
+    return geocoded_chunk({
+        'Cluster_ID': np.arange(8),
+        'Center_Latitude': [40.1, 40.2, 40.3, 40.4, 40.5, 40.6, None, 40.1],
+        'Center_Longitude': [-74.1, -74.2, -74.3, -74.4, -74.5, -74.6, -74.7, -74.1],
+        'City': ['A', 'B', None, 'C', 'Fairview', 'D', 'E', 'A'],
+    })
+
+
+def test_every_quality_is_covered(chunk):
+    assert set(chunk['Address_Quality']) == {
+        'Complete Street Address', 'Street Only', 'Area Only', 'Nearby Street Address', 'Coordinates Only', 'Error'
+    }
+
+
+def test_round_trip_gives_back_the_same_columns(chunk):
+    compact = compact_results(chunk)
+    
+    assert 'Physical_Address' not in compact.columns
+    assert compact['Address_Quality'].dtype == 'category'
+    pd.testing.assert_frame_equal(expand_results(compact).astype(object), chunk.astype(object))
+
+
+def test_compacting_twice_changes_nothing(chunk):
+    compact = compact_results(chunk)
+    assert compact_results(compact) is compact
+    assert expand_results(chunk) is chunk
+
+
+def test_coordinate_addresses_are_rebuilt_with_the_city(chunk):
+    expanded = expand_results(compact_results(chunk))
+    
+    assert compact_results(chunk)[ADDRESS_TAIL].isna().sum() == 3
+    assert expanded.loc[4, 'Physical_Address'] == '40.500000, -74.500000, Fairview'
+    assert expanded.loc[5, 'Physical_Address'] == '40.6, -74.6'
+    assert expanded.loc[6, 'Physical_Address'] == 'Invalid coordinates'
+
+
+def test_concatenated_chunks_expand_like_the_originals(chunk):
+    other = geocoded_chunk({
+        'Cluster_ID': [100, 101],
+        'Center_Latitude': [40.3, 40.9],
+        'Center_Longitude': [-74.3, -74.9],
+        'City': ['Z', None],
+    })
+    combined = concat_results([compact_results(chunk), compact_results(other)])
+    
+    expected = pd.concat([chunk, other], ignore_index=True)
+    pd.testing.assert_frame_equal(expand_results(combined).astype(object), expected.astype(object))
@@ -0,0 +1,130 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import cluster_app
+from cluster_app import DatasetHistory, compact_results, start_upload_job
+
+
+def clusters(ids, moved=()):
+    return pd.DataFrame({
+        'Cluster_ID': ids,
+        'Center_Latitude': [40.0 + i / 1000 + (0.5 if i in moved else 0) for i in ids],
+        'Center_Longitude': [-74.0] * len(ids),
+        'City': ['Springfield'] * len(ids),
+    })
+
+
+def compute_into(computed, quality='Complete Street Address'):
+    def compute(chunk):
+        computed.extend(chunk['Cluster_ID'])
+        result = chunk.copy()
+        result['Street_Name'] = [f'{i} Main Street' for i in chunk['Cluster_ID']]
+        result['Physical_Address'] = result['Street_Name'] + ', Springfield'
+        result['Address_Quality'] = quality
+        return result
+    return compute
+
+
+def run(root, chunks, computed, quality='Complete Street Address', **kwargs):
+    history = DatasetHistory(str(root), 'clusters', **kwargs)
+    results = [history.process(chunk, compute_into(computed, quality)) for chunk in chunks]
+    history.save(compact_results(pd.concat(results, ignore_index=True)))
+    return history, pd.concat(results, ignore_index=True)
+
+
+def test_only_new_and_changed_rows_are_recomputed(tmp_path):
+    first = []
+    run(tmp_path, [clusters([0, 1, 2]), clusters([3])], first)
+    assert first == [0, 1, 2, 3]
+    
+    second = []
+    history, result = run(tmp_path, [clusters([3, 1, 2], moved=[2]), clusters([4])], second)
+    assert second == [2, 4]
+    assert history.reused == 2 and history.recomputed == 2
+    assert result['Physical_Address'].tolist() == [f'{i} Main Street, Springfield' for i in (3, 1, 2, 4)]
+    
+    # The snapshot is of this run: the old position of row 2 is gone
+    third = []
+    run(tmp_path, [clusters([2])], third)
+    assert third == [2]
+
+
+def test_rows_without_an_address_are_always_recomputed(tmp_path):
+    run(tmp_path, [clusters([0, 1])], [], quality='Coordinates Only')
+    computed = []
+    run(tmp_path, [clusters([0, 1])], computed)
+    assert computed == [0, 1]
+
+
+def test_rows_older_than_max_age_are_recomputed(tmp_path, clock):
+    run(tmp_path, [clusters([0, 1])], [], max_age=60)
+    clock.now += 50
+    computed = []
+    run(tmp_path, [clusters([0, 1, 2])], computed, max_age=60)
+    assert computed == [2]
+    
+    # Reused rows keep the time they were looked up, not the time of the last run
+    clock.now += 20
+    computed = []
+    history, _ = run(tmp_path, [clusters([0, 1, 2])], computed, max_age=60)
+    assert computed == [0, 1]
+    assert history.reused == 1
+
+
+def test_snapshots_without_row_times_are_dated_by_the_file(tmp_path, clock):
+    run(tmp_path, [clusters([0, 1])], [])
+    path = DatasetHistory.snapshot_path(str(tmp_path), 'clusters')
+    pd.read_pickle(path).drop(columns='resolved_at').to_pickle(path)
+    os.utime(path, (clock.now - 120, clock.now - 120))
+    
+    computed = []
+    run(tmp_path, [clusters([0, 1])], computed, max_age=60)
+    assert computed == [0, 1]
+
+
+def test_checkpointed_chunks_keep_their_place_in_the_snapshot(tmp_path):
+    run(tmp_path, [clusters([0, 1])], [])
+    history = DatasetHistory(str(tmp_path), 'clusters')
+    history.record(clusters([0]))
+    computed = []
+    results = [compute_into([])(clusters([0])), history.process(clusters([1, 2]), compute_into(computed))]
+    history.save(compact_results(pd.concat(results, ignore_index=True)))
+    assert computed == [2]
+    
+    computed = []
+    run(tmp_path, [clusters([2, 1, 0])], computed)
+    assert computed == []
+
+
+class FakeScheduler:
+    def submit(self, session_id, func, args=(), kwargs=None, priority=1, on_cancel=None):
+        on_cancel()
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    """start_upload_job with DATASET_DIR at tmp_path and jobs that are queued but never run"""
+    monkeypatch.setitem(cluster_app.app.config, 'DATASET_DIR', str(tmp_path))
+    monkeypatch.setitem(cluster_app.app.config, 'JOB_STORE_PATH', '')
+    monkeypatch.setattr(cluster_app, 'processing_status', {})
+    monkeypatch.setattr(cluster_app, 'get_job_scheduler', FakeScheduler)
+    
+    def upload(**options):
+        stream = io.BytesIO(clusters([0, 1]).to_csv(index=False).encode())
+        body, status = start_upload_job(stream, 'clusters.csv', {'mode': 'full', **options})
+        assert status == 200
+        return body, cluster_app.processing_status[body['session_id']]
+    return upload
+
+
+def test_history_is_only_kept_for_a_named_dataset(tmp_path, uploads):
+    body, status = uploads()
+    assert body['dataset'] is None and 'dataset' not in status
+    
+    run(tmp_path, [clusters([0, 1])], [])
+    body, status = uploads(dataset='clusters', id_column='Cluster_ID')
+    assert body['dataset'] == 'clusters' and body['incremental']
+    assert status['dataset'] == 'clusters' and status['id_column'] == 'Cluster_ID'
@@ -0,0 +1,68 @@
+from cluster_app import CACHE_MISS, GeocodeCache
+
+
+def open_cache(tmp_path, **kwargs):
+    return GeocodeCache(str(tmp_path / 'cache.sqlite3'), **kwargs)
+
+
+def payload(name):
+    return {'address': {'road': name}, 'display_name': name}
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = open_cache(tmp_path, ttl_seconds=60)
+    cache.put('a', payload('A'))
+    cache.put('b', payload('B'))
+    cache.put('none', None)
+    
+    clock.now += 59
+    assert cache.get('a') == payload('A')
+    assert cache.get('none') is None
+    assert cache.get('missing') is CACHE_MISS
+    
+    clock.now += 2
+    assert cache.get('a') is CACHE_MISS
+    assert cache.get_many(['b', 'none']) == {}
+    assert cache.size == 0
+    assert cache.conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = open_cache(tmp_path, max_entries=3)
+    for name in 'abc':
+        clock.now += 1
+        cache.put(name, payload(name))
+    clock.now += 1
+    cache.get('a')
+    clock.now += 1
+    cache.get_many(['b'])
+    
+    clock.now += 1
+    cache.put('d', payload('d'))
+    assert cache.size == 3
+    assert cache.get('c') is CACHE_MISS
+    assert set(cache.get_many(['a', 'b', 'd'])) == {'a', 'b', 'd'}
+    
+    clock.now += 1
+    cache.put_many([('e', payload('e'), None), ('f', payload('f'), None)])
+    assert cache.size == 3
+    assert set(cache.get_many(list('abdef'))) == {'d', 'e', 'f'}
+
+
+def test_size_counts_each_key_once(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.put('a', payload('A'))
+    cache.put('a', payload('A2'))
+    assert cache.put_many([('a', payload('old'), clock.now - 10), ('b', payload('B'), None)]) == 1
+    assert cache.size == 2
+    assert cache.get('a') == payload('A2')
+    
+    assert cache.put_many([('b', payload('B2'), clock.now + 1), ('c', payload('C'), None)], replace=False) == 1
+    assert cache.get('b') == payload('B')
+    assert open_cache(tmp_path).size == 3
+
+
+def test_export_skips_expired_entries(tmp_path, clock):
+    cache = open_cache(tmp_path, ttl_seconds=60)
+    cache.put_many([('old', payload('old'), clock.now - 120), ('new', payload('new'), None)])
+    assert [key for key, _, _ in cache.iter_entries()] == ['new']
@@ -0,0 +1,105 @@
+import pytest
+
+from cluster_app import JobStore
+
+
+@pytest.fixture
+def stores(tmp_path, clock):
+    """Two workers sharing one job store file"""
+    path = str(tmp_path / 'jobs.sqlite3')
+    return JobStore(path, 'worker-a', lease_seconds=30), JobStore(path, 'worker-b', lease_seconds=30)
+
+
+def queued(message='waiting'):
+    return {'status': 'queued', 'message': message}
+
+
+def test_jobs_are_claimed_once_in_priority_order(stores):
+    a, b = stores
+    a.add('low', queued(), priority=2)
+    a.add('first', queued(), priority=1, rows_to_process=10)
+    b.add('second', queued(), priority=1)
+    assert a.position('second') == 2 and b.position('low') == 3
+    
+    assert a.claim() == ('first', 10)
+    assert b.claim() == ('second', None)
+    assert b.claim() == ('low', None)
+    assert a.claim() is None
+    assert a.queued() == 0 and a.position('first') is None
+    assert a.stats() == {'running': 3}
+
+
+def test_a_lapsed_lease_passes_the_job_to_another_worker(stores, clock):
+    a, b = stores
+    a.add('job', queued())
+    a.claim()
+    
+    clock.now += 20
+    assert a.renew('job') is None
+    clock.now += 20
+    assert b.claim() is None  # renewed 20 s ago, so still a's
+    
+    clock.now += 11
+    assert b.claim() == ('job', None)
+    assert a.renew('job') == 'lost'
+    
+    # The old worker's writes no longer land
+    a.save_status('job', {'status': 'completed'})
+    b.save_status('job', {'status': 'processing', 'processed': 5})
+    assert a.status('job') == {'status': 'processing', 'processed': 5}
+
+
+def test_status_writes_are_throttled_except_final_ones(stores, clock):
+    a, b = stores
+    a.add('job', queued())
+    a.claim()
+    
+    a.save_status('job', {'status': 'processing', 'processed': 1}, min_interval=5)
+    clock.now += 1
+    a.save_status('job', {'status': 'processing', 'processed': 2}, min_interval=5)
+    assert b.status('job')['processed'] == 1
+    
+    a.save_status('job', {'status': 'completed'}, min_interval=5)
+    assert b.status('job') == {'status': 'completed'}
+    assert b.stats() == {'completed': 1}
+
+
+def test_cancelling_a_queued_job_ends_it_at_once(stores):
+    a, b = stores
+    a.add('job', queued('3 ahead'))
+    
+    assert b.request_cancel('job') == 'queued'
+    assert a.status('job')['status'] == 'cancelled' and a.status('job')['message'] == '3 ahead'
+    assert a.claim() is None
+    assert b.request_cancel('job') is None
+    assert b.request_cancel('unknown') is None
+
+
+def test_cancelling_a_running_job_reaches_its_worker_on_renewal(stores):
+    a, b = stores
+    a.add('job', queued())
+    a.claim()
+    
+    assert b.request_cancel('job') == 'running'
+    assert a.renew('job') == 'cancel'
+    a.save_status('job', {'status': 'cancelled'})
+    assert b.request_cancel('job') is None
+
+
+def test_finished_jobs_expire_with_their_result_files(stores, clock, tmp_path):
+    a, b = stores
+    result = tmp_path / 'job.parquet'
+    result.write_bytes(b'x')
+    for session_id in ('old', 'new'):
+        a.add(session_id, queued())
+        a.claim()
+    a.set_result('old', str(result))
+    a.save_status('old', {'status': 'completed'})
+    assert b.result_path('old') == str(result)
+    
+    clock.now += 60
+    a.save_status('new', {'status': 'completed'})
+    b.expire(clock.now - 30)
+    
+    assert a.status('old') is None and not result.exists()
+    assert a.status('new') == {'status': 'completed'}
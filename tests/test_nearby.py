@@ -0,0 +1,155 @@
+import math
+
+import numpy as np
+import pytest
+
+from cluster_app import EARTH_RADIUS_M, ChunkGeocoder, GeocodeCache, NearbyAddressIndex, hilbert_order, unit_vectors
+
+
+def offset(lat, lon, meters, bearing):
+    """The point ``meters`` from (lat, lon) towards ``bearing`` degrees, on the sphere"""
+    d = meters / EARTH_RADIUS_M
+    lat1, lon1, b = map(math.radians, (lat, lon, bearing))
+    lat2 = math.asin(math.sin(lat1) * math.cos(d) + math.cos(lat1) * math.sin(d) * math.cos(b))
+    lon2 = lon1 + math.atan2(math.sin(b) * math.sin(d) * math.cos(lat1), math.cos(d) - math.sin(lat1) * math.sin(lat2))
+    return math.degrees(lat2), math.degrees(lon2)
+
+
+def key(lat, lon):
+    return f"{lat:.6f},{lon:.6f}"
+
+
+def random_points(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return list(zip(rng.uniform(-70, 70, count).round(6), rng.uniform(-180, 180, count).round(6)))
+
+
+def test_points_within_the_radius_are_found_across_cell_borders():
+    index = NearbyAddressIndex(15)
+    centres = random_points(500)
+    index.add([key(*centre) for centre in centres])
+    
+    rng = np.random.default_rng(1)
+    queries = [offset(*centre, 14, rng.uniform(0, 360)) for centre in centres]
+    found = index.query([q[0] for q in queries], [q[1] for q in queries])
+    
+    assert found == [key(*centre) for centre in centres]
+    # Most of these pairs straddle a cell border, so the neighbouring cells were searched
+    query_cells = index._cells(unit_vectors([q[0] for q in queries], [q[1] for q in queries]))
+    straddling = sum(index.points[key(*centre)] != cell for centre, cell in zip(centres, query_cells))
+    assert straddling > len(centres) // 2
+
+
+def test_points_beyond_the_radius_are_not_found():
+    index = NearbyAddressIndex(15)
+    centres = random_points(500)
+    index.add([key(*centre) for centre in centres])
+    
+    rng = np.random.default_rng(2)
+    queries = [offset(*centre, 16, rng.uniform(0, 360)) for centre in centres]
+    assert index.query([q[0] for q in queries], [q[1] for q in queries]) == [None] * len(centres)
+
+
+def test_the_nearest_of_several_points_is_returned():
+    index = NearbyAddressIndex(15)
+    near = offset(40.0, -74.0, 5, 90)
+    far = offset(40.0, -74.0, 10, 270)
+    index.add([key(*far), key(*near)])
+    assert index.query([40.0], [-74.0]) == [key(*near)]
+
+
+def test_oldest_points_are_dropped_past_max_points():
+    index = NearbyAddressIndex(15, max_points=2)
+    index.add([key(1, 1), key(2, 2), key(3, 3)])
+    
+    assert list(index.points) == [key(2, 2), key(3, 3)]
+    assert index.query([1, 3], [1, 3]) == [None, key(3, 3)]
+    index.discard([key(3, 3)])
+    assert index.query([3], [3]) == [None]
+    assert sum(map(len, index.cells.values())) == 1
+
+
+def test_leaders_are_at_least_the_radius_apart():
+    index = NearbyAddressIndex(15)
+    points = [(40.0, -74.0), offset(40.0, -74.0, 10, 0), offset(40.0, -74.0, 20, 0), offset(40.0, -74.0, 25, 0)]
+    assert index.leaders([p[0] for p in points], [p[1] for p in points]) == [True, False, True, False]
+
+
+def test_hilbert_order_walks_a_grid_one_step_at_a_time():
+    bits = 4
+    side = 1 << bits
+    xs, ys = np.meshgrid(np.arange(side), np.arange(side))
+    lons = xs.ravel() / (side - 1) * 360 - 180
+    lats = ys.ravel() / (side - 1) * 180 - 90
+    
+    order = hilbert_order(lats, lons, bits=bits)
+    
+    steps = np.abs(np.diff(xs.ravel()[order])) + np.abs(np.diff(ys.ravel()[order]))
+    assert sorted(order) == list(range(side * side))
+    assert (steps == 1).all()
+
+
+class FakeBackend:
+    """Looks points up through the ``lookup`` hook instead of a network"""
+
+    name = 'fake'
+    uses_cache = True
+    concurrency = 4
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GeocodeCache(str(tmp_path / 'cache.sqlite3'))
+
+
+def make_geocoder(cache, index, looked_up):
+    def lookup(backend, points, on_result, client=None, cancel_event=None):
+        for lat, lon in points:
+            looked_up.append((lat, lon))
+            on_result((lat, lon), {
+                'address': {'house_number': str(len(looked_up)), 'road': 'Main Street'}, 'display_name': 'x'
+            }, None)
+    return ChunkGeocoder(FakeBackend(), cache, nearby=index, lookup=lookup)
+
+
+def test_clustered_misses_are_looked_up_once_per_cluster(cache):
+    index = NearbyAddressIndex(15)
+    looked_up = []
+    geocoder = make_geocoder(cache, index, looked_up)
+    centres = random_points(20, seed=3)
+    keys = [tuple(round(v, 6) for v in offset(*centre, 5, bearing)) for centre in centres for bearing in (0, 120, 240)]
+    
+    geocoder.resolve(keys)
+    
+    assert len(looked_up) == len(centres)
+    assert len(geocoder.nearby_keys) == len(keys) - len(centres)
+    assert geocoder.nearby_answers == len(keys) - len(centres)
+    assert geocoder.pending == 0 and geocoder.lookups_done == len(keys)
+
+
+def test_points_moved_a_few_metres_reuse_the_cached_address(cache):
+    index = NearbyAddressIndex(15)
+    looked_up = []
+    first = make_geocoder(cache, index, looked_up)
+    first.resolve([(40.0, -74.0)])
+    
+    moved = tuple(round(v, 6) for v in offset(40.0, -74.0, 8, 45))
+    second = make_geocoder(cache, index, looked_up)
+    second.resolve([moved])
+    
+    assert looked_up == [(40.0, -74.0)]
+    assert second.payloads[moved] == first.payloads[(40.0, -74.0)]
+    assert moved in second.nearby_keys
+
+
+def test_points_near_an_incomplete_address_are_looked_up(cache):
+    index = NearbyAddressIndex(15)
+    cache.put(key(40.0, -74.0), {'address': {'road': 'Main Street'}, 'display_name': 'x'})
+    looked_up = []
+    geocoder = make_geocoder(cache, index, looked_up)
+    
+    geocoder.resolve([(40.0, -74.0)])  # a cache hit, but only a street
+    geocoder.resolve([tuple(round(v, 6) for v in offset(40.0, -74.0, 5, 0))])
+    
+    assert len(looked_up) == 1
+    assert not geocoder.nearby_keys
@@ -0,0 +1,76 @@
+import os
+
+import pandas as pd
+import pytest
+
+from cluster_app import ResultStore
+
+
+def result(rows, label='x'):
+    return pd.DataFrame({
+        'Cluster_ID': range(rows),
+        'Physical_Address': [f'{i} {label} Street' for i in range(rows)],
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    size = int(result(100).memory_usage(deep=True).sum())
+    return ResultStore(str(tmp_path / 'spill'), max_memory_bytes=int(size * 2.5), ttl_seconds=60)
+
+
+def test_results_past_the_memory_ceiling_are_spilled_oldest_first(store):
+    for name in 'abcd':
+        store[name] = result(100, name)
+    
+    stats = store.stats()
+    assert stats['results_in_memory'] == 2 and stats['results_on_disk'] == 2
+    assert stats['spilled'] == 2 and stats['memory_bytes'] <= stats['memory_limit_bytes']
+    assert store.entries['a']['df'] is None and store.entries['d']['df'] is not None
+    assert os.path.exists(store.entries['a']['path'])
+    
+    pd.testing.assert_frame_equal(store['a'], result(100, 'a'))
+    assert store.stats()['loaded'] == 1
+    # Read back for the caller only; it stays on disk
+    assert store.entries['a']['df'] is None
+
+
+def test_missing_results_read_as_none(store):
+    store['a'] = result(10)
+    assert store.get('b') is None
+    with pytest.raises(KeyError):
+        store['b']
+    
+    # A spilled file removed by another worker reads as gone, not as an error
+    path = store.persist('a')
+    store.entries['a']['df'] = None
+    os.remove(path)
+    assert store.get('a') is None
+
+
+def test_replacing_and_deleting_a_result_frees_memory_and_files(store):
+    store['a'] = result(100)
+    path = store.persist('a')
+    store['a'] = result(10)
+    assert not os.path.exists(path)
+    assert store.memory_bytes == store.entries['a']['bytes']
+    
+    del store['a']
+    assert 'a' not in store
+    assert store.memory_bytes == 0
+
+
+def test_results_expire_after_the_ttl(store, clock):
+    for name in 'abcd':
+        store[name] = result(100, name)
+    spilled = store.entries['a']['path']
+    
+    clock.now += 30
+    store['e'] = result(10)
+    clock.now += 31
+    store.expire()
+    
+    assert list(store.entries) == ['e']
+    assert store.stats()['expired'] == 4
+    assert not os.path.exists(spilled)
+    assert store.get('a') is None
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cluster_app import GeocoderBackend, GeopyError, lookup_concurrently
+
+
+class SlowBackend(GeocoderBackend):
+    """Answers after ``delay`` seconds, counting the requests it gets"""
+
+    name = 'slow'
+
+    def __init__(self, delay=0.2, error=None, **limits):
+        super().__init__(concurrency=8, max_retries=0, **limits)
+        self.delay = delay
+        self.error = error
+        self.requests = []
+        self.requests_lock = threading.Lock()
+
+    def _reverse(self, lat, lon):
+        with self.requests_lock:
+            self.requests.append((lat, lon))
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {'address': {}, 'display_name': f'{lat},{lon}'}
+
+
+def run_in_threads(backend, point_lists):
+    results = []
+    lock = threading.Lock()
+    
+    def on_result(point, payload, error):
+        with lock:
+            results.append((point, payload, error))
+    
+    threads = [
+        threading.Thread(target=lookup_concurrently, args=(backend, points, on_result, f'job{i}'))
+        for i, points in enumerate(point_lists)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_jobs_share_one_request_per_point():
+    backend = SlowBackend()
+    points = [(40.0 + i / 100, -74.0) for i in range(5)]
+    
+    results = run_in_threads(backend, [points] * 4)
+    
+    assert sorted(backend.requests) == sorted(points)
+    assert len(results) == 20
+    assert all(error is None and payload['display_name'] == f'{p[0]},{p[1]}' for p, payload, error in results)
+    assert not backend.in_flight
+
+
+def test_points_under_the_same_cache_key_share_a_request():
+    backend = SlowBackend()
+    run_in_threads(backend, [[(40.1234561, -74.0)], [(40.1234564, -74.0)]])
+    assert len(backend.requests) == 1
+
+
+def test_waiters_get_the_error_of_the_shared_lookup():
+    backend = SlowBackend(error=GeopyError('down'))
+    
+    results = run_in_threads(backend, [[(1.0, 2.0)]] * 3)
+    
+    assert len(backend.requests) == 1
+    assert [type(error) for _, _, error in results] == [GeopyError] * 3
+
+
+def test_cancelling_a_waiter_leaves_the_shared_lookup_running():
+    backend = SlowBackend()
+    
+    async def main():
+        async with backend.async_client() as lookup:
+            leader = asyncio.ensure_future(backend.areverse(lookup, 1.0, 2.0))
+            await asyncio.sleep(0.05)
+            cancelled = asyncio.ensure_future(backend.areverse(lookup, 1.0, 2.0))
+            other = asyncio.ensure_future(backend.areverse(lookup, 1.0, 2.0))
+            await asyncio.sleep(0.05)
+            cancelled.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            return await leader, await other
+    
+    leader_payload, other_payload = asyncio.run(main())
+    
+    assert leader_payload == other_payload == {'address': {}, 'display_name': '1.0,2.0'}
+    assert len(backend.requests) == 1
+    assert not backend.in_flight
+
+
+def test_cancelling_the_lookup_gives_waiters_a_lookup_error():
+    backend = SlowBackend()
+    
+    async def main():
+        async with backend.async_client() as lookup:
+            leader = asyncio.ensure_future(backend.areverse(lookup, 1.0, 2.0))
+            await asyncio.sleep(0.05)
+            waiter = asyncio.ensure_future(backend.areverse(lookup, 1.0, 2.0))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            with pytest.raises(GeopyError):
+                await waiter
+    
+    asyncio.run(main())
+    assert not backend.in_flight
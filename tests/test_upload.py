@@ -0,0 +1,28 @@
+import io
+
+import pytest
+
+from cluster_app import UploadParseError, app, read_upload_chunks
+
+
+@pytest.mark.parametrize('filename, data', [
+    ('clusters.xlsx', b'not a zip file'),
+    ('clusters.xls', b'not a workbook'),
+    ('clusters.parquet', b'PAR1 cut short'),
+    ('clusters.csv', b'Center_Latitude,Center_Longitude\n"40.1,-74.1\n'),
+])
+def test_corrupt_uploads_are_rejected_with_a_clear_message(filename, data):
+    response = app.test_client().post('/upload', data={'file': (io.BytesIO(data), filename), 'mode': 'test'})
+    
+    assert response.status_code == 400
+    error = response.get_json()['error']
+    assert error.startswith(f"The file could not be read as .{filename.rsplit('.', 1)[1]};")
+
+
+def test_rows_after_a_corrupt_line_fail_the_same_way():
+    data = b'Center_Latitude,Center_Longitude\n' + b'40.1,-74.1\n' * 10 + b'40.1,"-74.1\n40.1,-74.1\n'
+    chunks = read_upload_chunks(io.BytesIO(data), '.csv', chunk_rows=5)
+    
+    assert len(next(chunks)) == 5
+    with pytest.raises(UploadParseError, match='EOF inside string'):
+        list(chunks)
@@ -0,0 +1,100 @@
+import os
+import time
+
+import pytest
+
+import cluster_app
+from cluster_app import ChunkGeocoder, GeocodeCache, address_fields, warm_cache_from_results, warm_cache_grid
+
+
+class FakeBackend:
+    """Looks points up through the ``lookup`` hook instead of a network"""
+
+    name = 'fake'
+    uses_cache = True
+    concurrency = 4
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setattr(cluster_app, 'get_geocode_cache', lambda: cache)
+    return cache
+
+
+def street(lat, lon):
+    return {'address': {'house_number': '1', 'road': f'{lat:.3f} {lon:.3f} Street'}, 'display_name': 'x'}
+
+
+def lookup_into(looked_up):
+    def lookup(backend, points, on_result, client=None, cancel_event=None):
+        for lat, lon in points:
+            looked_up.append((lat, lon))
+            on_result((lat, lon), street(lat, lon), None)
+    return lookup
+
+
+def test_points_inside_a_warmed_grid_take_the_nearest_grid_point(cache, monkeypatch):
+    warmed = []
+    monkeypatch.setattr(cluster_app, 'ChunkGeocoder', lambda *args, **kwargs: ChunkGeocoder(
+        *args, **kwargs, lookup=lookup_into(warmed)
+    ))
+    monkeypatch.setattr(cluster_app, 'get_geocoder_backend', FakeBackend)
+    stats = warm_cache_grid(40.0, -74.0, 40.01, -73.99, 0.005)
+    assert len(warmed) == stats['points'] == 9
+    
+    looked_up = []
+    geocoder = ChunkGeocoder(FakeBackend(), cache, lookup=lookup_into(looked_up))
+    inside, edge, outside = (40.0061, -73.9962), (40.0104, -73.9898), (40.02, -73.99)
+    geocoder.resolve([inside, edge, outside])
+    
+    assert looked_up == [outside]
+    assert geocoder.payloads[inside] == street(40.005, -73.995)
+    assert geocoder.payloads[edge] == street(40.01, -73.99)
+    assert geocoder.grid_answers == 2 and geocoder.lookups_done == 3
+    assert address_fields(geocoder.payloads[inside], nearby=True)[2] == 'Nearby Street Address'
+
+
+def test_the_finest_overlapping_grid_is_used(cache):
+    cache.add_grid(40.0, -74.0, 41.0, -73.0, 0.1, 6)
+    cache.add_grid(40.0, -74.0, 40.1, -73.9, 0.01, 6)
+    assert cache.grid_keys([40.033, 40.533, 39.0], [-73.967, -73.467, -74.0]) == [
+        '40.030000,-73.970000', '40.500000,-73.500000', None
+    ]
+
+
+def test_grid_points_without_an_address_are_looked_up(cache):
+    cache.add_grid(40.0, -74.0, 40.01, -73.99, 0.005, 6)
+    cache.put(cache.make_key(40.005, -73.995), None)
+    looked_up = []
+    geocoder = ChunkGeocoder(FakeBackend(), cache, lookup=lookup_into(looked_up))
+    geocoder.resolve([(40.006, -73.996)])
+    assert looked_up == [(40.006, -73.996)]
+    assert geocoder.grid_answers == 0
+
+
+def write_results(path):
+    with open(path, 'w') as f:
+        f.write('Center_Latitude,Center_Longitude,Physical_Address,Street_Name,Address_Quality\n')
+        f.write('40.0,-74.0,"1 Main Street, Springfield",1 Main Street,Complete Street Address\n')
+
+
+def test_results_are_dated_by_the_file_modification_time(cache, tmp_path):
+    path = tmp_path / 'results.csv'
+    write_results(path)
+    made = time.time() - 3600
+    os.utime(path, (made, made))
+    
+    assert warm_cache_from_results(str(path))['written'] == 1
+    created_at, = cache.conn.execute('SELECT created_at FROM geocode_cache').fetchone()
+    assert created_at == pytest.approx(made)
+
+
+def test_results_older_than_the_ttl_are_not_served(tmp_path, monkeypatch):
+    cache = GeocodeCache(str(tmp_path / 'cache.sqlite3'), ttl_seconds=60)
+    monkeypatch.setattr(cluster_app, 'get_geocode_cache', lambda: cache)
+    path = tmp_path / 'results.csv'
+    write_results(path)
+    
+    warm_cache_from_results(str(path), created_at=time.time() - 120)
+    assert cache.get(cache.make_key(40.0, -74.0)) is cluster_app.CACHE_MISS